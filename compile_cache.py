@@ -0,0 +1,308 @@
+import hashlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from compilers import resolve_compiler, STDIN_COMPILERS
+from limits import run_limited, get_compile_limits, EvaluationTimeout
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "sym_ex_llm_inversion", "compile")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Temporary files of compiles (see compile_source()); older ones were left behind by a crashed run
+TEMP_SUFFIXES = (".tmp", ".tmp.c")
+STALE_TEMP_SECONDS = 3600
+# Flags that tune the binary to the build host's CPU, so the artifact must not be shared across hosts
+NATIVE_FLAGS = ('-march=native', '-mtune=native', '-mcpu=native')
+
+# resolved compiler path -> its version banner
+_compiler_versions = {}
+_host_cpu = None
+
+
+def compiler_version(compiler):
+    """
+    The version banner of a compiler (`--version`, or `-v` for tcc), so an upgrade changes the cache keys.
+    """
+    if compiler not in _compiler_versions:
+        version = ""
+        for flag in ('--version', '-v'):
+            try:
+                result = subprocess.run([compiler, flag], capture_output=True, text=True, timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                break
+            version = (result.stdout or result.stderr).strip()
+            if result.returncode == 0 and version:
+                break
+        _compiler_versions[compiler] = version
+    return _compiler_versions[compiler]
+
+
+def host_cpu():
+    """
+    The machine type, CPU model and CPU feature flags of this host, for native builds.
+    """
+    global _host_cpu
+    if _host_cpu is None:
+        details = []
+        try:
+            with open("/proc/cpuinfo") as f:
+                for line in f:
+                    if line.startswith(("model name", "flags", "Features")):
+                        details.append(" ".join(line.split()))
+                    elif not line.strip() and details:
+                        break  # the first processor is enough
+        except OSError:
+            details.append(platform.processor())
+        _host_cpu = "\n".join([platform.machine()] + details)
+    return _host_cpu
+
+
+class CompileCache:
+    """
+    On-disk cache of compiled C executables, keyed by a hash of the source text,
+    the compiler (path and version) and the flags, plus the host machine type, or
+    for -march=native builds the host CPU. Entries are evicted least-recently-used first
+    (by mtime, refreshed on every hit) once the cache grows beyond max_bytes.
+
+    Each entry is stored as <key>.out next to a <key>.json sidecar that records how
+    long the original compile took, so hits can report the compile time they saved.
+
+    For every artifact used in this session the cache also tracks the compiler and
+    profile it was built with, the compile time and (via record_run()) the time spent
+    running it, so report() can show whether each compile paid off.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.compile_seconds = 0.0
+        self.saved_seconds = 0.0
+        self.artifacts = {}
+        # compiles may run concurrently in threads (see task_graph.py)
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.sweep_temp_files()
+
+    def make_key(self, source, compiler, flags):
+        resolved = shutil.which(compiler) or compiler
+        h = hashlib.sha256()
+        h.update(resolved.encode())
+        h.update(b"\0")
+        h.update(compiler_version(resolved).encode())
+        h.update(b"\0")
+        # the cache directory may be shared by hosts (e.g. a networked home directory)
+        h.update((host_cpu() if any(flag in NATIVE_FLAGS for flag in flags) else platform.machine()).encode())
+        h.update(b"\0")
+        h.update("\0".join(flags).encode())
+        h.update(b"\0")
+        h.update(source.encode())
+        return h.hexdigest()
+
+    def compile(self, script_path, compiler=None, flags=('-lm',), expected_runs=None):
+        """
+        Return the path of an executable built from script_path, compiling it only
+        if no byte-identical source was built before with the same compiler and flags.
+
+        Args:
+            script_path (str): C source to compile.
+            compiler (str): Compiler to use as is with flags; None picks the compiler and
+                            optimization profile from expected_runs (see compilers.py).
+            flags (tuple): Compiler flags, without optimization flags when compiler is None.
+            expected_runs (int or None): How often the artifact will be run (None: for the whole session).
+
+        Raises:
+            RuntimeError: if compilation fails.
+            EvaluationTimeout: if compilation exceeds the compile limits.
+        """
+        with open(script_path, 'r') as f:
+            source = f.read()
+        return self.compile_source(source, compiler, flags, script_path=script_path, expected_runs=expected_runs)
+
+    def compile_source(self, source, compiler=None, flags=('-lm',), script_path=None, expected_runs=None):
+        """
+        Same as compile() for source text. If script_path is None the source is piped
+        to the compiler on stdin, so it never has to be written to disk (compilers
+        that cannot read stdin get a temporary file in the cache directory).
+        """
+        if compiler is None:
+            compiler, profile, flags = resolve_compiler(expected_runs, flags)
+        else:
+            profile = 'custom'
+        key = self.make_key(source, compiler, list(flags))
+        exe_path = os.path.join(self.cache_dir, f"{key}.out")
+        meta_path = os.path.join(self.cache_dir, f"{key}.json")
+
+        if os.path.exists(exe_path):
+            try:
+                os.utime(exe_path)
+                with open(meta_path, 'r') as f:
+                    cached_seconds = json.load(f).get("compile_seconds", 0.0)
+            except (OSError, ValueError):
+                cached_seconds = 0.0
+            with self.lock:
+                self.hits += 1
+                self.saved_seconds += cached_seconds
+            self.track(exe_path, script_path, compiler, profile, cached_seconds, cached=True)
+            return exe_path
+
+        with self.lock:
+            self.misses += 1
+        # compile to a unique temporary name and rename, so concurrent compiles of the same key
+        # (from other threads or processes) never clobber each other or expose a half-written binary
+        tmp_path = self.temp_file(key, ".tmp")
+        tmp_source = None
+        compile_input = None
+        if script_path is not None:
+            compile_cmd = [compiler, script_path, '-o', tmp_path] + list(flags)
+        elif os.path.basename(compiler) in STDIN_COMPILERS:
+            compile_cmd = [compiler, '-x', 'c', '-', '-o', tmp_path] + list(flags)
+            compile_input = source
+        else:
+            tmp_source = self.temp_file(key, ".tmp.c")
+            with open(tmp_source, 'w') as f:
+                f.write(source)
+            compile_cmd = [compiler, tmp_source, '-o', tmp_path] + list(flags)
+        start = time.perf_counter()
+        try:
+            compile_result = run_limited(compile_cmd, get_compile_limits(), input=compile_input)
+        except EvaluationTimeout:
+            compile_result = None
+        finally:
+            if tmp_source is not None:
+                os.remove(tmp_source)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.compile_seconds += elapsed
+        if compile_result is None or compile_result.returncode != 0:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if compile_result is None:
+                raise EvaluationTimeout(f"Compilation of {script_path or '<stdin>'} exceeded {get_compile_limits().wall_seconds}s")
+            raise RuntimeError(f"Compilation failed:\n{compile_result.stderr}")
+
+        os.replace(tmp_path, exe_path)
+        tmp_meta = self.temp_file(key, ".tmp")
+        with open(tmp_meta, 'w') as f:
+            json.dump({"source": os.path.abspath(script_path) if script_path else None, "compiler": compiler,
+                       "profile": profile, "flags": list(flags), "compile_seconds": elapsed}, f)
+        os.replace(tmp_meta, meta_path)
+        self.track(exe_path, script_path, compiler, profile, elapsed, cached=False)
+        self.evict()
+        return exe_path
+
+    def temp_file(self, key, suffix):
+        fd, path = tempfile.mkstemp(prefix=f"{key}.", suffix=suffix, dir=self.cache_dir)
+        os.close(fd)
+        return path
+
+    def sweep_temp_files(self):
+        """
+        Remove temporary files that compiles of crashed runs left in the cache directory.
+        """
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(TEMP_SUFFIXES):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                if now - os.path.getmtime(path) > STALE_TEMP_SECONDS:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def track(self, exe_path, script_path, compiler, profile, compile_seconds, cached):
+        with self.lock:
+            if exe_path not in self.artifacts:
+                self.artifacts[exe_path] = {
+                    "source": os.path.basename(script_path) if script_path else "<stdin>",
+                    "compiler": compiler, "profile": profile, "compile_seconds": compile_seconds,
+                    "cached": cached, "runs": 0, "run_seconds": 0.0,
+                }
+
+    def record_run(self, exe_path, seconds, runs=1):
+        """
+        Account `runs` executions of a cached artifact that took `seconds` in total.
+        """
+        with self.lock:
+            artifact = self.artifacts.get(exe_path)
+            if artifact is not None:
+                artifact["runs"] += runs
+                artifact["run_seconds"] += seconds
+
+    def evict(self):
+        """
+        Remove least-recently-used entries until the cache fits in max_bytes.
+        """
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".out"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            meta_path = path[:-len(".out")] + ".json"
+            try:
+                size = os.path.getsize(path)
+                if os.path.exists(meta_path):
+                    size += os.path.getsize(meta_path)
+                entries.append((os.path.getmtime(path), size, path, meta_path))
+            except OSError:
+                continue
+            total += size
+
+        entries.sort()
+        for _, size, path, meta_path in entries:
+            if total <= self.max_bytes:
+                break
+            for p in (path, meta_path):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            total -= size
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "compile_seconds": self.compile_seconds,
+                "saved_seconds": self.saved_seconds,
+            }
+
+    def report(self, max_artifacts=10):
+        s = self.stats()
+        print(f"[INFO] Compile cache: {s['hits']} hits, {s['misses']} misses "
+              f"(hit rate {s['hit_rate']:.0%}), {s['compile_seconds']:.2f}s compiling, "
+              f"~{s['saved_seconds']:.2f}s of compilation saved")
+        with self.lock:
+            artifacts = [dict(artifact) for artifact in self.artifacts.values()]
+        artifacts = sorted(artifacts, key=lambda a: a["run_seconds"] + a["compile_seconds"], reverse=True)
+        for artifact in artifacts[:max_artifacts]:
+            compile_note = "cached" if artifact["cached"] else f"{artifact['compile_seconds']:.3f}s"
+            print(f"[INFO]   {artifact['source']} ({artifact['compiler']}, {artifact['profile']}): "
+                  f"compile {compile_note}, run {artifact['run_seconds']:.3f}s over {artifact['runs']} runs")
+        if len(artifacts) > max_artifacts:
+            print(f"[INFO]   ... and {len(artifacts) - max_artifacts} more artifacts")
+
+
+_compile_cache = None
+
+
+def get_compile_cache():
+    """
+    Return the process-wide compile cache. The location can be overridden with
+    the COMPILE_CACHE_DIR environment variable.
+    """
+    global _compile_cache
+    if _compile_cache is None:
+        _compile_cache = CompileCache(os.environ.get("COMPILE_CACHE_DIR", DEFAULT_CACHE_DIR))
+    return _compile_cache
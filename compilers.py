@@ -0,0 +1,102 @@
+import shutil
+
+# Optimization profiles: 'fast' for one-shot probes, 'optimized' for long-lived harnesses
+PROFILES = ('fast', 'optimized')
+PROFILE_FLAGS = {
+    'fast': ('-O0',),
+    'optimized': ('-O2', '-march=native'),
+}
+
+# Compilers tried for each profile, in order of preference, when none is configured
+COMPILER_PREFERENCE = {
+    'fast': ('tcc', 'gcc', 'clang'),
+    'optimized': ('gcc', 'clang', 'tcc'),
+}
+SUPPORTED_COMPILERS = ('gcc', 'clang', 'tcc')
+
+# Compilers that can read the source from stdin with `-x c -`
+STDIN_COMPILERS = ('gcc', 'clang')
+
+# Expected number of runs from which an optimized build is worth its longer compile
+OPTIMIZE_THRESHOLD = 1000
+
+# None means "choose automatically"
+_compiler = None
+_profile = None
+
+
+def configure_compiler(compiler=None, profile=None):
+    """
+    Pin the compiler and/or the optimization profile for all subsequent compiles.
+    'auto' (or None) restores the automatic choice.
+
+    Raises:
+        ValueError: if the compiler is unsupported or not installed, or the profile is unknown.
+    """
+    global _compiler, _profile
+    compiler = None if compiler == 'auto' else compiler
+    profile = None if profile == 'auto' else profile
+    if compiler is not None:
+        if compiler not in SUPPORTED_COMPILERS:
+            raise ValueError(f"Unknown compiler '{compiler}', expected one of {SUPPORTED_COMPILERS}")
+        if shutil.which(compiler) is None:
+            raise ValueError(f"Compiler '{compiler}' is not installed")
+    if profile is not None and profile not in PROFILES:
+        raise ValueError(f"Unknown compile profile '{profile}', expected one of {PROFILES}")
+    _compiler = compiler
+    _profile = profile
+
+
+def get_compiler_config():
+    """
+    The (compiler, profile) pinned with configure_compiler(), None where automatic.
+    """
+    return _compiler, _profile
+
+
+def available_compilers():
+    return [compiler for compiler in SUPPORTED_COMPILERS if shutil.which(compiler)]
+
+
+def select_profile(expected_runs=None):
+    """
+    Pick the optimization profile for an artifact that is expected to run
+    expected_runs times (None: unknown, i.e. reused for the whole session).
+    """
+    if _profile is not None:
+        return _profile
+    if expected_runs is None or expected_runs >= OPTIMIZE_THRESHOLD:
+        return 'optimized'
+    return 'fast'
+
+
+def select_compiler(profile):
+    if _compiler is not None:
+        return _compiler
+    for compiler in COMPILER_PREFERENCE[profile]:
+        if shutil.which(compiler):
+            return compiler
+    raise RuntimeError(f"No C compiler found (tried {', '.join(COMPILER_PREFERENCE[profile])})")
+
+
+def profile_flags(compiler, profile):
+    # tcc does not optimize and has no -march
+    if compiler == 'tcc':
+        return ()
+    return PROFILE_FLAGS[profile]
+
+
+def resolve_compiler(expected_runs=None, flags=('-lm',)):
+    """
+    Choose compiler, profile and full flag list for an artifact.
+
+    Args:
+        expected_runs (int or None): How often the artifact will be run (None: for the whole session).
+        flags (tuple): Profile-independent flags, e.g. ('-lm',) or ('-shared', '-fPIC', '-lm').
+
+    Returns:
+        tuple: (compiler, profile, flags)
+    """
+    profile = select_profile(expected_runs)
+    compiler = select_compiler(profile)
+    return compiler, profile, tuple(profile_flags(compiler, profile)) + tuple(flags)
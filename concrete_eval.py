@@ -0,0 +1,365 @@
+import math
+from fractions import Fraction
+from functools import lru_cache
+
+import numpy as np
+from z3 import (is_int_value, is_rational_value, is_true, is_false, is_const,
+                Z3_OP_AND, Z3_OP_OR, Z3_OP_NOT, Z3_OP_IMPLIES, Z3_OP_XOR, Z3_OP_EQ, Z3_OP_DISTINCT,
+                Z3_OP_LT, Z3_OP_LE, Z3_OP_GT, Z3_OP_GE, Z3_OP_ADD, Z3_OP_SUB, Z3_OP_MUL, Z3_OP_UMINUS,
+                Z3_OP_DIV, Z3_OP_IDIV, Z3_OP_MOD, Z3_OP_REM, Z3_OP_POWER, Z3_OP_TO_REAL, Z3_OP_TO_INT,
+                Z3_OP_ITE, Z3_OP_UNINTERPRETED)
+
+
+def _idiv(a, b):
+    # Z3 integer division rounds so that the remainder is non-negative
+    return a // b if b > 0 else -(a // -b)
+
+
+def _mod(a, b):
+    return a - b * _idiv(a, b)
+
+
+def _rem(a, b):
+    r = _mod(a, b)
+    return r if b >= 0 else -r
+
+
+def _distinct(*args):
+    return len(set(args)) == len(args)
+
+
+# Python source templates for the Z3 operators the concrete evaluator supports
+PYTHON_OPS = {
+    Z3_OP_AND: lambda a: "(" + " and ".join(a) + ")" if a else "True",
+    Z3_OP_OR: lambda a: "(" + " or ".join(a) + ")" if a else "False",
+    Z3_OP_NOT: lambda a: f"(not {a[0]})",
+    Z3_OP_IMPLIES: lambda a: f"((not {a[0]}) or {a[1]})",
+    Z3_OP_XOR: lambda a: f"({a[0]} != {a[1]})",
+    Z3_OP_EQ: lambda a: f"({a[0]} == {a[1]})",
+    Z3_OP_DISTINCT: lambda a: f"_distinct({', '.join(a)})",
+    Z3_OP_LT: lambda a: f"({a[0]} < {a[1]})",
+    Z3_OP_LE: lambda a: f"({a[0]} <= {a[1]})",
+    Z3_OP_GT: lambda a: f"({a[0]} > {a[1]})",
+    Z3_OP_GE: lambda a: f"({a[0]} >= {a[1]})",
+    Z3_OP_ADD: lambda a: "(" + " + ".join(a) + ")",
+    Z3_OP_SUB: lambda a: "(" + " - ".join(a) + ")",
+    Z3_OP_MUL: lambda a: "(" + " * ".join(a) + ")",
+    Z3_OP_UMINUS: lambda a: f"(-{a[0]})",
+    Z3_OP_DIV: lambda a: f"(Fraction({a[0]}) / {a[1]})",
+    Z3_OP_IDIV: lambda a: f"_idiv({a[0]}, {a[1]})",
+    Z3_OP_MOD: lambda a: f"_mod({a[0]}, {a[1]})",
+    Z3_OP_REM: lambda a: f"_rem({a[0]}, {a[1]})",
+    Z3_OP_POWER: lambda a: f"({a[0]} ** {a[1]})",
+    Z3_OP_TO_REAL: lambda a: f"Fraction({a[0]})",
+    Z3_OP_TO_INT: lambda a: f"math.floor({a[0]})",
+    Z3_OP_ITE: lambda a: f"({a[1]} if {a[0]} else {a[2]})",
+}
+
+PYTHON_NAMESPACE = {"Fraction": Fraction, "math": math, "_idiv": _idiv, "_mod": _mod, "_rem": _rem,
+                    "_distinct": _distinct}
+
+
+def lower_to_python(expr, variables, constants):
+    """
+    Lower a Z3 expression to Python source that reads variable values from a dict `v`.
+
+    Args:
+        expr: Z3 expression.
+        variables (dict): filled with variable name -> Z3 sort name for every variable used.
+        constants (list): filled with the rational constants, referenced as _c<i>.
+
+    Raises:
+        ValueError: if the expression uses an operator the evaluator does not support.
+    """
+    if is_true(expr):
+        return "True"
+    if is_false(expr):
+        return "False"
+    if is_int_value(expr):
+        return repr(expr.as_long())
+    if is_rational_value(expr):
+        constants.append(Fraction(expr.numerator_as_long(), expr.denominator_as_long()))
+        return f"_c{len(constants) - 1}"
+    if is_const(expr) and expr.decl().kind() == Z3_OP_UNINTERPRETED:
+        sort = expr.sort().name()
+        if sort not in ("Int", "Real"):
+            raise ValueError(f"Unsupported sort '{sort}' of variable '{expr}'")
+        variables[str(expr)] = sort
+        return f"v[{str(expr)!r}]"
+    template = PYTHON_OPS.get(expr.decl().kind())
+    if template is None:
+        raise ValueError(f"Unsupported operator '{expr.decl().name()}' in '{expr}'")
+    return template([lower_to_python(child, variables, constants) for child in expr.children()])
+
+
+@lru_cache(maxsize=4096)
+def compile_python_lambda(source, constants):
+    """
+    Compile generated Python source into `lambda v: ...`, memoized by source text.
+    """
+    namespace = dict(PYTHON_NAMESPACE)
+    namespace.update({f"_c{i}": c for i, c in enumerate(constants)})
+    return eval(f"lambda v: {source}", namespace)
+
+
+def to_concrete(raw_val, is_real):
+    """
+    Convert a concrete value (Python number, numeric string or Z3 numeral) to the
+    exact value Z3 would use for it: int for Int variables, Fraction for Real ones,
+    or None for NaN and the infinities, which no Z3 number equals.
+    """
+    if isinstance(raw_val, int) and not is_real:
+        return raw_val
+    if isinstance(raw_val, (int, float, str, Fraction)):
+        pass
+    elif is_int_value(raw_val):
+        raw_val = raw_val.as_long()
+    elif is_rational_value(raw_val):
+        raw_val = Fraction(raw_val.numerator_as_long(), raw_val.denominator_as_long())
+    if isinstance(raw_val, Fraction if is_real else int):
+        return raw_val
+    value = float(raw_val)
+    if not math.isfinite(value):
+        return None
+    # same decimal rounding as the RealVal(str(float(...))) fixed-value constraints
+    return Fraction(str(value)) if is_real else int(value)
+
+
+class ConcretePredicate:
+    """
+    Z3 constraints lowered to plain Python functions, so whether a fully concrete
+    assignment satisfies them is decided in microseconds without calling the solver.
+
+    Values are compared exactly (ints and Fractions), like Z3 does. evaluate()
+    returns None when it cannot decide: a variable has no value, a constraint uses
+    an unsupported operator, or the evaluation divides by zero (which Z3 leaves
+    unspecified); callers then fall back to the solver.
+    """
+
+    def __init__(self, z3_constraints=()):
+        self.variables = {}
+        self.clauses = []
+        self.supported = True
+        for constraint in z3_constraints:
+            self.add(constraint)
+
+    def add(self, constraint):
+        constants = []
+        try:
+            source = lower_to_python(constraint, self.variables, constants)
+        except ValueError as e:
+            if self.supported:
+                print(f"[WARN] Concrete evaluation disabled, falling back to Z3: {e}")
+            self.supported = False
+            return
+        self.clauses.append(compile_python_lambda(source, tuple(constants)))
+
+    def covers(self, values):
+        """
+        True if values assigns every variable the constraints mention.
+        """
+        return self.supported and all(var in values for var in self.variables)
+
+    def evaluate(self, values):
+        """
+        Decide whether values satisfies all constraints.
+
+        Args:
+            values (dict): variable name -> concrete value (see to_concrete()).
+
+        Returns:
+            bool or None: None if the evaluator cannot decide.
+        """
+        if not self.covers(values):
+            return None
+        try:
+            return all(clause(values) for clause in self.clauses)
+        except (ZeroDivisionError, TypeError, ValueError, OverflowError):
+            return None
+
+
+def _np_div(a, b):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.true_divide(a, b)
+
+
+def _np_idiv(a, b):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(b > 0, np.floor_divide(a, b), -np.floor_divide(a, -b))
+
+
+def _np_mod(a, b):
+    return a - b * _np_idiv(a, b)
+
+
+def _np_rem(a, b):
+    r = _np_mod(a, b)
+    return np.where(b >= 0, r, -r)
+
+
+def _np_all(*args):
+    result = args[0]
+    for arg in args[1:]:
+        result = np.logical_and(result, arg)
+    return result
+
+
+def _np_any(*args):
+    result = args[0]
+    for arg in args[1:]:
+        result = np.logical_or(result, arg)
+    return result
+
+
+def _np_distinct(*args):
+    return _np_all(*[args[i] != args[j] for i in range(len(args)) for j in range(i + 1, len(args))])
+
+
+# NumPy source templates for the same operators, evaluated on one column array per variable
+NUMPY_OPS = dict(PYTHON_OPS)
+NUMPY_OPS.update({
+    Z3_OP_AND: lambda a: f"_np_all({', '.join(a)})" if a else "True",
+    Z3_OP_OR: lambda a: f"_np_any({', '.join(a)})" if a else "False",
+    Z3_OP_NOT: lambda a: f"np.logical_not({a[0]})",
+    Z3_OP_IMPLIES: lambda a: f"np.logical_or(np.logical_not({a[0]}), {a[1]})",
+    Z3_OP_XOR: lambda a: f"np.logical_xor({a[0]}, {a[1]})",
+    Z3_OP_DISTINCT: lambda a: f"_np_distinct({', '.join(a)})",
+    Z3_OP_DIV: lambda a: f"_np_div({a[0]}, {a[1]})",
+    Z3_OP_IDIV: lambda a: f"_np_idiv({a[0]}, {a[1]})",
+    Z3_OP_MOD: lambda a: f"_np_mod({a[0]}, {a[1]})",
+    Z3_OP_REM: lambda a: f"_np_rem({a[0]}, {a[1]})",
+    Z3_OP_POWER: lambda a: f"np.power({a[0]}, {a[1]})",
+    Z3_OP_TO_REAL: lambda a: a[0],
+    Z3_OP_TO_INT: lambda a: f"np.floor({a[0]})",
+    Z3_OP_ITE: lambda a: f"np.where({a[0]}, {a[1]}, {a[2]})",
+})
+
+NUMPY_NAMESPACE = {"np": np, "_np_div": _np_div, "_np_idiv": _np_idiv, "_np_mod": _np_mod, "_np_rem": _np_rem,
+                   "_np_all": _np_all, "_np_any": _np_any, "_np_distinct": _np_distinct}
+
+
+def lower_to_numpy(expr, variables):
+    """
+    Lower a Z3 expression to NumPy source over column arrays `v[name]`, with all
+    numbers as float64. Same arguments and errors as lower_to_python().
+    """
+    if is_true(expr):
+        return "True"
+    if is_false(expr):
+        return "False"
+    if is_int_value(expr):
+        return repr(float(expr.as_long()))
+    if is_rational_value(expr):
+        return repr(expr.numerator_as_long() / expr.denominator_as_long())
+    if is_const(expr) and expr.decl().kind() == Z3_OP_UNINTERPRETED:
+        sort = expr.sort().name()
+        if sort not in ("Int", "Real"):
+            raise ValueError(f"Unsupported sort '{sort}' of variable '{expr}'")
+        variables[str(expr)] = sort
+        return f"v[{str(expr)!r}]"
+    template = NUMPY_OPS.get(expr.decl().kind())
+    if template is None:
+        raise ValueError(f"Unsupported operator '{expr.decl().name()}' in '{expr}'")
+    return template([lower_to_numpy(child, variables) for child in expr.children()])
+
+
+def lower_violation(expr, variables):
+    """
+    Lower a Z3 Boolean expression to NumPy source for how far each row is from
+    satisfying it: 0 where it holds, otherwise the distance to the boundary for
+    comparisons (at least 1 for strict Int comparisons), the sum over the parts of
+    an And, the minimum over the branches of an Or, and 1 for anything else.
+    """
+    kind = expr.decl().kind()
+    children = expr.children()
+    if kind == Z3_OP_AND and children:
+        return "(" + " + ".join(lower_violation(child, variables) for child in children) + ")"
+    if kind == Z3_OP_OR and children:
+        parts = [lower_violation(child, variables) for child in children]
+        source = parts[0]
+        for part in parts[1:]:
+            source = f"np.minimum({source}, {part})"
+        return source
+    if kind in (Z3_OP_LE, Z3_OP_LT, Z3_OP_GE, Z3_OP_GT):
+        a, b = (lower_to_numpy(child, variables) for child in children)
+        if kind in (Z3_OP_GE, Z3_OP_GT):
+            a, b = b, a
+        margin = 0.0
+        if kind in (Z3_OP_LT, Z3_OP_GT) and all(child.sort().name() == "Int" for child in children):
+            margin = 1.0
+        return f"np.maximum(({a}) - ({b}) + {margin!r}, 0.0)"
+    if kind == Z3_OP_EQ and children[0].sort().name() in ("Int", "Real"):
+        a, b = (lower_to_numpy(child, variables) for child in children)
+        return f"np.abs(({a}) - ({b}))"
+    return f"np.where({lower_to_numpy(expr, variables)}, 0.0, 1.0)"
+
+
+@lru_cache(maxsize=4096)
+def compile_numpy_lambda(source):
+    return eval(f"lambda v: {source}", NUMPY_NAMESPACE)
+
+
+class VectorizedPredicate:
+    """
+    Z3 constraints lowered to NumPy, to screen a whole (N x vars) batch of candidate
+    assignments in one vectorized pass.
+
+    Unlike ConcretePredicate this works in float64: Real values are rounded to
+    doubles and Int columns are truncated to integers. Rows whose evaluation divides
+    by zero come out as not satisfied with a NaN or inf violation.
+    """
+
+    def __init__(self, z3_constraints=()):
+        self.variables = {}
+        self.constraints = []
+        self.truths = []
+        self.violations = []
+        for constraint in z3_constraints:
+            self.add(constraint)
+
+    def add(self, constraint):
+        """
+        Raises:
+            ValueError: if the constraint uses an operator that cannot be vectorized.
+        """
+        truth = compile_numpy_lambda(lower_to_numpy(constraint, self.variables))
+        violation = compile_numpy_lambda(lower_violation(constraint, self.variables))
+        self.constraints.append(constraint)
+        self.truths.append(truth)
+        self.violations.append(violation)
+
+    def screen(self, candidates, var_names):
+        """
+        Evaluate every constraint on every candidate.
+
+        Args:
+            candidates: (N x len(var_names)) array-like, or a list of dicts keyed by variable name.
+            var_names (list): Variable of each column.
+
+        Returns:
+            tuple: (mask, violations) where mask is a boolean array of shape (N,) that is
+                   True for candidates satisfying all constraints, and violations is an
+                   (N x len(constraints)) float array of per-constraint violation amounts.
+
+        Raises:
+            ValueError: if a variable of the constraints has no column.
+        """
+        if len(candidates) and isinstance(candidates[0], dict):
+            candidates = [[c[var] for var in var_names] for c in candidates]
+        rows = np.asarray(candidates, dtype=np.float64).reshape(-1, len(var_names))
+        n = rows.shape[0]
+        missing = [var for var in self.variables if var not in var_names]
+        if missing:
+            raise ValueError(f"No values for variables {missing}")
+        columns = {}
+        for j, var in enumerate(var_names):
+            column = rows[:, j]
+            columns[var] = np.trunc(column) if self.variables.get(var) == "Int" else column
+
+        mask = np.ones(n, dtype=bool)
+        violations = np.zeros((n, len(self.constraints)))
+        with np.errstate(invalid='ignore', over='ignore'):
+            for i, (truth, violation) in enumerate(zip(self.truths, self.violations)):
+                mask &= np.broadcast_to(np.asarray(truth(columns), dtype=bool), (n,))
+                violations[:, i] = np.broadcast_to(violation(columns), (n,))
+        return mask, violations
@@ -0,0 +1,177 @@
+import ast
+import operator
+from functools import lru_cache
+
+from z3 import And, Or, Not, Implies, If, Distinct, Xor, Int, Real, ToInt, ToReal, is_expr, is_real
+
+
+class ConstraintSyntaxError(ValueError):
+    """
+    Raised for constraint text outside the constraint language.
+    """
+
+
+# Functions that may be called in constraint text
+FUNCTIONS = {'And': And, 'Or': Or, 'Not': Not, 'Implies': Implies, 'If': If, 'Distinct': Distinct, 'Xor': Xor}
+
+
+def _floordiv(a, b):
+    # Z3 has no //, but its Int division already rounds down for positive divisors;
+    # a Real quotient is floored explicitly, as Python does for floats
+    if is_expr(a) or is_expr(b):
+        quotient = a / b
+        return ToReal(ToInt(quotient)) if is_real(quotient) else quotient
+    return a // b
+
+
+BINARY_OPS = {
+    ast.Add: ('+', operator.add),
+    ast.Sub: ('-', operator.sub),
+    ast.Mult: ('*', operator.mul),
+    ast.Div: ('/', operator.truediv),
+    ast.FloorDiv: ('//', _floordiv),
+    ast.Mod: ('%', operator.mod),
+    ast.Pow: ('**', operator.pow),
+}
+COMPARE_OPS = {
+    ast.Eq: ('==', operator.eq),
+    ast.NotEq: ('!=', operator.ne),
+    ast.Lt: ('<', operator.lt),
+    ast.LtE: ('<=', operator.le),
+    ast.Gt: ('>', operator.gt),
+    ast.GtE: ('>=', operator.ge),
+}
+OPERATORS = {symbol: function for symbol, function in list(BINARY_OPS.values()) + list(COMPARE_OPS.values())}
+
+
+def _build(node):
+    """
+    Turn a Python ast node into a constraint AST of nested tuples:
+
+    ('num', value), ('bool', value), ('var', name), ('neg', operand),
+    ('op', symbol, left, right) for arithmetic and comparisons,
+    ('and', operands), ('or', operands), ('not', operand), ('call', name, args).
+    """
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, bool):
+            return ('bool', node.value)
+        if isinstance(node.value, (int, float)):
+            return ('num', node.value)
+        raise ConstraintSyntaxError(f"Unsupported literal {node.value!r}")
+    if isinstance(node, ast.Name):
+        return ('var', node.id)
+    if isinstance(node, ast.UnaryOp):
+        operand = _build(node.operand)
+        if isinstance(node.op, ast.USub):
+            return ('neg', operand)
+        if isinstance(node.op, ast.UAdd):
+            return operand
+        if isinstance(node.op, ast.Not):
+            return ('not', operand)
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPS:
+        return ('op', BINARY_OPS[type(node.op)][0], _build(node.left), _build(node.right))
+    if isinstance(node, ast.BoolOp):
+        return ('and' if isinstance(node.op, ast.And) else 'or', tuple(_build(value) for value in node.values))
+    if isinstance(node, ast.Compare):
+        # a < b <= c means a < b and b <= c
+        operands = [_build(node.left)] + [_build(c) for c in node.comparators]
+        parts = []
+        for i, op in enumerate(node.ops):
+            if type(op) not in COMPARE_OPS:
+                raise ConstraintSyntaxError(f"Unsupported comparison '{type(op).__name__}'")
+            parts.append(('op', COMPARE_OPS[type(op)][0], operands[i], operands[i + 1]))
+        return parts[0] if len(parts) == 1 else ('and', tuple(parts))
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS and not node.keywords:
+        return ('call', node.func.id, tuple(_build(arg) for arg in node.args))
+    raise ConstraintSyntaxError(f"Unsupported expression '{ast.dump(node)}'")
+
+
+@lru_cache(maxsize=4096)
+def parse_constraint(text):
+    """
+    Parse one constraint (Python expression syntax: arithmetic, comparisons,
+    and/or/not, And/Or/Not/Implies/If/Distinct/Xor calls) into a constraint AST.
+    Results are memoized by text, so re-parsing the same constraint is free.
+
+    Raises:
+        ConstraintSyntaxError: if the text is not in the constraint language.
+    """
+    try:
+        tree = ast.parse(text.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ConstraintSyntaxError(f"Cannot parse constraint '{text}': {e.msg}") from None
+    return _build(tree.body)
+
+
+def constraint_variables(node):
+    """
+    Names of the variables used in a constraint AST.
+    """
+    kind = node[0]
+    if kind == 'var':
+        return {node[1]}
+    if kind in ('num', 'bool'):
+        return set()
+    if kind in ('neg', 'not'):
+        return constraint_variables(node[1])
+    if kind == 'op':
+        return constraint_variables(node[2]) | constraint_variables(node[3])
+    children = node[2] if kind == 'call' else node[1]
+    variables = set()
+    for child in children:
+        variables |= constraint_variables(child)
+    return variables
+
+
+def to_z3(node, ctx):
+    """
+    Lower a constraint AST to a Z3 term, with the same typing as evaluating the
+    text against ctx (Int/Real coercions, Int division for Int operands).
+    Python/NumPy predicates are lowered from that term by concrete_eval, so
+    they share Z3's semantics.
+
+    Args:
+        node (tuple): from parse_constraint().
+        ctx (dict): variable name -> Z3 variable.
+
+    Raises:
+        KeyError: for variables missing from ctx.
+    """
+    kind = node[0]
+    if kind in ('num', 'bool'):
+        return node[1]
+    if kind == 'var':
+        return ctx[node[1]]
+    if kind == 'neg':
+        return -to_z3(node[1], ctx)
+    if kind == 'not':
+        return Not(to_z3(node[1], ctx))
+    if kind == 'op':
+        return OPERATORS[node[1]](to_z3(node[2], ctx), to_z3(node[3], ctx))
+    if kind == 'and':
+        return And(*[to_z3(child, ctx) for child in node[1]])
+    if kind == 'or':
+        return Or(*[to_z3(child, ctx) for child in node[1]])
+    return FUNCTIONS[node[1]](*[to_z3(child, ctx) for child in node[2]])
+
+
+@lru_cache(maxsize=4096)
+def _cached_z3(text, sorts):
+    ctx = {name: Real(name) if sort == "Real" else Int(name) for name, sort in sorts}
+    return to_z3(parse_constraint(text), ctx)
+
+
+def constraint_to_z3(text, ctx):
+    """
+    Parse and lower one constraint, memoized by its text and the sorts of its
+    variables (Z3 terms are immutable, so the cached term can be shared).
+
+    Raises:
+        ConstraintSyntaxError: if the text is not in the constraint language.
+        KeyError: for variables missing from ctx.
+    """
+    names = sorted(constraint_variables(parse_constraint(text)))
+    sorts = tuple((name, ctx[name].sort().name()) for name in names)
+    if any(sort not in ("Int", "Real") for _, sort in sorts):
+        return to_z3(parse_constraint(text), ctx)
+    return _cached_z3(text, sorts)
@@ -0,0 +1,211 @@
+from fractions import Fraction
+
+import numpy as np
+from z3 import And, Not, IntVal, RealVal
+
+from concrete_eval import to_concrete
+
+
+class Region:
+    """
+    A closed box of excluded assignments: var -> (lo, hi), with exact bounds
+    (ints for Int variables, Fractions for Real ones).
+    """
+
+    def __init__(self, bounds, sorts):
+        self.bounds = bounds
+        self.sorts = sorts
+
+    def dims(self):
+        return frozenset(self.bounds)
+
+    def contains(self, values):
+        """
+        Whether the concrete assignment values lies in the region (None if values
+        misses a variable of the region).
+        """
+        for var, (lo, hi) in self.bounds.items():
+            if var not in values:
+                return None
+            if not lo <= values[var] <= hi:
+                return False
+        return True
+
+    def covers(self, other):
+        # other lies inside self (same variables)
+        return all(lo <= other.bounds[var][0] and other.bounds[var][1] <= hi for var, (lo, hi) in self.bounds.items())
+
+    def union_along(self, other):
+        """
+        The exact union of two regions that agree on all variables but one and touch
+        or overlap along that one, or None if their union is not a box.
+        """
+        differing = [var for var in self.bounds if self.bounds[var] != other.bounds[var]]
+        if len(differing) != 1:
+            return None
+        var = differing[0]
+        (lo, hi), (other_lo, other_hi) = self.bounds[var], other.bounds[var]
+        # adjacent Int intervals such as [1, 2] and [3, 4] also form one interval
+        step = 1 if self.sorts[var] == "Int" else 0
+        if other_lo > hi + step or lo > other_hi + step:
+            return None
+        bounds = dict(self.bounds)
+        bounds[var] = (min(lo, other_lo), max(hi, other_hi))
+        return Region(bounds, self.sorts)
+
+    def to_z3(self, ctx):
+        """
+        The blocking clause of the region: Not(And(lo <= var <= hi, ...)), with var == v
+        for single-point bounds.
+        """
+        conditions = []
+        for var, (lo, hi) in sorted(self.bounds.items()):
+            z3_var = ctx[var]
+            to_val = IntVal if self.sorts[var] == "Int" else lambda v: RealVal(str(v))
+            if lo == hi:
+                conditions.append(z3_var == to_val(lo))
+            else:
+                conditions.extend([z3_var >= to_val(lo), z3_var <= to_val(hi)])
+        return Not(And(*conditions))
+
+    def __repr__(self):
+        return f"Region({ {var: (str(lo), str(hi)) for var, (lo, hi) in self.bounds.items()} })"
+
+
+class ExclusionStore:
+    """
+    Excluded regions of one constraint set, in place of one point-blocking clause per
+    rejected assignment.
+
+    Each rejected point is widened to a neighbourhood: Int variables by int_radius,
+    Real variables by max(real_abs_radius, real_rel_radius * |value|), since excluding
+    a single Real point barely changes what the solver returns. New regions that lie
+    inside an existing one are dropped, existing regions inside a new one are removed,
+    and regions that together form a box (e.g. the Int points x=3 and x=4) are merged
+    into it; regions are only ever merged into their exact union, so nothing that was
+    not rejected gets excluded. Beyond max_regions, the oldest regions are forgotten to
+    keep the clause count bounded, so very early rejections may be proposed again.
+    """
+
+    def __init__(self, ctx, max_regions=64, int_radius=0, real_abs_radius=Fraction(1, 10 ** 6),
+                 real_rel_radius=Fraction(1, 10 ** 3)):
+        self.ctx = ctx
+        self.max_regions = max_regions
+        self.int_radius = int_radius
+        self.real_abs_radius = Fraction(real_abs_radius)
+        self.real_rel_radius = Fraction(real_rel_radius)
+        self.regions = []
+        self.points = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.regions)
+
+    def region_around(self, solution):
+        """
+        The neighbourhood of a rejected assignment, over its Int/Real variables known to
+        ctx, or None if it has none or a non-finite value (which the solver can't propose).
+        """
+        bounds = {}
+        sorts = {}
+        for var, raw_val in solution.items():
+            if var not in self.ctx or not hasattr(self.ctx[var], "sort"):
+                continue
+            sort = self.ctx[var].sort().name()
+            if sort == "Int":
+                value = to_concrete(raw_val, False)
+                if value is None:
+                    return None
+                bounds[var] = (value - self.int_radius, value + self.int_radius)
+            elif sort == "Real":
+                value = to_concrete(raw_val, True)
+                if value is None:
+                    return None
+                radius = max(self.real_abs_radius, self.real_rel_radius * abs(value))
+                bounds[var] = (value - radius, value + radius)
+            else:
+                continue
+            sorts[var] = sort
+        return Region(bounds, sorts) if bounds else None
+
+    def add(self, solution):
+        """
+        Exclude the neighbourhood of a rejected assignment.
+
+        Returns:
+            tuple: (added, removed) where added is the list of new regions and removed
+                   the list of regions they replace or that were forgotten past max_regions; both are empty if the assignment
+                   was already excluded or has no Int/Real variables.
+        """
+        region = self.region_around(solution)
+        if region is None:
+            return [], []
+        self.points += 1
+        dims = region.dims()
+        if any(existing.dims() == dims and existing.covers(region) for existing in self.regions):
+            return [], []
+
+        before = list(self.regions)
+        self.regions = [existing for existing in self.regions
+                        if existing.dims() != dims or not region.covers(existing)]
+        merged = True
+        while merged:
+            merged = False
+            for existing in self.regions:
+                union = region.union_along(existing) if existing.dims() == dims else None
+                if union is not None:
+                    region = union
+                    self.regions.remove(existing)
+                    merged = True
+                    break
+        self.regions.append(region)
+
+        while len(self.regions) > self.max_regions:
+            if not self.dropped:
+                print(f"[WARN] Exclusion store over {self.max_regions} regions, forgetting the oldest ones")
+            self.regions.pop(0)
+            self.dropped += 1
+
+        added = [region for region in self.regions if not any(region is old for old in before)]
+        removed = [old for old in before if not any(old is region for region in self.regions)]
+        return added, removed
+
+    def clauses(self):
+        return [region.to_z3(self.ctx) for region in self.regions]
+
+    def contains(self, values):
+        """
+        Whether a concrete assignment (see to_concrete()) lies in an excluded region;
+        None if that cannot be told because values misses variables of some region.
+        """
+        undecided = False
+        for region in self.regions:
+            inside = region.contains(values)
+            if inside:
+                return True
+            undecided = undecided or inside is None
+        return None if undecided else False
+
+    def contains_rows(self, candidates, var_names):
+        """
+        Vectorized contains() for a batch of candidates, given as in
+        VectorizedPredicate.screen(); regions over variables without a column are
+        ignored.
+
+        Returns:
+            numpy.ndarray: boolean array of shape (N,), True for excluded candidates.
+        """
+        if len(candidates) and isinstance(candidates[0], dict):
+            candidates = [[c[var] for var in var_names] for c in candidates]
+        rows = np.asarray(candidates, dtype=np.float64).reshape(-1, len(var_names))
+        columns = {var: rows[:, j] for j, var in enumerate(var_names)}
+        excluded = np.zeros(rows.shape[0], dtype=bool)
+        for region in self.regions:
+            if any(var not in columns for var in region.bounds):
+                continue
+            inside = np.ones(rows.shape[0], dtype=bool)
+            for var, (lo, hi) in region.bounds.items():
+                column = np.trunc(columns[var]) if region.sorts[var] == "Int" else columns[var]
+                inside &= (column >= float(lo)) & (column <= float(hi))
+            excluded |= inside
+        return excluded
@@ -0,0 +1,647 @@
+import os
+import re
+import select
+import subprocess
+import threading
+import time
+
+from helper_functions import substitute_placeholders, parse_c_output
+from compile_cache import get_compile_cache
+from scratch import ScratchStore
+from result_channel import merge_records, decode_stream, read_request, read_all
+from limits import run_limited, popen_limited, kill_process_group, get_run_limits, ResourceLimits, EvaluationTimeout, EvaluationFailed, TIMEOUT_EXIT_CODES, TIMED_OUT
+
+# Prepended to the generated script. Every {var}_placeholder is rewritten to
+# harness_value(i), and the script's own main() is renamed so that the harness
+# main() below can load the input values at runtime before calling it.
+HARNESS_PRELUDE = """#include <stdio.h>
+#include <stdlib.h>
+#include <stdarg.h>
+#include <string.h>
+#include <unistd.h>
+#include <sys/time.h>
+#include <sys/resource.h>
+#include <sys/wait.h>
+
+#define HARNESS_NUM_VALUES {num_values}
+static long double harness_values[HARNESS_NUM_VALUES + 1];
+
+static long double harness_value(int index) {{
+    return harness_values[index];
+}}
+
+static int harness_load_values(char **values, int count) {{
+    int i;
+    if (count < HARNESS_NUM_VALUES) {{
+        fprintf(stderr, "harness: expected %d values, got %d\\n", HARNESS_NUM_VALUES, count);
+        return -1;
+    }}
+    for (i = 0; i < HARNESS_NUM_VALUES; i++) {{
+        char *end;
+        harness_values[i] = strtold(values[i], &end);
+        if (end == values[i]) {{
+            fprintf(stderr, "harness: could not parse value '%s'\\n", values[i]);
+            return -1;
+        }}
+    }}
+    return 0;
+}}
+
+/* Structured result channel: when HARNESS_RESULT_FD is set, every printed
+   "###RESULT### name=value ..." line is also written to that fd as one record:
+   u32 payload length, u16 field count, then per field u8 name length, name,
+   u8 type ('i' int64, 'd' double, 's' u32 length + bytes). A zero length marks
+   the end of a fork-server request. */
+static int harness_result_fd = -1;
+
+static void harness_write_all(const char *buf, size_t len) {{
+    while (len > 0) {{
+        ssize_t written = write(harness_result_fd, buf, len);
+        if (written <= 0) {{
+            return;
+        }}
+        buf += written;
+        len -= (size_t)written;
+    }}
+}}
+
+static void harness_end_record(void) {{
+    unsigned int zero = 0;
+    if (harness_result_fd >= 0) {{
+        harness_write_all((const char *)&zero, sizeof(zero));
+    }}
+}}
+
+static void harness_emit_result(const char *line) {{
+    char record[8192];
+    size_t pos = sizeof(unsigned int) + sizeof(unsigned short);
+    unsigned short count = 0;
+    unsigned int payload;
+    const char *p = line;
+    while (*p) {{
+        const char *name, *value;
+        char text[256];
+        size_t name_len, value_len;
+        long long as_int;
+        double as_double;
+        char *parse_end;
+        while (*p == ' ' || *p == '\\t' || *p == '\\n' || *p == '\\r') p++;
+        if (!*p) break;
+        name = p;
+        while (*p && *p != '=' && *p != ' ' && *p != '\\t' && *p != '\\n' && *p != '\\r') p++;
+        name_len = (size_t)(p - name);
+        /* both name=value and name = value */
+        while (*p == ' ' || *p == '\\t') p++;
+        if (*p != '=') continue;
+        p++;
+        if (name_len == 0) continue;
+        while (*p == ' ' || *p == '\\t') p++;
+        value = p;
+        while (*p && *p != ' ' && *p != '\\t' && *p != '\\n' && *p != '\\r') p++;
+        value_len = (size_t)(p - value);
+        if (name_len > 255 || value_len >= sizeof(text) || pos + 1 + name_len + 1 + 8 + 4 + value_len > sizeof(record)) break;
+        record[pos++] = (char)name_len;
+        memcpy(record + pos, name, name_len);
+        pos += name_len;
+        memcpy(text, value, value_len);
+        text[value_len] = '\\0';
+        as_int = strtoll(text, &parse_end, 10);
+        if (value_len > 0 && *parse_end == '\\0') {{
+            record[pos++] = 'i';
+            memcpy(record + pos, &as_int, 8);
+            pos += 8;
+        }} else if (as_double = strtod(text, &parse_end), value_len > 0 && *parse_end == '\\0') {{
+            record[pos++] = 'd';
+            memcpy(record + pos, &as_double, 8);
+            pos += 8;
+        }} else {{
+            unsigned int len32 = (unsigned int)value_len;
+            record[pos++] = 's';
+            memcpy(record + pos, &len32, 4);
+            pos += 4;
+            memcpy(record + pos, value, value_len);
+            pos += value_len;
+        }}
+        count++;
+    }}
+    payload = (unsigned int)(pos - sizeof(unsigned int));
+    memcpy(record, &payload, sizeof(payload));
+    memcpy(record + sizeof(unsigned int), &count, sizeof(count));
+    harness_write_all(record, pos);
+}}
+
+static int harness_printf(const char *format, ...) {{
+    char buf[8192];
+    const char *result;
+    va_list args;
+    int len;
+    va_start(args, format);
+    len = vsnprintf(buf, sizeof(buf), format, args);
+    va_end(args);
+    if (harness_result_fd >= 0 && (result = strstr(buf, "###RESULT###")) != NULL) {{
+        harness_emit_result(result + strlen("###RESULT###"));
+    }}
+    fputs(buf, stdout);
+    return len;
+}}
+
+#define printf(...) harness_printf(__VA_ARGS__)
+#define main harness_user_main
+"""
+
+HARNESS_MAIN = """
+#undef main
+#undef printf
+
+#define HARNESS_LINE_MAX 65536
+
+static int harness_call_user_main(int argc, char **argv) {
+    return ((int (*)(int, char **))harness_user_main)(argc, argv);
+}
+
+/* Apply the CPU and memory rlimits passed by the Python side (see ResourceLimits.as_env). */
+static void harness_apply_limits(void) {
+    const char *cpu = getenv("HARNESS_CPU_LIMIT");
+    const char *memory = getenv("HARNESS_MEMORY_LIMIT");
+    struct rlimit limit;
+    if (cpu != NULL) {
+        limit.rlim_cur = (rlim_t)atol(cpu);
+        limit.rlim_max = limit.rlim_cur + 1;
+        setrlimit(RLIMIT_CPU, &limit);
+    }
+    if (memory != NULL) {
+        limit.rlim_cur = limit.rlim_max = (rlim_t)strtoull(memory, NULL, 10);
+        setrlimit(RLIMIT_AS, &limit);
+    }
+}
+
+/* Kill the current (child) process with SIGALRM after HARNESS_TIMEOUT_MS milliseconds. */
+static void harness_arm_timer(void) {
+    const char *timeout = getenv("HARNESS_TIMEOUT_MS");
+    struct itimerval timer;
+    long ms;
+    if (timeout == NULL || (ms = atol(timeout)) <= 0) {
+        return;
+    }
+    memset(&timer, 0, sizeof(timer));
+    timer.it_value.tv_sec = ms / 1000;
+    timer.it_value.tv_usec = (ms % 1000) * 1000;
+    setitimer(ITIMER_REAL, &timer, NULL);
+}
+
+/* Fork-server mode: read one line of values per request from stdin, fork a
+   child that runs the script on them, and after the child exits print
+   "###HARNESS_DONE### <wait status>" so the client knows the output is complete.
+   The server itself runs without rlimits (its CPU time adds up over a session);
+   each child applies the CPU and memory limits and arms its own wall-clock timer.
+   Batch runs use the same loop with all vectors written to stdin up front. */
+static int harness_fork_server(int argc, char **argv) {
+    static char line[HARNESS_LINE_MAX];
+    char *values[HARNESS_NUM_VALUES + 1];
+    while (fgets(line, sizeof(line), stdin) != NULL) {
+        int count = 0;
+        int status = 0;
+        pid_t pid;
+        char *token = strtok(line, " \\t\\r\\n");
+        while (token != NULL && count <= HARNESS_NUM_VALUES) {
+            values[count++] = token;
+            token = strtok(NULL, " \\t\\r\\n");
+        }
+        if (harness_load_values(values, count) != 0) {
+            status = 2 << 8;
+        } else {
+            fflush(stdout);
+            pid = fork();
+            if (pid == 0) {
+                harness_apply_limits();
+                harness_arm_timer();
+                exit(harness_call_user_main(argc, argv));
+            } else if (pid < 0 || waitpid(pid, &status, 0) < 0) {
+                perror("harness: fork");
+                status = 2 << 8;
+            }
+        }
+        harness_end_record();
+        printf("\\n###HARNESS_DONE### %d\\n", status);
+        fflush(stdout);
+    }
+    return 0;
+}
+
+int main(int argc, char **argv) {
+    if (getenv("HARNESS_RESULT_FD") != NULL) {
+        harness_result_fd = atoi(getenv("HARNESS_RESULT_FD"));
+    }
+    if (getenv("HARNESS_FORKSERVER") != NULL) {
+        return harness_fork_server(argc, argv);
+    }
+    harness_apply_limits();
+    if (harness_load_values(argv + 1, argc - 1) != 0) {
+        return 2;
+    }
+    return harness_call_user_main(argc, argv);
+}
+"""
+
+FORKSERVER_DONE_MARKER = "###HARNESS_DONE###"
+# Extra time a fork server gets beyond a child's wall-clock limit to report its result
+FORKSERVER_GRACE_SECONDS = 5.0
+
+
+def format_c_value(value):
+    """
+    Format a Python or Z3 value so that strtold() in the harness can read it back.
+
+    Z3 rationals print as "1/2" and approximated reals as "0.5?", so they are
+    converted through as_decimal() instead of str().
+    """
+    if hasattr(value, "as_decimal"):
+        return value.as_decimal(17).rstrip('?')
+    if hasattr(value, "as_long"):
+        return str(value.as_long())
+    return str(value)
+
+
+def make_harness_source(code, input_vars):
+    """
+    Turn a placeholder C script into harness source that reads its inputs at runtime.
+
+    Args:
+        code (str): C code containing {var}_placeholder tokens.
+        input_vars (list): Variable names, in the order the values are passed.
+
+    Returns:
+        str: The harness C source.
+    """
+    for index, var in enumerate(input_vars):
+        code = re.sub(rf"\b{re.escape(var)}_placeholder\b", f"harness_value({index})", code)
+    return HARNESS_PRELUDE.format(num_values=len(input_vars)) + code + HARNESS_MAIN
+
+
+def split_forkserver_output(output):
+    """
+    Split the stdout of a fork-server session into one (exit_code, stdout) pair per request.
+    """
+    results = []
+    output_lines = []
+    for line in output.splitlines(keepends=True):
+        if line.startswith(FORKSERVER_DONE_MARKER):
+            status = int(line.split()[1])
+            results.append((os.waitstatus_to_exitcode(status), "".join(output_lines)))
+            output_lines = []
+        else:
+            output_lines.append(line)
+    return results
+
+
+def forkserver_env(limits, result_fd=None):
+    # the CPU and memory limits are applied by each forked child, not by the server
+    env = dict(os.environ, HARNESS_FORKSERVER="1", **limits.as_env())
+    if limits.wall_seconds is not None:
+        env["HARNESS_TIMEOUT_MS"] = str(int(limits.wall_seconds * 1000))
+    if result_fd is not None:
+        env["HARNESS_RESULT_FD"] = str(result_fd)
+    return env
+
+
+def run_with_result_channel(cmd, limits, input=None, env=None):
+    """
+    run_limited() with a pipe passed to the harness as HARNESS_RESULT_FD.
+
+    Returns:
+        tuple: (CompletedProcess, bytes written to the result channel)
+    """
+    read_fd, write_fd = os.pipe()
+    env = dict(env if env is not None else os.environ, HARNESS_RESULT_FD=str(write_fd))
+    # drain the channel concurrently so a large batch can never fill the pipe and stall the harness
+    chunks = []
+    reader = threading.Thread(target=lambda: chunks.append(read_all(read_fd)), daemon=True)
+    reader.start()
+    try:
+        run_result = run_limited(cmd, limits, input=input, env=env, pass_fds=(write_fd,), self_limiting=True)
+    finally:
+        os.close(write_fd)
+        reader.join()
+        os.close(read_fd)
+    return run_result, b"".join(chunks)
+
+
+def parse_run(records, output):
+    """
+    The values parsed from stdout, overridden by the typed values from the result
+    channel: a ###RESULT### line built across several printf calls only reaches the
+    channel with the fields of its first call (or none), so stdout stays the fallback.
+    """
+    result = parse_c_output(output)
+    result.update(merge_records(records) or {})
+    return result
+
+
+class ForkServer:
+    """
+    A long-lived harness process started with HARNESS_FORKSERVER=1. Each evaluate()
+    writes one line of values to its stdin; the server forks a child per request,
+    so candidates are evaluated without re-exec or dynamic-link startup. Typed
+    results come back over a separate result-channel pipe.
+    """
+
+    def __init__(self, exe_path, limits=None):
+        self.exe_path = exe_path
+        self.limits = limits
+        self.process = None
+        self.result_fd = None
+        self.stdout_buffer = b""
+
+    def start(self):
+        limits = self.limits or get_run_limits()
+        self.close()
+        read_fd, write_fd = os.pipe()
+        self.process = popen_limited([self.exe_path], ResourceLimits(), stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE, env=forkserver_env(limits, write_fd),
+                                     text=True, bufsize=1, pass_fds=(write_fd,), self_limiting=True)
+        os.close(write_fd)
+        self.result_fd = read_fd
+        self.stdout_buffer = b""
+        print(f"[INFO] Started fork server for {self.exe_path} (pid {self.process.pid})")
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def evaluate(self, args):
+        """
+        Run the script once on the given argument strings.
+
+        Returns:
+            tuple: (exit_code, stdout, records) where exit_code is negative if the child was
+                   killed by a signal and records are the decoded result-channel records.
+
+        Raises:
+            EvaluationTimeout: if the server itself did not answer within the child's
+                               wall-clock limit plus FORKSERVER_GRACE_SECONDS; it is killed
+                               and restarted by the next evaluate().
+        """
+        if not self.is_alive():
+            self.start()
+        wall_seconds = (self.limits or get_run_limits()).wall_seconds
+        deadline = None if wall_seconds is None else time.monotonic() + wall_seconds + FORKSERVER_GRACE_SECONDS
+        self.process.stdin.write(" ".join(args) + "\n")
+        self.process.stdin.flush()
+
+        output_lines = []
+        while True:
+            line = self.readline(deadline)
+            if not line:
+                raise RuntimeError(f"Fork server {self.exe_path} exited unexpectedly")
+            if line.startswith(FORKSERVER_DONE_MARKER):
+                status = int(line.split()[1])
+                records = read_request(self.result_fd)
+                return os.waitstatus_to_exitcode(status), "".join(output_lines), records
+            output_lines.append(line)
+
+    def readline(self, deadline):
+        """
+        The next line of server output ("" at EOF), waiting until deadline at most.
+        The pipe is read through its fd rather than the buffered file object, so
+        select() never misses data that was already read ahead.
+        """
+        fd = self.process.stdout.fileno()
+        while b"\n" not in self.stdout_buffer:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([fd], [], [], timeout)
+            if not ready:
+                pid = self.process.pid
+                self.kill()
+                raise EvaluationTimeout(f"Fork server {self.exe_path} (pid {pid}) stopped responding, killed it")
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                line, self.stdout_buffer = self.stdout_buffer, b""
+                return line.decode(errors="replace")
+            self.stdout_buffer += chunk
+        line, _, self.stdout_buffer = self.stdout_buffer.partition(b"\n")
+        return line.decode(errors="replace") + "\n"
+
+    def kill(self):
+        kill_process_group(self.process)
+        self.process.wait()
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process = None
+        self.close()
+
+    def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                kill_process_group(self.process)
+                self.process.wait()
+            self.process = None
+        if self.result_fd is not None:
+            os.close(self.result_fd)
+            self.result_fd = None
+
+
+class ScriptHarness:
+    """
+    A placeholder C script (modified_script.c or inverted_solution.c) compiled once
+    per session into an executable that takes the input values on its command line.
+    With forkserver=True the executable is kept running as a ForkServer instead.
+
+    If the script cannot be turned into a harness (e.g. a placeholder is used where
+    a runtime value is not allowed), run() falls back to substituting the values
+    into a script_N.c copy and compiling it, as before. Those copies and the audit
+    trail of evaluated values are handled by a ScratchStore (see scratch_backend).
+
+    Generated files go to scratch_dir (default: next to the script), so harnesses
+    in different worker processes never write to the same paths.
+
+    expected_runs (None: reused for the whole session) picks the compiler and the
+    optimization profile of the harness binary; fallback copies are compiled for speed.
+    """
+
+    def __init__(self, script_path, input_vars, forkserver=False, scratch_dir=None, limits=None,
+                 scratch_backend='disk', retention=100, expected_runs=None):
+        self.script_path = script_path
+        self.limits = limits
+        self.input_vars = list(input_vars)
+        self.scratch_dir = scratch_dir
+        self.scratch = ScratchStore(script_path, backend=scratch_backend, retention=retention, base_dir=scratch_dir)
+        base, _ = os.path.splitext(os.path.basename(script_path))
+        self.harness_path = os.path.join(scratch_dir or os.path.dirname(script_path), f"{base}_harness.c")
+        self.exe_path = None
+        self.compiled = False
+        self.template_code = None
+        self.use_forkserver = forkserver
+        self.forkserver = None
+        self.expected_runs = expected_runs
+
+    def build(self):
+        """
+        Generate and compile the harness. Returns True if the compiled harness is usable.
+        """
+        with open(self.script_path, 'r') as f:
+            self.template_code = f.read()
+        with open(self.harness_path, 'w') as f:
+            f.write(make_harness_source(self.template_code, self.input_vars))
+
+        try:
+            self.exe_path = get_compile_cache().compile(self.harness_path, expected_runs=self.expected_runs)
+        except RuntimeError as e:
+            print(f"[WARN] Could not compile harness for {self.script_path}, falling back to per-candidate compilation:\n{e}")
+            self.compiled = False
+        else:
+            print(f"[INFO] Compiled harness: {self.exe_path}")
+            self.compiled = True
+            if self.use_forkserver:
+                self.forkserver = ForkServer(self.exe_path, limits=self.limits)
+        return self.compiled
+
+    def values_to_args(self, input_values):
+        """
+        Order and format one input vector. Accepts a dict keyed by variable name or a
+        sequence (list, tuple, NumPy row) already in input_vars order.
+        """
+        if not isinstance(input_values, dict):
+            if len(input_values) != len(self.input_vars):
+                raise ValueError(f"Expected {len(self.input_vars)} values ({self.input_vars}), got {len(input_values)}")
+            return [format_c_value(value) for value in input_values]
+        args = []
+        for var in self.input_vars:
+            if var not in input_values:
+                raise ValueError(f"Value for variable '{var}' not provided in input_values dictionary")
+            args.append(format_c_value(input_values[var]))
+        return args
+
+    def run(self, input_values):
+        """
+        Evaluate the script on one set of input values.
+
+        Args:
+            input_values (dict): variable name -> value for every variable in input_vars.
+
+        Returns:
+            dict: Output variables from the run. Values are typed (int/float) when the
+                  script prints a ###RESULT### line, strings parsed from stdout otherwise.
+
+        Raises:
+            EvaluationTimeout: if the run exceeded the wall-clock or CPU limit.
+            EvaluationFailed: if the run crashed or exited with a non-zero code.
+        """
+        if not self.compiled:
+            formatted = {var: format_c_value(value) for var, value in input_values.items()}
+            source = substitute_placeholders(self.template_code, self.input_vars, formatted)
+            script_copy = self.scratch.store(source, input_values)
+            exe_path = get_compile_cache().compile_source(source, script_path=script_copy, expected_runs=1)
+            start = time.perf_counter()
+            run_result = run_limited([exe_path], self.get_limits())
+            get_compile_cache().record_run(exe_path, time.perf_counter() - start)
+            if run_result.returncode != 0:
+                raise EvaluationFailed(f"Execution failed with exit code {run_result.returncode}:\n{run_result.stderr}")
+            return parse_c_output(run_result.stdout)
+
+        self.scratch.record(input_values)
+        if self.forkserver is not None:
+            start = time.perf_counter()
+            returncode, output, records = self.forkserver.evaluate(self.values_to_args(input_values))
+            get_compile_cache().record_run(self.exe_path, time.perf_counter() - start)
+            if returncode in TIMEOUT_EXIT_CODES:
+                raise EvaluationTimeout(f"Evaluation on {input_values} exceeded the run limits ({self.get_limits()})")
+            if returncode != 0:
+                raise EvaluationFailed(f"Execution failed with exit code {returncode}:\n{output}")
+            return parse_run(records, output)
+
+        start = time.perf_counter()
+        run_result, channel = run_with_result_channel([self.exe_path] + self.values_to_args(input_values), self.get_limits())
+        get_compile_cache().record_run(self.exe_path, time.perf_counter() - start)
+        if run_result.returncode != 0:
+            raise EvaluationFailed(f"Execution failed with exit code {run_result.returncode}:\n{run_result.stderr}")
+        groups = decode_stream(channel)
+        return parse_run(groups[0] if groups else [], run_result.stdout)
+
+    def run_batch(self, input_vectors):
+        """
+        Evaluate the script on many input vectors in a single harness invocation: the
+        vectors are fed to the fork-server loop on stdin and it forks once per vector.
+
+        Args:
+            input_vectors (list): dicts or sequences in input_vars order (e.g. rows of a NumPy array).
+
+        Returns:
+            list: Parsed output variables per vector, in order; None for vectors whose run
+                  failed and TIMED_OUT for vectors that exceeded the run limits.
+        """
+        if not self.compiled:
+            results = []
+            for input_values in input_vectors:
+                if not isinstance(input_values, dict):
+                    input_values = dict(zip(self.input_vars, input_values))
+                try:
+                    results.append(self.run(input_values))
+                except EvaluationTimeout as e:
+                    print(f"[WARN] Batch entry timed out: {e}")
+                    results.append(TIMED_OUT)
+                except RuntimeError as e:
+                    print(f"[WARN] Batch entry failed: {e}")
+                    results.append(None)
+            return results
+
+        lines = []
+        for input_values in input_vectors:
+            lines.append(" ".join(self.values_to_args(input_values)))
+            self.scratch.record(input_values if isinstance(input_values, dict) else dict(zip(self.input_vars, input_values)))
+        if not lines:
+            return []
+        limits = self.get_limits()
+        # each child has its own limits; the whole batch only gets a generous overall deadline
+        batch_limits = ResourceLimits()
+        if limits.wall_seconds is not None:
+            batch_limits.wall_seconds = limits.wall_seconds * len(lines) + 5
+        start = time.perf_counter()
+        run_result, channel = run_with_result_channel([self.exe_path], batch_limits, input="\n".join(lines) + "\n",
+                                                      env=forkserver_env(limits))
+        get_compile_cache().record_run(self.exe_path, time.perf_counter() - start, runs=len(lines))
+        if run_result.stderr:
+            print(f"[WARN] Batch run stderr:\n{run_result.stderr}")
+
+        runs = split_forkserver_output(run_result.stdout)
+        if len(runs) != len(lines):
+            raise RuntimeError(f"Batch run returned {len(runs)} results for {len(lines)} inputs:\n{run_result.stderr}")
+        groups = decode_stream(channel)
+        results = []
+        for (returncode, output), records in zip(runs, groups):
+            if returncode == 0:
+                results.append(parse_run(records, output))
+            elif returncode in TIMEOUT_EXIT_CODES:
+                results.append(TIMED_OUT)
+            else:
+                results.append(None)
+        return results
+
+    def get_limits(self):
+        return self.limits or get_run_limits()
+
+    def close(self):
+        if self.forkserver is not None:
+            self.forkserver.close()
+        self.scratch.close()
+
+
+def run_c_script_batch(script_path, input_vars, input_vectors):
+    """
+    Evaluate a placeholder script on many input vectors: compile script_path once
+    as a harness and evaluate all input vectors in one invocation.
+
+    Args:
+        script_path (str): C script with {var}_placeholder tokens (e.g. modified_script.c).
+        input_vars (list): Placeholder variable names, in the order of each vector.
+        input_vectors (list): dicts or sequences of values, one per candidate.
+
+    Returns:
+        list: Parsed output variables per vector, in order (None for failed runs).
+    """
+    harness = ScriptHarness(script_path, input_vars, expected_runs=len(input_vectors))
+    harness.build()
+    return harness.run_batch(input_vectors)
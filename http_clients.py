@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import weakref
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Keep-alive pool per origin; LLM calls are long, so the timeout is generous
+DEFAULT_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=120)
+DEFAULT_TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+
+# Base URL the SDKs use when none is given
+DEFAULT_BASE_URLS = {
+    "OpenAI": "https://api.openai.com/v1",
+    "AsyncOpenAI": "https://api.openai.com/v1",
+    "Groq": "https://api.groq.com",
+    "AsyncGroq": "https://api.groq.com",
+}
+
+_lock = threading.Lock()
+# origin -> httpx.Client
+_http_clients = {}
+# event loop -> origin -> httpx.AsyncClient (async pools belong to one event loop)
+_async_http_clients = weakref.WeakKeyDictionary()
+# (SDK client class, base URL, API key) -> SDK client
+_api_clients = {}
+# event loop -> (SDK client class, base URL, API key) -> async SDK client
+_async_api_clients = weakref.WeakKeyDictionary()
+
+
+def origin(url):
+    """
+    scheme://host:port of a URL: connections can be reused across all paths of an origin.
+    """
+    parsed = httpx.URL(url)
+    port = f":{parsed.port}" if parsed.port else ""
+    return f"{parsed.scheme}://{parsed.host}{port}"
+
+
+def get_http_client(url):
+    """
+    The process-wide pooled keep-alive client for the origin of url (HTTP/2 if the
+    h2 package is installed). Safe to share between threads.
+    """
+    key = origin(url)
+    with _lock:
+        client = _http_clients.get(key)
+        if client is None:
+            client = httpx.Client(http2=HTTP2_AVAILABLE, limits=DEFAULT_LIMITS, timeout=DEFAULT_TIMEOUT)
+            _http_clients[key] = client
+        return client
+
+
+def get_async_http_client(url):
+    """
+    get_http_client() for the running event loop.
+    """
+    key = origin(url)
+    with _lock:
+        per_loop = _async_http_clients.setdefault(asyncio.get_running_loop(), {})
+        client = per_loop.get(key)
+        if client is None:
+            client = httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=DEFAULT_LIMITS, timeout=DEFAULT_TIMEOUT)
+            per_loop[key] = client
+        return client
+
+
+def get_api_client(client_class, api_key=None, base_url=None):
+    """
+    A shared SDK client (e.g. OpenAI or Groq) for one provider endpoint and key,
+    on the pooled HTTP client of its origin, so models of different pipeline stages
+    reuse the same connections.
+    """
+    url = base_url or DEFAULT_BASE_URLS[client_class.__name__]
+    key = (client_class.__name__, url, api_key)
+    with _lock:
+        client = _api_clients.get(key)
+    if client is None:
+        client = client_class(api_key=api_key, base_url=base_url, http_client=get_http_client(url))
+        with _lock:
+            client = _api_clients.setdefault(key, client)
+    return client
+
+
+def get_async_api_client(client_class, api_key=None, base_url=None):
+    """
+    get_api_client() for an async SDK client class (e.g. AsyncOpenAI) and the running event loop.
+    """
+    url = base_url or DEFAULT_BASE_URLS[client_class.__name__]
+    key = (client_class.__name__, url, api_key)
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_api_clients.setdefault(loop, {}).get(key)
+    if client is None:
+        client = client_class(api_key=api_key, base_url=base_url, http_client=get_async_http_client(url))
+        with _lock:
+            client = _async_api_clients[loop].setdefault(key, client)
+    return client
+
+
+def close_http_clients():
+    """
+    Close the pooled synchronous connections (async pools are dropped with their event loop).
+    """
+    with _lock:
+        clients = list(_http_clients.values())
+        _http_clients.clear()
+        _api_clients.clear()
+    for client in clients:
+        client.close()
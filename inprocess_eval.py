@@ -0,0 +1,310 @@
+import ctypes
+import os
+import re
+import select
+import signal
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from compile_cache import get_compile_cache
+from inprocess_worker import REQUEST_HEADER
+from limits import popen_limited, kill_process_group, get_run_limits, ResourceLimits, EvaluationTimeout, EvaluationFailed
+
+# Scalar C types the wrapper knows how to convert to and from double
+C_SCALAR_TYPES = {
+    "double", "float", "long double",
+    "int", "long", "long long", "short", "char", "_Bool", "bool",
+    "unsigned", "unsigned int", "unsigned long", "unsigned long long", "unsigned short", "unsigned char",
+    "signed char", "size_t",
+}
+
+SHARED_LIB_PRELUDE = """#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <math.h>
+#include <stdbool.h>
+
+"""
+
+# The worker only imports the standard library, so it starts fast and fits in small memory limits
+WORKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inprocess_worker.py")
+# Extra time a worker gets beyond the rows' wall-clock limit to answer
+WORKER_GRACE_SECONDS = 5.0
+
+FUNC_DEF_PATTERN = re.compile(
+    r'^[ \t]*((?:static\s+|inline\s+|extern\s+)*)([A-Za-z_][\w \t]*?[\s\*]+)([A-Za-z_]\w*)\s*\(([^)]*)\)\s*\{',
+    re.MULTILINE)
+
+
+def parse_c_functions(code):
+    """
+    Find function definitions in C source.
+
+    Functions with parameters that cannot be bound (arrays, function pointers, ...)
+    are skipped.
+
+    Returns:
+        list: (name, return_type, [(param_type, param_name, is_pointer), ...]) per function.
+    """
+    functions = []
+    for match in FUNC_DEF_PATTERN.finditer(code):
+        return_type = " ".join(match.group(2).replace("*", " * ").split())
+        name = match.group(3)
+        if name in {"if", "for", "while", "switch", "main"}:
+            continue
+        params = []
+        param_text = match.group(4).strip()
+        if param_text and param_text != "void":
+            for param in param_text.split(","):
+                param_match = re.match(r'^\s*(?:const\s+)?([\w\s]+?)\s*(\*?)\s*([A-Za-z_]\w*)\s*$', param)
+                if not param_match:
+                    params = None
+                    break
+                param_type = " ".join(param_match.group(1).split())
+                params.append((param_type, param_match.group(3), bool(param_match.group(2))))
+        if params is not None:
+            functions.append((name, return_type, params))
+    return functions
+
+
+def make_wrapper_source(name, return_type, params, input_vars, output_vars):
+    """
+    Generate harness_call()/harness_batch() wrappers that take the inputs as a double
+    vector (in input_vars order) and write the outputs into a double vector (in
+    output_vars order), so ctypes can bind any supported signature the same way.
+    """
+    for param_type, param_name, _ in params:
+        if param_type not in C_SCALAR_TYPES:
+            raise ValueError(f"Unsupported type '{param_type}' for parameter '{param_name}' of '{name}'")
+
+    pointer_params = [p for p in params if p[2]]
+
+    # inputs and outputs are bound by name only: a guessed binding would silently feed
+    # values into the wrong arguments, so callers fall back to the script harness instead
+    input_index = {}
+    for param_type, param_name, is_pointer in params:
+        if param_name in input_vars:
+            input_index[param_name] = input_vars.index(param_name)
+        elif not is_pointer:
+            raise ValueError(f"Parameter '{param_name}' of '{name}' is not an input variable ({input_vars})")
+
+    # outputs: pointer parameters of the same name, else (for one output) the return value
+    local_names = {p[1]: f"harness_ptr_{i}" for i, p in enumerate(pointer_params)}
+    output_sources = {}
+    for var in output_vars:
+        if var in local_names:
+            output_sources[var] = local_names[var]
+        elif return_type != "void" and "harness_ret" not in output_sources.values():
+            output_sources[var] = "harness_ret"
+        else:
+            raise ValueError(f"Cannot find where '{name}' writes output variable '{var}'")
+
+    lines = ["static void harness_eval(const double *harness_in, double *harness_out) {"]
+    for param_type, param_name, _ in pointer_params:
+        init = f"({param_type})harness_in[{input_index[param_name]}]" if param_name in input_index else "0"
+        lines.append(f"    {param_type} {local_names[param_name]} = {init};")
+    args = []
+    for param_type, param_name, is_pointer in params:
+        args.append(f"&{local_names[param_name]}" if is_pointer else f"({param_type})harness_in[{input_index[param_name]}]")
+    call = f"{name}({', '.join(args)});"
+    if return_type != "void":
+        call = f"{return_type} harness_ret = {call}"
+    lines.append(f"    {call}")
+    for i, var in enumerate(output_vars):
+        lines.append(f"    harness_out[{i}] = (double){output_sources[var]};")
+    lines.append("}")
+    lines.append("")
+    lines.append("void harness_call(const double *harness_in, double *harness_out) {")
+    lines.append("    harness_eval(harness_in, harness_out);")
+    lines.append("}")
+    lines.append("")
+    lines.append("void harness_batch(long n, const double *harness_in, double *harness_out) {")
+    lines.append("    long i;")
+    lines.append("    for (i = 0; i < n; i++) {")
+    lines.append(f"        harness_eval(harness_in + i * {max(len(input_vars), 1)}, harness_out + i * {max(len(output_vars), 1)});")
+    lines.append("    }")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+class InProcessFunction:
+    """
+    The difficult function compiled once into a shared library and called through
+    ctypes, so forward evaluations are plain function calls instead of process runs.
+
+    The library is loaded in a persistent worker process, never in the driver: an
+    infinite loop, a crash or a runaway allocation in the user's code only takes
+    the worker down. The worker runs under the memory limit of the run limits, its
+    CPU limit is re-armed for every request, and the driver kills it when a request
+    exceeds the wall-clock limit (EvaluationTimeout); a new worker is started on
+    the next call.
+
+    Only numeric scalar parameters are supported, bound to the IO variables by name;
+    outputs are read from pointer parameters or the return value. All values cross
+    the boundary as doubles. Unlike ScriptHarness this calls the function directly,
+    without whatever the generated main() does around the call.
+    """
+
+    def __init__(self, source_path, input_vars, output_vars, function_name=None, scratch_dir=None, limits=None):
+        self.source_path = source_path
+        self.input_vars = list(input_vars)
+        self.output_vars = list(output_vars)
+        self.function_name = function_name
+        self.limits = limits
+        base, _ = os.path.splitext(os.path.basename(source_path))
+        self.wrapper_path = os.path.join(scratch_dir or os.path.dirname(source_path) or ".", f"{base}_shared.c")
+        self.lib_path = None
+        self.process = None
+
+    def select_function(self, functions):
+        if not functions:
+            raise ValueError(f"No function definition found in {self.source_path}")
+        if self.function_name:
+            for function in functions:
+                if function[0] == self.function_name:
+                    return function
+            raise ValueError(f"Function '{self.function_name}' not found in {self.source_path}")
+        # prefer the function whose parameters mention the most IO variables
+        io_vars = set(self.input_vars) | set(self.output_vars)
+        return max(functions, key=lambda f: sum(p[1] in io_vars for p in f[2]))
+
+    def build(self):
+        """
+        Generate the wrappers, compile the shared library and start the worker.
+
+        Raises:
+            ValueError: if the function signature is not supported or its parameters
+                        do not match the IO variables by name.
+            RuntimeError: if compilation fails or the worker cannot load the library.
+        """
+        with open(self.source_path, 'r') as f:
+            code = f.read()
+        name, return_type, params = self.select_function(parse_c_functions(code))
+        wrapper = make_wrapper_source(name, return_type, params, self.input_vars, self.output_vars)
+        with open(self.wrapper_path, 'w') as f:
+            f.write(SHARED_LIB_PRELUDE + code + "\n\n" + wrapper)
+
+        self.lib_path = get_compile_cache().compile(self.wrapper_path, flags=('-shared', '-fPIC', '-lm'))
+        self.start()
+        print(f"[INFO] Loaded '{name}' from {self.lib_path} for in-process evaluation (worker pid {self.process.pid})")
+        return True
+
+    def get_limits(self):
+        return self.limits or get_run_limits()
+
+    def start(self):
+        self.close()
+        limits = self.get_limits()
+        self.process = popen_limited([sys.executable, WORKER_PATH, self.lib_path,
+                                      str(len(self.input_vars)), str(len(self.output_vars))],
+                                     ResourceLimits(memory_bytes=limits.memory_bytes),
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        # the worker reports once the library is loaded
+        if self.process.stdout.read(1) != b"R":
+            returncode = self.process.wait()
+            self.process = None
+            raise RuntimeError(f"In-process worker could not load {self.lib_path} (exit code {returncode})")
+
+    def call(self, rows, n):
+        """
+        Evaluate n rows (a flat buffer of n * len(input_vars) doubles) in the worker.
+
+        Returns:
+            bytes: n * len(output_vars) doubles.
+
+        Raises:
+            EvaluationTimeout: if the rows exceeded the wall-clock or CPU limit.
+            EvaluationFailed: if the user code crashed the worker.
+        """
+        if self.process is None or self.process.poll() is not None:
+            self.start()
+        limits = self.get_limits()
+        cpu_seconds = limits.cpu_seconds * n if limits.cpu_seconds is not None else 0.0
+        deadline = None if limits.wall_seconds is None else \
+            time.monotonic() + limits.wall_seconds * n + WORKER_GRACE_SECONDS
+        start = time.perf_counter()
+        try:
+            self.process.stdin.write(REQUEST_HEADER.pack(n, cpu_seconds) + bytes(rows))
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            pass  # the worker died, reported below
+        size = n * len(self.output_vars) * 8
+        fd = self.process.stdout.fileno()
+        chunks = []
+        while size > 0:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([fd], [], [], timeout)
+            if not ready:
+                self.kill()
+                raise EvaluationTimeout(f"In-process evaluation of {n} rows exceeded the run limits ({limits})")
+            chunk = os.read(fd, size)
+            if not chunk:
+                returncode = self.process.wait()
+                self.kill()
+                if returncode == -signal.SIGXCPU:
+                    raise EvaluationTimeout(f"In-process evaluation of {n} rows exceeded the CPU limit ({limits})")
+                raise EvaluationFailed(f"In-process evaluation crashed the worker (exit code {returncode})")
+            chunks.append(chunk)
+            size -= len(chunk)
+        get_compile_cache().record_run(self.lib_path, time.perf_counter() - start, runs=n)
+        return b"".join(chunks)
+
+    def run(self, input_values):
+        """
+        Call the function once.
+
+        Args:
+            input_values (dict): variable name -> value for every variable in input_vars.
+
+        Returns:
+            dict: output variable name -> float
+        """
+        for var in self.input_vars:
+            if var not in input_values:
+                raise ValueError(f"Value for variable '{var}' not provided in input_values dictionary")
+        in_buf = (ctypes.c_double * len(self.input_vars))(*[float(input_values[var]) for var in self.input_vars])
+        out_buf = (ctypes.c_double * len(self.output_vars)).from_buffer_copy(self.call(in_buf, 1))
+        return {var: out_buf[i] for i, var in enumerate(self.output_vars)}
+
+    def run_batch(self, input_vectors):
+        """
+        Call the function on every row of an (N x len(input_vars)) array in one C loop.
+
+        Args:
+            input_vectors: NumPy array, or list of dicts / sequences in input_vars order.
+
+        Returns:
+            (N x len(output_vars)) NumPy array.
+        """
+        if isinstance(input_vectors, np.ndarray):
+            rows = input_vectors
+        else:
+            rows = [[v[var] for var in self.input_vars] if isinstance(v, dict) else v for v in input_vectors]
+        n = len(rows)
+        n_in = len(self.input_vars)
+        n_out = len(self.output_vars)
+        in_arr = np.ascontiguousarray(rows, dtype=np.float64).reshape(n, n_in)
+        return np.frombuffer(self.call(in_arr, n), dtype=np.float64).reshape(n, n_out)
+
+    def kill(self):
+        if self.process is not None:
+            kill_process_group(self.process)
+            self.process.wait()
+            self.close()
+
+    def close(self):
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                kill_process_group(self.process)
+                self.process.wait()
+            self.process.stdout.close()
+            self.process = None
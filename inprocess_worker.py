@@ -0,0 +1,65 @@
+import ctypes
+import os
+import resource
+import struct
+import sys
+
+# Request header: number of input rows, CPU seconds allowed for them (0: unlimited).
+# A request is followed by rows * n_in doubles and answered with rows * n_out doubles.
+REQUEST_HEADER = struct.Struct("<qd")
+
+
+def _read_exact(stream, size):
+    data = b""
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def serve(lib_path, n_in, n_out):
+    """
+    Worker loop (see InProcessFunction): evaluate requests from stdin until it closes.
+    """
+    # keep the protocol on private descriptors, so the user's code can neither read
+    # the requests from stdin nor corrupt the responses by printing to stdout
+    requests = os.fdopen(os.dup(0), "rb")
+    responses = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(2, 1)
+
+    lib = ctypes.CDLL(lib_path)
+    double_p = ctypes.POINTER(ctypes.c_double)
+    lib.harness_batch.argtypes = [ctypes.c_long, double_p, double_p]
+    lib.harness_batch.restype = None
+    responses.write(b"R")
+    responses.flush()
+
+    while True:
+        header = _read_exact(requests, REQUEST_HEADER.size)
+        if header is None:
+            return
+        n, cpu_seconds = REQUEST_HEADER.unpack(header)
+        data = _read_exact(requests, n * n_in * 8)
+        if data is None:
+            return
+        # the wrappers step through the buffers by at least one value per row
+        in_buf = (ctypes.c_double * (n * max(n_in, 1)))()
+        ctypes.memmove(in_buf, data, len(data))
+        out_buf = (ctypes.c_double * (n * max(n_out, 1)))()
+        if cpu_seconds > 0:
+            # RLIMIT_CPU counts the worker's whole lifetime: allow cpu_seconds more than used so far
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+            soft = int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1
+            resource.setrlimit(resource.RLIMIT_CPU, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+        lib.harness_batch(n, in_buf, out_buf)
+        responses.write(bytes(out_buf)[:n * n_out * 8])
+        responses.flush()
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]))
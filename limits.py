@@ -0,0 +1,141 @@
+import os
+import resource
+import signal
+import subprocess
+import time
+
+
+class EvaluationTimeout(RuntimeError):
+    """
+    Raised when a compile or a candidate run exceeds its wall-clock or CPU limit.
+    Callers treat it as a skippable candidate rather than a fatal error.
+    """
+
+
+class EvaluationFailed(RuntimeError):
+    """
+    Raised when a candidate run crashes or exits with an error, e.g. a segfault, an
+    abort or an allocation beyond the memory limit. Skippable like EvaluationTimeout.
+    """
+
+
+# Exit codes (negative signal numbers) that mean the process hit a time limit. SIGKILL is
+# not one of them: the soft CPU limit (SIGXCPU) always comes first, and a SIGKILL is
+# usually the OOM killer or someone else, which must be reported rather than skipped.
+TIMEOUT_EXIT_CODES = {-signal.SIGALRM, -signal.SIGXCPU}
+
+
+class ResourceLimits:
+    """
+    Wall-clock, CPU and memory limits for a child process. None disables a limit.
+
+    The CPU and memory limits are enforced with setrlimit() in the child; the wall
+    clock limit by killing the child's whole process group when it expires.
+    """
+
+    def __init__(self, wall_seconds=None, cpu_seconds=None, memory_bytes=None):
+        self.wall_seconds = wall_seconds
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+
+    def apply(self):
+        """
+        Set the rlimits in the current process (used as preexec_fn in the child).
+        """
+        if self.cpu_seconds is not None:
+            cpu = max(1, int(self.cpu_seconds))
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+        if self.memory_bytes is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (self.memory_bytes, self.memory_bytes))
+
+    def as_env(self):
+        """
+        Environment variables a harness binary reads to apply the rlimits to itself.
+        """
+        env = {}
+        if self.cpu_seconds is not None:
+            env["HARNESS_CPU_LIMIT"] = str(max(1, int(self.cpu_seconds)))
+        if self.memory_bytes is not None:
+            env["HARNESS_MEMORY_LIMIT"] = str(self.memory_bytes)
+        return env
+
+    def __repr__(self):
+        return (f"ResourceLimits(wall_seconds={self.wall_seconds}, cpu_seconds={self.cpu_seconds}, "
+                f"memory_bytes={self.memory_bytes})")
+
+
+# Returned by batch and parallel evaluations in place of a result for candidates that timed out
+TIMED_OUT = "timed_out"
+
+# Defaults for compiling generated scripts and for running candidates
+_compile_limits = ResourceLimits(wall_seconds=60, memory_bytes=2 * 1024 ** 3)
+_run_limits = ResourceLimits(wall_seconds=10, cpu_seconds=10, memory_bytes=1024 ** 3)
+
+
+def configure_limits(run=None, compile=None):
+    """
+    Replace the process-wide default limits for candidate runs and/or compiles.
+    """
+    global _run_limits, _compile_limits
+    if run is not None:
+        _run_limits = run
+    if compile is not None:
+        _compile_limits = compile
+
+
+def get_run_limits():
+    return _run_limits
+
+
+def get_compile_limits():
+    return _compile_limits
+
+
+def popen_limited(cmd, limits, self_limiting=False, **kwargs):
+    """
+    Start cmd in its own process group with the given rlimits applied.
+
+    If self_limiting, the program applies the rlimits itself (harness binaries read
+    them from the environment). That avoids a preexec_fn, which forces the slow
+    fork-the-interpreter spawn path and costs milliseconds per run.
+    """
+    if self_limiting:
+        kwargs["env"] = dict(kwargs.get("env") or os.environ, **limits.as_env())
+        return subprocess.Popen(cmd, start_new_session=True, **kwargs)
+    return subprocess.Popen(cmd, start_new_session=True, preexec_fn=limits.apply, **kwargs)
+
+
+def kill_process_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def run_limited(cmd, limits, input=None, env=None, pass_fds=(), self_limiting=False):
+    """
+    Run cmd to completion under the given limits, like subprocess.run(capture_output=True, text=True).
+
+    Raises:
+        EvaluationTimeout: if the wall-clock or CPU limit was hit; the process group is killed.
+    """
+    process = popen_limited(cmd, limits, stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env,
+                            pass_fds=pass_fds, self_limiting=self_limiting)
+    start = time.monotonic()
+    try:
+        stdout, stderr = process.communicate(input=input, timeout=limits.wall_seconds)
+    except subprocess.TimeoutExpired:
+        kill_process_group(process)
+        process.communicate()
+        raise EvaluationTimeout(f"'{cmd[0]}' exceeded the wall-clock limit of {limits.wall_seconds}s")
+    elapsed = time.monotonic() - start
+
+    if limits.cpu_seconds is not None:
+        # a process that ignores SIGXCPU gets SIGKILL at the hard CPU limit, but a SIGKILL
+        # before the process can have used that much CPU time came from elsewhere
+        # (e.g. the OOM killer) and is returned to the caller as a failure
+        if process.returncode == -signal.SIGXCPU or \
+                (process.returncode == -signal.SIGKILL and elapsed >= limits.cpu_seconds):
+            raise EvaluationTimeout(f"'{cmd[0]}' exceeded the CPU limit of {limits.cpu_seconds}s")
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
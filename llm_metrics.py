@@ -0,0 +1,145 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Record of the LLM query running in the current thread or task (see MetricsStream.track())
+_current_record = contextvars.ContextVar("llm_query_record", default=None)
+
+
+def count_attempt(retry_state=None):
+    """
+    Count one provider request of the current query; used as the tenacity `before`
+    hook of the _query implementations, so retries show up in the metrics.
+    """
+    record = _current_record.get()
+    if record is not None:
+        record["attempts"] += 1
+
+
+def note_usage(usage):
+    """
+    Record the token usage reported by the provider for the current query.
+
+    Args:
+        usage: The `usage` of an OpenAI-compatible response, as an object or a dict (or None).
+    """
+    record = _current_record.get()
+    if record is None:
+        return
+    record["attempts"] = max(record["attempts"], 1)
+    if usage is None:
+        return
+    get = usage.get if isinstance(usage, dict) else lambda field: getattr(usage, field, None)
+    record["prompt_tokens"] = get("prompt_tokens") or 0
+    record["completion_tokens"] = get("completion_tokens") or 0
+
+
+class MetricsStream:
+    """
+    Per-query LLM metrics: stage, provider, model, prompt/completion tokens, latency,
+    retries and whether the response came from the response cache. Records are
+    appended to a JSONL file (if path is set) as they complete and aggregated per
+    stage for summary().
+
+    prices maps a model name to its (prompt, completion) price per million tokens;
+    models without a price are reported without cost.
+    """
+
+    def __init__(self, path=None, prices=None):
+        self.path = path
+        self.prices = prices or {}
+        self.lock = threading.Lock()
+        self.stages = {}
+        # tells the runs apart when a log folder (and so the JSONL file) is reused
+        self.run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+
+    @contextmanager
+    def track(self, provider, model_name, stage):
+        """
+        Measure one query. The with-block runs the query; _query implementations fill in
+        the attempts and the token usage via count_attempt() and note_usage().
+        """
+        record = {"run": self.run_id, "stage": stage or "unknown", "provider": provider, "model": model_name,
+                  "prompt_tokens": 0, "completion_tokens": 0, "attempts": 0, "error": None}
+        token = _current_record.set(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_record.reset(token)
+            record["latency_seconds"] = time.perf_counter() - start
+            record["retries"] = max(0, record["attempts"] - 1)
+            record["cached"] = record["attempts"] == 0 and record["error"] is None
+            record["cost"] = self.cost(model_name, record["prompt_tokens"], record["completion_tokens"])
+            record["timestamp"] = time.time()
+            self.add(record)
+
+    def cost(self, model_name, prompt_tokens, completion_tokens):
+        if model_name not in self.prices:
+            return None
+        prompt_price, completion_price = self.prices[model_name]
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6
+
+    def add(self, record):
+        with self.lock:
+            if self.path:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(record) + "\n")
+            stage = self.stages.setdefault(record["stage"], {
+                "queries": 0, "cached": 0, "errors": 0, "retries": 0, "prompt_tokens": 0,
+                "completion_tokens": 0, "latency_seconds": 0.0, "cost": 0.0, "priced": True})
+            stage["queries"] += 1
+            stage["cached"] += record["cached"]
+            stage["errors"] += record["error"] is not None
+            stage["retries"] += record["retries"]
+            stage["prompt_tokens"] += record["prompt_tokens"]
+            stage["completion_tokens"] += record["completion_tokens"]
+            stage["latency_seconds"] += record["latency_seconds"]
+            if record["cost"] is None:
+                stage["priced"] = False
+            else:
+                stage["cost"] += record["cost"]
+
+    def summary(self):
+        with self.lock:
+            stages = {name: dict(stage) for name, stage in self.stages.items()}
+        if not stages:
+            return
+        total_seconds = sum(stage["latency_seconds"] for stage in stages.values())
+        total_tokens = sum(stage["prompt_tokens"] + stage["completion_tokens"] for stage in stages.values())
+        print(f"[INFO] LLM usage: {sum(s['queries'] for s in stages.values())} queries, {total_tokens} tokens, "
+              f"{total_seconds:.1f}s waiting" + (f", metrics in {self.path}" if self.path else ""))
+        for name, stage in sorted(stages.items(), key=lambda item: -item[1]["latency_seconds"]):
+            cost = f", ${stage['cost']:.4f}" if stage["priced"] else ""
+            print(f"[INFO]   {name}: {stage['queries']} queries ({stage['cached']} cached, {stage['retries']} retries, "
+                  f"{stage['errors']} failed), {stage['prompt_tokens']} prompt + {stage['completion_tokens']} "
+                  f"completion tokens, {stage['latency_seconds']:.1f}s{cost}")
+
+
+_metrics = MetricsStream()
+
+
+def configure_metrics(path=None, prices_path=None):
+    """
+    Replace the process-wide metrics stream, writing to path (JSONL) and pricing
+    with the JSON file at prices_path ({model: [prompt, completion] per 1M tokens}).
+    """
+    global _metrics
+    prices = None
+    if prices_path:
+        with open(prices_path) as f:
+            prices = {model: tuple(price) for model, price in json.load(f).items()}
+    if path:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    _metrics = MetricsStream(path, prices)
+    return _metrics
+
+
+def get_metrics():
+    return _metrics
@@ -1,13 +1,25 @@
 import argparse
 import os
-from z3_scripts import parse_to_z3, read_constraints, find_diverse_solutions,  find_diverse_solutions_v2,add_fixed_values_z3_constraints, find_maxsat_solution, exclude_solution_from_constraints, get_diverse_median_solution_wrapper, find_numeric_min_solution
-from model import get_model
+from z3_scripts import parse_to_z3, read_constraints, find_numeric_min_solution, SolverSession, configure_solver_budget
+from solver_portfolio import configure_portfolio, get_portfolio
+from model import get_model, configure_concurrency
 from get_inverted_solutions import inverted_solutions_simple
 from get_inversion import invert_code
 from check_input import get_modified_script
 from get_IO_vars import get_io_vars, get_total_vars
 from get_inital_seed import get_inital_seed
-from helper_functions import setup_log_folder, generate_script_copies, compile_and_run_c_script
+from helper_functions import setup_log_folder
+from harness import ScriptHarness
+from inprocess_eval import InProcessFunction
+from compile_cache import get_compile_cache
+from response_cache import configure_response_cache, get_response_cache
+from http_clients import close_http_clients
+from llm_metrics import configure_metrics, get_metrics
+from limits import ResourceLimits, EvaluationTimeout, EvaluationFailed, TIMED_OUT, configure_limits
+from compilers import configure_compiler
+from smt2_frontend import is_smt2_file, load_smt2_constraints
+from task_graph import TaskGraph
+from parallel_eval import ParallelEvaluator
 import random
 import subprocess
 import re
@@ -20,7 +32,7 @@ def create_log_folders_and_models(log_folder,model_type):
     else:
         print(f"[INFO] Using existing log folder: {log_folder_total}")
     #create the model
-    model_total = get_model(model_type, 0.5, log_folder_total)
+    model_total = get_model(model_type, 0.5, log_folder_total, stage="total_vars")
     #input output log folder
     log_folder_io= os.path.join(log_folder, "io_vars")
     if not os.path.exists(log_folder_io):
@@ -29,7 +41,7 @@ def create_log_folders_and_models(log_folder,model_type):
     else:
         print(f"[INFO] Using existing log folder: {log_folder_io}")
     #create the model
-    model_io = get_model(model_type, 0.5, log_folder_io)
+    model_io = get_model(model_type, 0.5, log_folder_io, stage="io_vars")
 
     #inverted solutions log folder
     log_folder_inverted= os.path.join(log_folder, "inverted_solutions")
@@ -40,7 +52,7 @@ def create_log_folders_and_models(log_folder,model_type):
         print(f"[INFO] Using existing log folder: {log_folder_inverted}")
 
     #create the model
-    model_inverted = get_model(model_type, 0.5, log_folder_inverted)
+    model_inverted = get_model(model_type, 0.5, log_folder_inverted, stage="inverted")
 
     #create the folder for intial seed
     log_folder_seed= os.path.join(log_folder, "seed")
@@ -49,7 +61,7 @@ def create_log_folders_and_models(log_folder,model_type):
         print(f"[INFO] Created log folder: {log_folder_seed}")
     else:
         print(f"[INFO] Using existing log folder: {log_folder_seed}")
-    model_seed = get_model(model_type, 0.5, log_folder_seed)
+    model_seed = get_model(model_type, 0.5, log_folder_seed, stage="seed")
 
     #create the folder for modified code
     log_folder_modified= os.path.join(log_folder, "modified_script")
@@ -59,20 +71,21 @@ def create_log_folders_and_models(log_folder,model_type):
     else:
         print(f"[INFO] Using existing log folder: {log_folder_modified}")
 
-    model_modified = get_model(model_type, 0.5, log_folder_modified)
+    model_modified = get_model(model_type, 0.5, log_folder_modified, stage="modified_script")
 
     return model_total, model_io, model_inverted, model_seed, model_modified, log_folder_total, log_folder_io, log_folder_inverted, log_folder_modified
 
 
-def check_constraints_with_fallback(z3_constraints, ctx, inputs_concrete, types_dict, max_solutions=1):
+def check_constraints_with_fallback(session, inputs_concrete, types_dict, max_solutions=1):
     """
     Checks if the constraints are satisfiable with the given concrete inputs.
     If satisfiable, returns the solution and True.
     If not, performs MaxSAT refinement and returns the refined solution and False.
+    The refined solution may be an approximate one if the solver budget ran out,
+    or None if no solution was found within it.
 
     Args:
-        z3_constraints (list): List of Z3 constraint expressions.
-        ctx (dict): Context dictionary for Z3 variables.
+        session (SolverSession): Solver session of the constraint set (pre or post).
         inputs_concrete (dict): Concrete inputs to fix in the constraints.
         types_dict (dict): Dictionary of types for the inputs.
         max_solutions (int): Max number of diverse solutions to search for (default 1).
@@ -80,18 +93,15 @@ def check_constraints_with_fallback(z3_constraints, ctx, inputs_concrete, types_
     Returns:
         tuple: (solution_dict, is_satisfiable)
     """
-    # Add fixed values to constraints
-    z3_constraints_updated, ctx_updated = add_fixed_values_z3_constraints(z3_constraints, inputs_concrete, ctx, types_dict)
-    print(f"Z3 constraints after adding fixed values: {z3_constraints_updated}")
-    print(f"Context after adding fixed values: {ctx_updated}")
-
-    # Try to find a solution
-    solutions = get_diverse_median_solution_wrapper(z3_constraints_updated, max_solutions=max_solutions)
+    # Fix the values in a scope of the session's solver and try to find a solution
+    print(f"Checking {session.name} constraints with fixed values: {inputs_concrete}")
+    solutions = session.diverse_solutions(max_solutions=max_solutions, fixed_values=inputs_concrete, types_dict=types_dict)
     #if the solutions is none or empty we should go to maxsat
     if not solutions or len(solutions) == 0:
         print("No solution found using standard SAT solving.")
-        sol_maxsat = find_numeric_min_solution(z3_constraints, inputs_concrete, ctx)
-        print(f"MaxSAT solution: {sol_maxsat}")
+        sol_maxsat, status = find_numeric_min_solution(session.constraints(), inputs_concrete, session.ctx,
+                                                       with_status=True, portfolio=session.portfolio)
+        print(f"MaxSAT solution ({status}): {sol_maxsat}")
         return sol_maxsat, False
     else:
         print(f"Found a solution: {solutions[0]}")
@@ -99,6 +109,18 @@ def check_constraints_with_fallback(z3_constraints, ctx, inputs_concrete, types_
 
 
 
+def run_or_skip(harness, input_values):
+    """
+    Run one candidate, returning None instead of raising if it exceeded the run limits
+    or crashed, so the retry loops can skip it and move on.
+    """
+    try:
+        return harness.run(input_values)
+    except (EvaluationTimeout, EvaluationFailed) as e:
+        print(f"[WARN] Skipping candidate {input_values}: {e}")
+        return None
+
+
 def main():
     retries_max = 5
     retries_internal =3
@@ -110,14 +132,74 @@ def main():
     parser.add_argument('--full_code', required=True,
                         help='Path to C file containing the whole program')
     parser.add_argument('--pre_constraints', required=True,
-                        help='Path to file containing pre-constraints (for MAXSAT)')
+                        help='Path to file containing pre-constraints (for MAXSAT), or an SMT-LIB2 (.smt2) query')
     parser.add_argument('--post_constraints', required=True,
-                        help='Path to file containing post-constraints (for MAXSAT)')
+                        help='Path to file containing post-constraints (for MAXSAT), or an SMT-LIB2 (.smt2) query')
     parser.add_argument('--log_folder', required=False,
                         help='Path to log folder (optional, default: log_temp)')
     parser.add_argument('--model', required=False,
                         help='Model to use (optional, default: deepseek-v3-aliyun)')
+    parser.add_argument('--backend', required=False, choices=['harness', 'inprocess'], default='harness',
+                        help='How to run the difficult function: compiled harness of the modified script, '
+                             'or a direct call into a shared library built from --difficult_func, run in a limited worker '
+                             'process; inprocess skips the modified-script LLM query (default: harness)')
+    parser.add_argument('--timeout', required=False, type=float, default=10,
+                        help='Wall-clock limit in seconds per candidate run (optional, default: 10)')
+    parser.add_argument('--cpu_limit', required=False, type=float, default=10,
+                        help='CPU time limit in seconds per candidate run (optional, default: 10)')
+    parser.add_argument('--memory_limit_mb', required=False, type=int, default=1024,
+                        help='Address space limit in MB per candidate run (optional, default: 1024)')
+    parser.add_argument('--scratch', required=False, choices=['disk', 'tmpfs', 'memory'], default='memory',
+                        help='Where substituted script copies go when a script cannot be compiled as a harness '
+                             '(optional, default: memory)')
+    parser.add_argument('--scratch_retention', required=False, type=int, default=100,
+                        help='How many script copies and audited value vectors to keep per script (optional, default: 100)')
+    parser.add_argument('--compiler', required=False, choices=['auto', 'gcc', 'clang', 'tcc'], default='auto',
+                        help='C compiler for harnesses and script copies; auto prefers tcc for one-shot '
+                             'builds and gcc/clang for reused ones (optional, default: auto)')
+    parser.add_argument('--compile_profile', required=False, choices=['auto', 'fast', 'optimized'], default='auto',
+                        help='fast (-O0) or optimized (-O2 -march=native) builds; auto picks by expected reuse '
+                             '(optional, default: auto)')
+    parser.add_argument('--pool_size', required=False, type=int, default=100,
+                        help='How many diverse post-constraint solutions to draw as output targets (optional, default: 100)')
+    parser.add_argument('--sample_budget', required=False, type=float, default=5.0,
+                        help='Time budget in seconds for drawing the pool of solutions (optional, default: 5)')
+    parser.add_argument('--solver_timeout', required=False, type=float, default=30,
+                        help='Time limit in seconds per MaxSAT/optimization call; the best solution found so far '
+                             'is used when it runs out (optional, default: 30)')
+    parser.add_argument('--solver_budget', required=False, type=float, default=None,
+                        help='Total time budget in seconds for MaxSAT/optimization calls over the run '
+                             '(optional, default: unlimited)')
+    parser.add_argument('--portfolio_workers', required=False, type=int, default=0,
+                        help='Race up to this many solver configurations in parallel for each solve '
+                             '(optional, default: 0, i.e. a single configuration)')
+    parser.add_argument('--portfolio_stats', required=False, default=None,
+                        help='JSON file to load and save per-strategy portfolio win statistics (optional)')
+    parser.add_argument('--llm_cache', required=False, choices=['use', 'refresh', 'bypass'], default='bypass',
+                        help='use: answer repeated LLM queries from the response cache (replays earlier answers, '
+                             'rejected ones included), refresh: query again and update it, bypass: do not touch it '
+                             '(optional, default: bypass)')
+    parser.add_argument('--llm_cache_ttl', required=False, type=float, default=None,
+                        help='Ignore cached LLM responses older than this many seconds (optional, default: no expiry)')
+    parser.add_argument('--llm_concurrency', required=False, type=int, default=8,
+                        help='Max concurrent LLM requests per provider on the async query path (optional, default: 8)')
+    parser.add_argument('--eval_workers', required=False, type=int, default=0,
+                        help='When moving on to new post candidates, invert this many of them at once in parallel '
+                             'worker processes (optional, default: 0, i.e. one at a time in this process)')
+    parser.add_argument('--llm_prices', required=False, default=None,
+                        help='JSON file of {model: [prompt, completion] USD per million tokens}, to report the '
+                             'cost of each stage (optional)')
     args = parser.parse_args()
+    configure_limits(run=ResourceLimits(wall_seconds=args.timeout, cpu_seconds=args.cpu_limit,
+                                        memory_bytes=args.memory_limit_mb * 1024 * 1024))
+    try:
+        configure_compiler(compiler=args.compiler, profile=args.compile_profile)
+    except ValueError as e:
+        parser.error(str(e))
+    configure_solver_budget(call_seconds=args.solver_timeout, run_seconds=args.solver_budget)
+    configure_portfolio(max_workers=args.portfolio_workers, stats_path=args.portfolio_stats)
+    configure_response_cache(mode=args.llm_cache, ttl_seconds=args.llm_cache_ttl)
+    configure_concurrency(args.llm_concurrency)
     # Check if the model argument is provided, otherwise use the default
     if args.model:
         model_type = args.model
@@ -130,6 +212,11 @@ def main():
     else:
         log_folder = 'log_temp'
     log_folder = setup_log_folder(args.log_folder)
+    #one JSONL record per LLM query (stage, tokens, latency, retries), summarized at the end of the run
+    try:
+        configure_metrics(path=os.path.join(log_folder, "llm_metrics.jsonl"), prices_path=args.llm_prices)
+    except (OSError, ValueError, TypeError) as e:
+        parser.error(f"Cannot read LLM prices {args.llm_prices}: {e}")
 
   
     #read the difficult function
@@ -155,215 +242,333 @@ def main():
     
     #create all the log folfders and models
     model_total, model_io, model_inverted, model_seed, model_modified, log_folder_total, log_folder_io, log_folder_inverted, log_folder_modified = create_log_folders_and_models(log_folder, model_type)
-    total_vars =get_total_vars(model_total,  full_code)
-    #get the total vars
-    #Read the post constraints and parse them to z3 
-    constraints_post_raw = read_constraints(post_constraints_path)
-    z3_constraints_post, ctx_post = parse_to_z3(constraints_post_raw, total_vars)
-    print(f"[INFO] Parsed Z3 constraints for post: {z3_constraints_post}")
-    # find  solutions for the post constraints
-    solutions_post = get_diverse_median_solution_wrapper(z3_constraints_post, max_solutions=5)
-    print("Found solutions:")
-    for sol in solutions_post:
-        print(sol)
-    #randomise the post solutions
-    solutions_post = random.sample(solutions_post, len(solutions_post))
-
-    #Read the pre constraints and parse them to z3
-    constraints_pre_raw = read_constraints(pre_constraints_path)
-    z3_constraints_pre, ctx_pre = parse_to_z3(constraints_pre_raw, total_vars)
-    print(f"[INFO] Parsed Z3 constraints for pre: {z3_constraints_pre}")
-    # find  solutions for the pre constraints
-    solutions_pre = get_diverse_median_solution_wrapper(z3_constraints_pre, max_solutions=1)
-    print("Found solutions:")
-    for sol in solutions_pre:
-        print(sol)
-    #randomise the pre solutions, currently not needed since there is only 1 solution
-    if len(solutions_pre) > 1:
-        solutions_pre = random.sample(solutions_pre, len(solutions_pre))
-    
-
-    
-
-    #get io_vars as a list of tuples
-    inputs_with_type, outputs_with_type = get_io_vars(model_io, difficult_func, full_code, log_folder, solutions_pre[0], solutions_post[0])
-
-    # get just the inputs and outputs without the types
-    inputs = [var for var, _ in inputs_with_type]
-    outputs = [var for var, _ in outputs_with_type]
-
-    # Create dictionaries for inputs and outputs with their types
-    inputs_dict = {var: var_type for var, var_type in inputs_with_type}
-    outputs_dict = {var: var_type for var, var_type in outputs_with_type}
-
-    #print the inputs and outputs dict in nice format
-    for var, var_type in inputs_dict.items():
-        print(f"Input variable: {var}, Type: {var_type}")
-    for var, var_type in outputs_dict.items():
-        print(f"Output variable: {var}, Type: {var_type}")
-
-
-    #get one solution from the pre and post solutions
-    solutions_pre_0 = solutions_pre.pop(0)
-    #find a solution for only the inputs
-    inputs_subset = {var: solutions_pre_0[var] for var in inputs if var in solutions_pre_0}
-    print(f"Subset of pre-solution for inputs: {inputs_subset}")
-
-    #do the same for the solutions_post
-    #i wanna find the median solution of the available , meaning the solution in the middle of the list if we were to sort it
-    #sort the solutions_post by the first output var
-    #sort the solutions_post by the first output var
-    solutions_post.sort(key=lambda x: x[outputs[0]])
-    #get the median solution
-    median_index = len(solutions_post) // 2
-    solutions_post_0 = solutions_post[median_index]
-    #remove the median from the list and then randomise it 
-    solutions_post = [sol for sol in solutions_post if sol != solutions_post_0]
-    #randomise the post solutions
-    
-    #find a solution for only the outputs
-    outputs_subset = {var: solutions_post_0[var] for var in outputs if var in solutions_post_0}
-    print(f"Subset of post-solution for outputs: {outputs_subset}")
+    #.smt2 queries (e.g. from KLEE) are parsed once and bring their own variable types
+    smt2_pre = load_smt2_constraints(pre_constraints_path) if is_smt2_file(pre_constraints_path) else None
+    smt2_post = load_smt2_constraints(post_constraints_path) if is_smt2_file(post_constraints_path) else None
+
+    harnesses = []
+
+    #the setup stages run as a task graph: each starts as soon as its inputs are ready, so the
+    #inversion and the modified script (each an LLM call plus a compile) are produced concurrently
+    def total_vars_task():
+        if smt2_pre and smt2_post:
+            return {**smt2_pre[2], **smt2_post[2]}
+        total_vars =get_total_vars(model_total,  full_code)
+        for smt2 in (smt2_pre, smt2_post):
+            if smt2:
+                total_vars.update(smt2[2])
+        return total_vars
+
+    def post_task(total_vars):
+        #Read the post constraints and parse them to z3 
+        if smt2_post:
+            z3_constraints_post, ctx_post, _ = smt2_post
+        else:
+            constraints_post_raw = read_constraints(post_constraints_path)
+            z3_constraints_post, ctx_post = parse_to_z3(constraints_post_raw, total_vars)
+        print(f"[INFO] Parsed Z3 constraints for post: {z3_constraints_post}")
+        post_session = SolverSession(z3_constraints_post, ctx_post, name="post", portfolio=get_portfolio())
+        # find  solutions for the post constraints
+        solutions_post = post_session.diverse_solutions(max_solutions=args.pool_size, time_budget=args.sample_budget)
+        print("Found solutions:")
+        for sol in solutions_post:
+            print(sol)
+        #randomise the post solutions
+        solutions_post = random.sample(solutions_post, len(solutions_post))
+        return post_session, solutions_post
+
+    def pre_task(total_vars):
+        #Read the pre constraints and parse them to z3
+        if smt2_pre:
+            z3_constraints_pre, ctx_pre, _ = smt2_pre
+        else:
+            constraints_pre_raw = read_constraints(pre_constraints_path)
+            z3_constraints_pre, ctx_pre = parse_to_z3(constraints_pre_raw, total_vars)
+        print(f"[INFO] Parsed Z3 constraints for pre: {z3_constraints_pre}")
+        pre_session = SolverSession(z3_constraints_pre, ctx_pre, name="pre", portfolio=get_portfolio())
+        # find  solutions for the pre constraints
+        solutions_pre = pre_session.diverse_solutions(max_solutions=1)
+        print("Found solutions:")
+        for sol in solutions_pre:
+            print(sol)
+        #randomise the pre solutions, currently not needed since there is only 1 solution
+        if len(solutions_pre) > 1:
+            solutions_pre = random.sample(solutions_pre, len(solutions_pre))
+        return pre_session, solutions_pre
+
+    def io_vars_task(pre, post):
+        #get io_vars as a list of tuples
+        inputs_with_type, outputs_with_type = get_io_vars(model_io, difficult_func, full_code, log_folder, pre[1][0], post[1][0])
+        # Create dictionaries for inputs and outputs with their types
+        inputs_dict = {var: var_type for var, var_type in inputs_with_type}
+        outputs_dict = {var: var_type for var, var_type in outputs_with_type}
+
+        #print the inputs and outputs dict in nice format
+        for var, var_type in inputs_dict.items():
+            print(f"Input variable: {var}, Type: {var_type}")
+        for var, var_type in outputs_dict.items():
+            print(f"Output variable: {var}, Type: {var_type}")
+        return inputs_dict, outputs_dict
+
+    def targets_task(pre, post, io_vars):
+        inputs, outputs = list(io_vars[0]), list(io_vars[1])
+        #get one solution from the pre and post solutions
+        solutions_pre_0 = pre[1][0]
+        #find a solution for only the inputs
+        inputs_subset = {var: solutions_pre_0[var] for var in inputs if var in solutions_pre_0}
+        print(f"Subset of pre-solution for inputs: {inputs_subset}")
+
+        #do the same for the solutions_post
+        #i wanna find the median solution of the available , meaning the solution in the middle of the list if we were to sort it
+        #sort the solutions_post by the first output var
+        solutions_post = sorted(post[1], key=lambda x: x[outputs[0]])
+        #get the median solution
+        median_index = len(solutions_post) // 2
+        solutions_post_0 = solutions_post[median_index]
+        #remove the median from the list and then randomise it 
+        solutions_post = [sol for sol in solutions_post if sol != solutions_post_0]
 
-    
-    #get the inverted solutions and store them in the log folder inverted in the file inverted_solution.c
-    invert_code(model_inverted, difficult_func,  inputs_dict, outputs_dict, log_folder_inverted)
-    inverted_script_path = os.path.join(log_folder_inverted, "inverted_solution.c")
-    
-    #get an initial seed of input values  
-    # inital_seed = get_inital_seed(model_seed, difficult_func, inputs_dict, outputs_dict, pre_constraints, post_constraints, inputs_subset, outputs_subset)
-    # print(f"Initial seed: {inital_seed}")
-    
+        #find a solution for only the outputs
+        outputs_subset = {var: solutions_post_0[var] for var in outputs if var in solutions_post_0}
+        print(f"Subset of post-solution for outputs: {outputs_subset}")
+        return solutions_pre_0, inputs_subset, outputs_subset, solutions_post
+
+    def inverted_task(io_vars):
+        inputs_dict, outputs_dict = io_vars
+        #get the inverted solutions and store them in the log folder inverted in the file inverted_solution.c
+        invert_code(model_inverted, difficult_func,  inputs_dict, outputs_dict, log_folder_inverted)
+        inverted_script_path = os.path.join(log_folder_inverted, "inverted_solution.c")
+        #compile the inverted script once, the loops below only talk to its fork server
+        inverted_harness = ScriptHarness(inverted_script_path, list(outputs_dict), forkserver=True,
+                                         scratch_backend=args.scratch, retention=args.scratch_retention)
+        harnesses.append(inverted_harness)
+        inverted_harness.build()
+        return inverted_harness
+
+    def seed_task(inverted, targets):
+        #get an initial seed of input values  
+        # inital_seed = get_inital_seed(model_seed, difficult_func, inputs_dict, outputs_dict, pre_constraints, post_constraints, inputs_subset, outputs_subset)
+        _, inputs_subset, outputs_subset, _ = targets
+        inital_seed= run_or_skip(inverted, outputs_subset)
+        if inital_seed is None:
+            #the inverted script timed out, start from the pre solution instead
+            inital_seed = inputs_subset
+        print(f"Initial seed: {inital_seed}")
+        return inital_seed
+
+    def forward_task(io_vars, targets):
+        inputs, outputs = list(io_vars[0]), list(io_vars[1])
+        if args.backend == 'inprocess':
+            #the difficult function is called directly, so no modified script is needed
+            try:
+                forward_harness = InProcessFunction(difficult_func_path, inputs, outputs, scratch_dir=log_folder_modified)
+                harnesses.append(forward_harness)
+                forward_harness.build()
+                return forward_harness
+            except (ValueError, RuntimeError, OSError) as e:
+                print(f"[WARN] Could not build in-process backend, using the harness instead: {e}")
+        #get the modified script from the model, this is a runnable version with the inputsand outputs as placeholders
+        modified_script_path = os.path.join(log_folder_modified, "modified_script.c")    
+        get_modified_script(model_modified, difficult_func, full_code, modified_script_path, targets[0], inputs)
+        forward_harness = ScriptHarness(modified_script_path, inputs, forkserver=True,
+                                        scratch_backend=args.scratch, retention=args.scratch_retention)
+        harnesses.append(forward_harness)
+        forward_harness.build()
+        return forward_harness
+
+    #harnesses hold fork servers and scratch dirs: close them on every return path and on errors
+    try:
+        setup = TaskGraph()
+        setup.add("total_vars", total_vars_task)
+        # Z3 contexts are not thread-safe, so the solving stages take turns
+        setup.add("post", post_task, deps=["total_vars"], resources=["z3"])
+        setup.add("pre", pre_task, deps=["total_vars"], resources=["z3"])
+        setup.add("io_vars", io_vars_task, deps=["pre", "post"])
+        setup.add("targets", targets_task, deps=["pre", "post", "io_vars"])
+        setup.add("inverted", inverted_task, deps=["io_vars"])
+        setup.add("seed", seed_task, deps=["inverted", "targets"])
+        setup.add("forward", forward_task, deps=["io_vars", "targets"])
+        stages = setup.run()
+
+        post_session, _ = stages["post"]
+        pre_session, _ = stages["pre"]
+        inputs_dict, outputs_dict = stages["io_vars"]
+        # get just the inputs and outputs without the types
+        inputs = list(inputs_dict)
+        outputs = list(outputs_dict)
+        _, _, _, solutions_post = stages["targets"]
+        inverted_harness = stages["inverted"]
+        inital_seed = stages["seed"]
+        forward_harness = stages["forward"]
+        #started after the setup threads are done; only used when exploring new post candidates
+        evaluator = ParallelEvaluator(max_workers=args.eval_workers, scratch_root=log_folder_inverted) \
+            if args.eval_workers > 0 else None
+        if evaluator is not None:
+            harnesses.append(evaluator)
 
-    index_back =0
-    index_back, c_back_new_file = generate_script_copies(outputs, outputs_subset, inverted_script_path, index_back)
-    inital_seed= compile_and_run_c_script(c_back_new_file, output_exe='inverted.out')
-    print(f"Initial seed: {inital_seed}")
-    
-    
-    #get the modified script from the model, this is a runnable version with the inputsand outputs as placeholders
-    modified_script_path = os.path.join(log_folder_modified, "modified_script.c")    
-    get_modified_script(model_modified, difficult_func, full_code, modified_script_path, solutions_pre_0, inputs)
-    
-    # here we should test if the inputs concrete satisfy the pre if not maxsat to extract some that satisfy (1)
-    initial_solution, sat_pre =check_constraints_with_fallback(z3_constraints_pre, ctx_pre, inital_seed, inputs_dict)
-    
-    #if the initial seed does not satisfy the pre constraints we should exclude it in the pre from now on
-    if not sat_pre:
-        z3_constraints_pre, ctx_pre = exclude_solution_from_constraints(z3_constraints_pre, ctx_pre, inital_seed)
-        print(f"Initial seed does not satisfy pre constraints, excluding it from the constraints")
-    print(f"Initial solution: {initial_solution}")
-    #index_forward is the current index of the script copies and retries is the number of retries of finding a solution, index_back is the index of the script copies for the backward search
-    index_forward =0
+        # here we should test if the inputs concrete satisfy the pre if not maxsat to extract some that satisfy (1)
+        initial_solution, sat_pre =check_constraints_with_fallback(pre_session, inital_seed, inputs_dict)
     
+        #if the initial seed does not satisfy the pre constraints we should exclude it in the pre from now on
+        if not sat_pre:
+            pre_session.exclude(inital_seed)
+            print(f"Initial seed does not satisfy pre constraints, excluding it from the constraints")
+        print(f"Initial solution: {initial_solution}")
+        if initial_solution is None:
+            print("could not find a solution that satisfies pre within the solver budget")
+            return
     
-    explore_potential =0
-    while explore_potential< retries_potential:
-        explore_potential += 1
-        #the loop of going back and forth between pre and post
-        retries =0
-        while retries < retries_max:
-            retries += 1
-            print(f"Retry {retries}/{retries_max}")
-
-            #keep only from the initial solution the inputs
-            initial_solution = {var: initial_solution[var] for var in inputs if var in initial_solution}
-
-            ## then we run it  on the code get outpt (2)
-            index_forward, c_new_file = generate_script_copies(inputs, initial_solution, modified_script_path, index_forward)
-            runned_vars = compile_and_run_c_script(c_new_file)
-            print(f"Runned vars: {runned_vars}")
-
-            ## see if the output satisfies post, if not then maxsat (3)
-            initial_post_solution, sat_post =check_constraints_with_fallback(z3_constraints_post, ctx_post, runned_vars, outputs_dict)
-            if sat_post:
-                print(f"found solution that satisfies pre and post {initial_solution}")
-                return initial_solution
-            
-            #exclude the solution from the post constraints
-            z3_constraints_post, ctx_post = exclude_solution_from_constraints(z3_constraints_post, ctx_post, initial_post_solution)
-            ## get the candidate and invert
-            retries_inversion =0
-            
-            while retries_inversion < retries_internal :
-                retries_inversion+=1
-                print(f"Solution for post though maxsat: {initial_post_solution}")
-                #for every output var in outputs get the value from the solution and create a string
-                solution_str =""
-                for var in outputs:
-                    if var not in initial_post_solution:
-                        raise ValueError(f"Value for variable '{var}' not provided in solution dictionary")
-                    # Replace placeholder
-                    value = str(initial_post_solution[var])
-                    solution_str += f"{var}={value}\n"
-                #for the output vars outputs we need to get their values from the 
-                if retries_inversion // 2 == 0:
-                    index_back, c_back_new_file = generate_script_copies(outputs, initial_post_solution, inverted_script_path, index_back)
-                    inputs_concrete= compile_and_run_c_script(c_back_new_file, output_exe='inverted.out')
-                    print(f"I used the inverted script to get the inputs {inputs_concrete}")
-                else:
-                    inputs_concrete= inverted_solutions_simple(model_inverted, difficult_func, solution_str,  inputs_dict, outputs_dict)
-                    print(f"I used the llm inversion to get the inputs {inputs_concrete}")
-                #here we need to change instead of finding maxsat if the reversion was not very successful to get retries with feedback
-                print(f"the inputs from reversion are {inputs_concrete}")
-                ## get the inputs , and (1) , (2), (3)
-                index_forward, c_new_file = generate_script_copies(inputs, inputs_concrete, modified_script_path, index_forward)
-
-                runned_vars = compile_and_run_c_script(c_new_file)
-                current_post_solution, current_sat_post = check_constraints_with_fallback(z3_constraints_post, ctx_post, runned_vars, outputs_dict)
-
+        explore_potential =0
+        while explore_potential< retries_potential:
+            explore_potential += 1
+            #the loop of going back and forth between pre and post
+            retries =0
+            while retries < retries_max:
+                retries += 1
+                print(f"Retry {retries}/{retries_max}")
+
+                #keep only from the initial solution the inputs
+                initial_solution = {var: initial_solution[var] for var in inputs if var in initial_solution}
+
+                ## then we run it  on the code get outpt (2)
+                runned_vars = run_or_skip(forward_harness, initial_solution)
                 print(f"Runned vars: {runned_vars}")
-                print(f"current post solution: {current_post_solution} and sat post {current_sat_post}")
-                if current_sat_post:
+                if runned_vars is None:
+                    #the candidate timed out, exclude it from pre and move to the closest other pre solution
+                    pre_session.exclude(initial_solution)
+                    initial_solution, _ = check_constraints_with_fallback(pre_session, initial_solution, inputs_dict)
+                    if initial_solution is None:
+                        break
+                    continue
+
+                ## see if the output satisfies post, if not then maxsat (3)
+                initial_post_solution, sat_post =check_constraints_with_fallback(post_session, runned_vars, outputs_dict)
+                if sat_post:
+                    print(f"found solution that satisfies pre and post {initial_solution}")
+                    return initial_solution
+                if initial_post_solution is None:
+                    print("no post solution within the solver budget, trying the next candidate")
                     break
-                else:
-                    initial_post_solution=current_post_solution
-                    #exclude the solution from the post constraints
-                    z3_constraints_post, ctx_post = exclude_solution_from_constraints(z3_constraints_post, ctx_post, runned_vars)
-            #if it is not sat we should have feedback to get another solution TBA
             
-            current_pre_solution, current_sat_pre = check_constraints_with_fallback(z3_constraints_pre, ctx_pre, inputs_concrete, inputs_dict)
-            if current_sat_pre and current_sat_post:
-                print(f"pre is also satisfied . this is good solution {inputs_concrete}")
-                return inputs_concrete
-            #go back to the loop
-            #exlude the solution from the pre constraints
-            z3_constraints_pre, ctx_pre = exclude_solution_from_constraints(z3_constraints_pre, ctx_pre, inputs_concrete)
-            initial_solution = current_pre_solution
-            print(f"this solution {current_pre_solution} satisfies pre so we can check if it satisfies post too")
+                #exclude the solution from the post constraints
+                post_session.exclude(initial_post_solution)
+                ## get the candidate and invert
+                retries_inversion =0
+                inputs_concrete = None
+                current_sat_post = False
+            
+                while retries_inversion < retries_internal :
+                    retries_inversion+=1
+                    print(f"Solution for post though maxsat: {initial_post_solution}")
+                    #for every output var in outputs get the value from the solution and create a string
+                    solution_str =""
+                    for var in outputs:
+                        if var not in initial_post_solution:
+                            raise ValueError(f"Value for variable '{var}' not provided in solution dictionary")
+                        # Replace placeholder
+                        value = str(initial_post_solution[var])
+                        solution_str += f"{var}={value}\n"
+                    #for the output vars outputs we need to get their values from the 
+                    if retries_inversion // 2 == 0:
+                        inputs_concrete= run_or_skip(inverted_harness, initial_post_solution)
+                        print(f"I used the inverted script to get the inputs {inputs_concrete}")
+                        if inputs_concrete is None:
+                            continue
+                    else:
+                        inputs_concrete= inverted_solutions_simple(model_inverted, difficult_func, solution_str,  inputs_dict, outputs_dict)
+                        print(f"I used the llm inversion to get the inputs {inputs_concrete}")
+                    #here we need to change instead of finding maxsat if the reversion was not very successful to get retries with feedback
+                    print(f"the inputs from reversion are {inputs_concrete}")
+                    ## get the inputs , and (1) , (2), (3)
+                    runned_vars = run_or_skip(forward_harness, inputs_concrete)
+                    if runned_vars is None:
+                        continue
+                    current_post_solution, current_sat_post = check_constraints_with_fallback(post_session, runned_vars, outputs_dict)
+
+                    print(f"Runned vars: {runned_vars}")
+                    print(f"current post solution: {current_post_solution} and sat post {current_sat_post}")
+                    if current_sat_post or current_post_solution is None:
+                        break
+                    else:
+                        initial_post_solution=current_post_solution
+                        #exclude the solution from the post constraints
+                        post_session.exclude(runned_vars)
+                #if it is not sat we should have feedback to get another solution TBA
+                if inputs_concrete is None:
+                    print("every inversion attempt timed out, trying the next retry")
+                    continue
+            
+                current_pre_solution, current_sat_pre = check_constraints_with_fallback(pre_session, inputs_concrete, inputs_dict)
+                if current_sat_pre and current_sat_post:
+                    print(f"pre is also satisfied . this is good solution {inputs_concrete}")
+                    return inputs_concrete
+                #go back to the loop
+                #exlude the solution from the pre constraints
+                pre_session.exclude(inputs_concrete)
+                if current_pre_solution is None:
+                    print("no pre solution within the solver budget, trying the next candidate")
+                    break
+                initial_solution = current_pre_solution
+                print(f"this solution {current_pre_solution} satisfies pre so we can check if it satisfies post too")
 
        
-            print(f"this solution {runned_vars} does not satisfy post and we have trouble inverting from maxsat")  
-            #lets pop another candidate inout 
+                print(f"this solution {runned_vars} does not satisfy post and we have trouble inverting from maxsat")  
+                #lets pop another candidate inout 
            
         
-        if len(solutions_post) == 0:
-            print ("could not find a solution that satisfies pre and post")
-            return
-        
-        solutions_post.sort(key=lambda x: x[outputs[0]])
-        #get the median solution
-        median_index = len(solutions_post) // 2
-        solutions_post_new = solutions_post[median_index]
-        #remove the median from the list and then randomise it 
-        solutions_post = [sol for sol in solutions_post if sol != solutions_post_new]
-        #randomise the post solutions
-        
-        #find a solution for only the outputs
-        outputs_subset = {var: solutions_post_new[var] for var in outputs if var in solutions_post_new}
-        print(f"Subset of post-solution for outputs: {outputs_subset}")
+            if len(solutions_post) == 0:
+                print ("could not find a solution that satisfies pre and post")
+                return
+
+            #take the next post candidates by median, one at a time or a batch that is inverted in parallel
+            batch = []
+            while solutions_post and len(batch) < max(1, args.eval_workers):
+                solutions_post.sort(key=lambda x: x[outputs[0]])
+                #get the median solution
+                median_index = len(solutions_post) // 2
+                solutions_post_new = solutions_post[median_index]
+                #remove the median from the list
+                solutions_post = [sol for sol in solutions_post if sol != solutions_post_new]
+                #find a solution for only the outputs
+                batch.append({var: solutions_post_new[var] for var in outputs if var in solutions_post_new})
+            if evaluator is not None:
+                seeds = evaluator.evaluate_script(inverted_harness.script_path, outputs, batch)
+            else:
+                seeds = [run_or_skip(inverted_harness, outputs_subset) for outputs_subset in batch]
+
+            #prefer the first seed (in median order) that satisfies pre, else the first maxsat refinement
+            seed_solution = None
+            for outputs_subset, inital_seed in zip(batch, seeds):
+                print(f"Subset of post-solution for outputs: {outputs_subset}")
+                print(f"Initial seed: {inital_seed}")
+                if inital_seed is None or inital_seed == TIMED_OUT:
+                    continue
+                # here we should test if the inputs concrete satisfy the pre if not maxsat to extract some that satisfy (1)
+                candidate_solution, sat_pre = check_constraints_with_fallback(pre_session, inital_seed, inputs_dict)
+                if candidate_solution is None:
+                    #no pre solution within the solver budget
+                    continue
+                if seed_solution is None or sat_pre:
+                    seed_solution = candidate_solution
+                if sat_pre:
+                    break
+            if seed_solution is None:
+                #keep exploring from the previous solution
+                continue
+            initial_solution = seed_solution
+                #else : go back to the loop with current solution pre as the current sol
+            print(f"I am here with the pre solution {initial_solution} and sat pre {sat_pre} an d i am gonna try again with explore potential {explore_potential}")
+    finally:
+        for harness in harnesses:
+            harness.close()
 
-        
-        index_back, c_back_new_file = generate_script_copies(outputs, outputs_subset, inverted_script_path, index_back)
-        inital_seed= compile_and_run_c_script(c_back_new_file, output_exe='inverted.out')
-        print(f"Initial seed: {inital_seed}")
-        
-        
-        # here we should test if the inputs concrete satisfy the pre if not maxsat to extract some that satisfy (1)
-        initial_solution, sat_pre = check_constraints_with_fallback(z3_constraints_pre, ctx_pre, inital_seed, inputs_dict)
-            #else : go back to the loop with current solution pre as the current sol
-        print(f"I am here with the pre solution {initial_solution} and sat pre {sat_pre} an d i am gonna try again with explore potential {explore_potential}")
 
 if __name__ == "__main__":
     
     main()
+    get_compile_cache().report()
+    get_response_cache().report()
+    get_metrics().summary()
+    close_http_clients()
+    if get_portfolio() is not None:
+        get_portfolio().stats.report()
@@ -1,12 +1,17 @@
 import os
+import asyncio
+import threading
+import weakref
 from abc import ABC, abstractmethod
 from pathlib import Path
 import math
 import json
 
-from groq import Groq
+from groq import Groq, AsyncGroq
 
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+
+from http_clients import get_api_client, get_async_api_client, get_http_client, get_async_http_client
 
 from tenacity import (
     retry,
@@ -14,25 +19,47 @@ from tenacity import (
     wait_random_exponential,
 )  # for exponential backoff
 
-import requests
-def log_token_usage(prompt_tokens, completion_tokens, total_tokens, filepath):
+
+from response_cache import get_response_cache
+from llm_metrics import get_metrics, count_attempt, note_usage
+
+# Max number of requests in flight per provider (Model subclass) on the async path
+DEFAULT_CONCURRENCY = 8
+_provider_concurrency = {}
+# event loop -> provider -> semaphore (asyncio primitives belong to one event loop)
+_provider_semaphores = weakref.WeakKeyDictionary()
+# Serializes log numbering across threads and tasks
+_log_lock = threading.Lock()
+
+
+def configure_concurrency(limit, provider=None):
     """
-    Appends usage data to a file named tokens.json (JSON-line format).
+    Set the max number of concurrent async requests for one provider (a Model
+    subclass name such as "OpenAIModel"), or the default for all of them.
     """
-    # Open (or create if doesn't exist) and append to the file
-    
-    with open(filepath, "a") as f:
-        record = {
-            "prompt_tokens": prompt_tokens,
-            "completion_tokens": completion_tokens,
-            "total_tokens": total_tokens
-        }
-        f.write(json.dumps(record) + "\n")
+    global DEFAULT_CONCURRENCY
+    if provider is None:
+        DEFAULT_CONCURRENCY = limit
+    else:
+        _provider_concurrency[provider] = limit
 
 
+def _provider_semaphore(provider):
+    per_loop = _provider_semaphores.setdefault(asyncio.get_running_loop(), {})
+    if provider not in per_loop:
+        per_loop[provider] = asyncio.Semaphore(_provider_concurrency.get(provider, DEFAULT_CONCURRENCY))
+    return per_loop[provider]
+
 
 # Returns the appropriate model object based on the model name. Supports OpenAI, Groq, DeepSeek, and Qwen models.
-def get_model(name: str, temperature: float, log_directory: Path = None):
+# stage names the pipeline stage the model serves (e.g. "io_vars"); its queries are accounted under it (see llm_metrics.py).
+def get_model(name: str, temperature: float, log_directory: Path = None, stage: str = None):
+    model = _make_model(name, temperature, log_directory)
+    model.stage = stage
+    return model
+
+
+def _make_model(name, temperature, log_directory):
     openai_models = {
         "gpt-4o-2024-08-06",
         "gpt-3.5-turbo-instruct",
@@ -118,28 +145,71 @@ def get_model(name: str, temperature: float, log_directory: Path = None):
 # It defines a query method to interact with the model and log the queries and responses
 class Model(ABC):
 
+    # Pipeline stage the model serves, set by get_model()
+    stage = None
+
     # Queries the model with a given prompt and logs the interaction if a log directory is set.
+    # Responses come from the on-disk response cache when an identical query was answered before (see response_cache.py).
     # Since we now create a temporary log dir, all interactions are logged but if log not specified they will be overwritten at the next invocation of the tool
+    # Every query is recorded in the LLM metrics stream: tokens, latency, retries, provider and stage.
     def query(self, prompt):
-        response = self._query(prompt)
-        
-        if self.log_directory:
-            log_dir = Path(self.log_directory)
-            prompt_file = log_dir / f"{self.log_counter:04}.prompt.md"
-            response_file = log_dir / f"{self.log_counter:04}.response.md"
-            with prompt_file.open("w", encoding="utf-8") as f:
-                f.write(prompt)
-            with response_file.open("w", encoding="utf-8") as f:
-                f.write(response)
-            self.log_counter += 1
+        with get_metrics().track(type(self).__name__, self.name, self.stage):
+            response = get_response_cache().query(type(self).__name__, self.name, self.temperature, prompt,
+                                                  self._query)
+        self._log(prompt, response)
+        return response
+
+    # Async version of query(): at most the provider's concurrency limit of requests are in flight at once,
+    # so stages and candidates can query in parallel (e.g. with asyncio.gather) without flooding the provider.
+    async def aquery(self, prompt):
+        semaphore = _provider_semaphore(type(self).__name__)
 
+        async def limited_query(prompt):
+            async with semaphore:
+                return await self._aquery(prompt)
+
+        with get_metrics().track(type(self).__name__, self.name, self.stage):
+            response = await get_response_cache().aquery(type(self).__name__, self.name, self.temperature, prompt,
+                                                         limited_query)
+        self._log(prompt, response)
         return response
 
+    # Queries all prompts concurrently from synchronous code; responses are returned in prompt order.
+    def query_batch(self, prompts):
+        async def query_all():
+            return await asyncio.gather(*[self.aquery(prompt) for prompt in prompts])
+        return asyncio.run(query_all())
+
+    # Writes the NNNN.prompt.md/NNNN.response.md pair; the number is taken under a lock so concurrent queries never share one.
+    def _log(self, prompt, response):
+        if not self.log_directory:
+            return
+        with _log_lock:
+            index = self.log_counter
+            self.log_counter += 1
+        log_dir = Path(self.log_directory)
+        prompt_file = log_dir / f"{index:04}.prompt.md"
+        response_file = log_dir / f"{index:04}.response.md"
+        with prompt_file.open("w", encoding="utf-8") as f:
+            f.write(prompt if isinstance(prompt, str) else json.dumps(prompt, indent=2))
+        with response_file.open("w", encoding="utf-8") as f:
+            f.write(response)
+
+    # Async clients hold connection pools bound to an event loop; the registry in http_clients.py keeps one per running loop.
+    # Most providers are OpenAI-compatible: same arguments as the blocking client.
+    def _async_client(self):
+        return get_async_api_client(AsyncOpenAI, **self.client_kwargs)
+
     #Abstract method that must be implemented by subclasses to handle the model query.
     @abstractmethod
     def _query(self, prompt):
         pass
 
+    #Abstract method that must be implemented by subclasses to handle the async model query.
+    @abstractmethod
+    async def _aquery(self, prompt):
+        pass
+
 
 class OpenAIModel(Model):
 
@@ -151,18 +221,30 @@ class OpenAIModel(Model):
         self.temperature = temperature
 
         # Initialize OpenAI client using the API key from environment variables
-        self.client = OpenAI(
+        self.client_kwargs = dict(
             api_key=os.environ.get("OPENAI_API_KEY"),
         )
+        # shared per endpoint and key: models of all stages reuse the same pooled connections
+        self.client = get_api_client(OpenAI, **self.client_kwargs)
         
     # Queries the OpenAI API with a prompt, using exponential backoff for retries in case of failures.
     # When a request to the API fails , the system will automatically try again after waiting for a certain period . Each retry will wait a different time than the previous one to avoid overloading the server.
-    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6))
+    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6), before=count_attempt)
     def _query(self, prompt):
         response = self.client.chat.completions.create(
             model=self.name,
             messages=[{"role": "user", "content": prompt}] if isinstance(prompt, str) else prompt,
             temperature=self.temperature)
+        note_usage(response.usage)
+        return response.choices[0].message.content
+
+    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6), before=count_attempt)
+    async def _aquery(self, prompt):
+        response = await self._async_client().chat.completions.create(
+            model=self.name,
+            messages=[{"role": "user", "content": prompt}] if isinstance(prompt, str) else prompt,
+            temperature=self.temperature)
+        note_usage(response.usage)
         return response.choices[0].message.content
     
     @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6))
@@ -208,17 +290,28 @@ class GroqModel(Model):
         self.temperature = temperature
 
         # Initialize Groq client using the API key from environment variables
-        self.client = Groq(
-            api_key=os.environ.get("GROQ_API_KEY"),
-        )
+        self.client = get_api_client(Groq, api_key=os.environ.get("GROQ_API_KEY"))
+
+    def _async_client(self):
+        return get_async_api_client(AsyncGroq, api_key=os.environ.get("GROQ_API_KEY"))
 
     # Queries the Groq API with a prompt, using exponential backoff for retries in case of failures.
-    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6))
+    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6), before=count_attempt)
     def _query(self, prompt):
         response = self.client.chat.completions.create(
             model=self.name,
             messages=[{"role": "user", "content": prompt}] if isinstance(prompt, str) else prompt,
             temperature=self.temperature)
+        note_usage(response.usage)
+        return response.choices[0].message.content
+
+    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6), before=count_attempt)
+    async def _aquery(self, prompt):
+        response = await self._async_client().chat.completions.create(
+            model=self.name,
+            messages=[{"role": "user", "content": prompt}] if isinstance(prompt, str) else prompt,
+            temperature=self.temperature)
+        note_usage(response.usage)
         return response.choices[0].message.content
 
 # Same for the other models
@@ -230,18 +323,30 @@ class DeepSeekModel(Model):
         self.name = name
         self.temperature = temperature
 
-        self.client = OpenAI(
+        self.client_kwargs = dict(
             api_key=os.environ.get("DEEPSEEK_API_KEY"),
             base_url="https://api.deepseek.com"
         )
+        self.client = get_api_client(OpenAI, **self.client_kwargs)
 
-    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6))
+    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6), before=count_attempt)
     def _query(self, prompt):
         response = self.client.chat.completions.create(
             model=self.name,
             messages=[{"role": "user", "content": prompt}],
             temperature=self.temperature
         )
+        note_usage(response.usage)
+        return response.choices[0].message.content
+
+    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6), before=count_attempt)
+    async def _aquery(self, prompt):
+        response = await self._async_client().chat.completions.create(
+            model=self.name,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=self.temperature
+        )
+        note_usage(response.usage)
         return response.choices[0].message.content
     
 class PlLabModel(Model):
@@ -252,18 +357,30 @@ class PlLabModel(Model):
         self.name = name
         self.temperature = temperature
 
-        self.client = OpenAI(
-            base_url = "https://llm.xmcp.ltd/",
+        self.client_kwargs = dict(
+            base_url="https://llm.xmcp.ltd/",
             api_key=os.environ.get("PL_LAB_API_KEY")
         )
+        self.client = get_api_client(OpenAI, **self.client_kwargs)
 
-    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6))
+    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6), before=count_attempt)
     def _query(self, prompt):
         response = self.client.chat.completions.create(
             model=self.name,
             messages=[{"role": "user", "content": prompt}],
             temperature=self.temperature
         )
+        note_usage(response.usage)
+        return response.choices[0].message.content
+
+    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6), before=count_attempt)
+    async def _aquery(self, prompt):
+        response = await self._async_client().chat.completions.create(
+            model=self.name,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=self.temperature
+        )
+        note_usage(response.usage)
         return response.choices[0].message.content
     
 class AI302Model(Model):
@@ -274,18 +391,30 @@ class AI302Model(Model):
         self.name = name
         self.temperature = temperature
 
-        self.client = OpenAI(
-            base_url = "https://api.302.ai/v1/chat/completions",
+        self.client_kwargs = dict(
+            base_url="https://api.302.ai/v1/chat/completions",
             api_key=os.environ.get("API_KEY_302")
         )
+        self.client = get_api_client(OpenAI, **self.client_kwargs)
 
-    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6))
+    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6), before=count_attempt)
     def _query(self, prompt):
         response = self.client.chat.completions.create(
             model=self.name,
             messages=[{"role": "user", "content": prompt}],
             temperature=self.temperature
         )
+        note_usage(response.usage)
+        return response.choices[0].message.content
+
+    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6), before=count_attempt)
+    async def _aquery(self, prompt):
+        response = await self._async_client().chat.completions.create(
+            model=self.name,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=self.temperature
+        )
+        note_usage(response.usage)
         return response.choices[0].message.content
 
 class FireworksModel(Model):
@@ -296,10 +425,11 @@ class FireworksModel(Model):
         self.name = name
         self.temperature = temperature
 
-        self.client = OpenAI(
+        self.client_kwargs = dict(
             api_key=os.environ.get("FIREWORKS_API_KEY"),
             base_url="https://api.fireworks.ai/inference/v1"
         )
+        self.client = get_api_client(OpenAI, **self.client_kwargs)
 
     # @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6))
     def _query(self, prompt):
@@ -316,6 +446,25 @@ class FireworksModel(Model):
 
       
         
+        note_usage(response.usage)
+
+      
+        
+        return response.choices[0].message.content
+
+    # @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6))
+    async def _aquery(self, prompt):
+        if "accounts" in self.name:
+            model_name=self.name
+        else:
+            model_name =f"accounts/fireworks/models/{self.name}"
+        # print(f"the name of the model is {self.name}\n{ model_name}")
+        response = await self._async_client().chat.completions.create(
+            model=model_name,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=self.temperature
+        )
+        note_usage(response.usage)
         return response.choices[0].message.content
 
 class QwenModel(Model):
@@ -326,10 +475,11 @@ class QwenModel(Model):
         self.name = name
         self.temperature = temperature
 
-        self.client = OpenAI(
+        self.client_kwargs = dict(
             api_key=os.environ.get("DASHSCOPE_API_KEY"),
             base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
         )
+        self.client = get_api_client(OpenAI, **self.client_kwargs)
 
     # @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6))
     def _query(self, prompt):
@@ -342,6 +492,19 @@ class QwenModel(Model):
             # Extract usage stats (if the API provides them)
       
         
+        note_usage(response.usage)
+      
+        
+        return response.choices[0].message.content
+
+    # @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6))
+    async def _aquery(self, prompt):
+        response = await self._async_client().chat.completions.create(
+            model=self.name,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=self.temperature
+        )
+        note_usage(response.usage)
         return response.choices[0].message.content
     
     def query_confidence_qwen(self, prompt):
@@ -368,6 +531,9 @@ class QwenModel(Model):
         return response_content, probability
 
 
+DEEPINFRA_URL = "https://api.deepinfra.com/v1/openai/chat/completions"
+
+
 class DeepInfraModel(Model):
 
     def __init__(self, name, temperature, log_directory):
@@ -378,7 +544,10 @@ class DeepInfraModel(Model):
         self.temperature = temperature
         self.api_key = os.environ.get("DEEPINFRA_API_KEY")
 
-    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6))
+    def _async_client(self):
+        return get_async_http_client(DEEPINFRA_URL)
+
+    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6), before=count_attempt)
     def _query(self, prompt):
         headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -390,14 +559,41 @@ class DeepInfraModel(Model):
             "temperature": self.temperature
         }
 
-        response = requests.post(
-            "https://api.deepinfra.com/v1/openai/chat/completions",
+        # pooled keep-alive connection instead of a new TCP+TLS handshake per request
+        response = get_http_client(DEEPINFRA_URL).post(
+            DEEPINFRA_URL,
             headers=headers,
             json=data
         )
         
         if response.status_code == 200:
-            return response.json()["choices"][0]["message"]["content"]
+            body = response.json()
+            note_usage(body.get("usage"))
+            return body["choices"][0]["message"]["content"]
         else:
             raise Exception(f"Request failed: {response.status_code}, {response.text}")
 
+    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6), before=count_attempt)
+    async def _aquery(self, prompt):
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        data = {
+            "model": self.name,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": self.temperature
+        }
+
+        response = await self._async_client().post(
+            DEEPINFRA_URL,
+            headers=headers,
+            json=data
+        )
+
+        if response.status_code == 200:
+            body = response.json()
+            note_usage(body.get("usage"))
+            return body["choices"][0]["message"]["content"]
+        else:
+            raise Exception(f"Request failed: {response.status_code}, {response.text}")
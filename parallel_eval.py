@@ -0,0 +1,97 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from harness import ScriptHarness
+from compilers import configure_compiler, get_compiler_config
+from limits import EvaluationTimeout, TIMED_OUT, configure_limits, get_run_limits, get_compile_limits
+
+# Per-worker state, set up by _init_worker() in each pool process
+_worker_scratch_dir = None
+_worker_harnesses = {}
+
+
+def _init_worker(scratch_root, run_limits, compile_limits, compiler_config):
+    # workers are not forked from the driver, so its process-wide settings are passed along
+    global _worker_scratch_dir
+    configure_limits(run=run_limits, compile=compile_limits)
+    configure_compiler(*compiler_config)
+    _worker_scratch_dir = tempfile.mkdtemp(prefix=f"worker_{os.getpid()}_", dir=scratch_root)
+
+
+def _get_worker_harness(script_path, input_vars):
+    key = (os.path.abspath(script_path), tuple(input_vars))
+    harness = _worker_harnesses.get(key)
+    if harness is None:
+        harness = ScriptHarness(script_path, input_vars, forkserver=True, scratch_dir=_worker_scratch_dir)
+        harness.build()
+        _worker_harnesses[key] = harness
+    return harness
+
+
+def _evaluate_job(job):
+    script_path, input_vars, input_values = job
+    try:
+        return _get_worker_harness(script_path, input_vars).run(input_values)
+    except EvaluationTimeout as e:
+        print(f"[WARN] Evaluation of {script_path} on {input_values} timed out: {e}")
+        return TIMED_OUT
+    except (RuntimeError, ValueError) as e:
+        print(f"[WARN] Evaluation of {script_path} on {input_values} failed: {e}")
+        return None
+
+
+class ParallelEvaluator:
+    """
+    Process pool that evaluates candidates on placeholder C scripts across all cores.
+
+    Every worker gets its own scratch directory under a shared temporary root and
+    keeps one fork-server harness per script, so forward (modified_script.c) and
+    inverted (inverted_solution.c) evaluations can run concurrently without
+    clobbering each other's sources or binaries.
+
+    Workers are started by a fork server rather than forked from the driver, which
+    may be running threads; they use the run/compile limits and compiler settings
+    configured in the driver when the evaluator was created.
+    """
+
+    def __init__(self, max_workers=None, scratch_root=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.scratch_root = tempfile.mkdtemp(prefix="symex_eval_", dir=scratch_root)
+        self.executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                            mp_context=multiprocessing.get_context("forkserver"),
+                                            initializer=_init_worker,
+                                            initargs=(self.scratch_root, get_run_limits(), get_compile_limits(),
+                                                      get_compiler_config()))
+
+    def evaluate(self, jobs):
+        """
+        Evaluate a list of jobs in parallel.
+
+        Args:
+            jobs (list): (script_path, input_vars, input_values) tuples; jobs may mix
+                         the forward and the inverted script.
+
+        Returns:
+            list: Parsed output variables per job, in submission order (None for failed runs,
+                  TIMED_OUT for runs that exceeded the limits).
+        """
+        return list(self.executor.map(_evaluate_job, jobs))
+
+    def evaluate_script(self, script_path, input_vars, input_vectors):
+        """
+        Evaluate one script on many input vectors in parallel.
+        """
+        return self.evaluate([(script_path, input_vars, input_values) for input_values in input_vectors])
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        shutil.rmtree(self.scratch_root, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "sym_ex_llm_inversion", "responses")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# use: read and write the cache, refresh: always query but store the new responses,
+# bypass: neither read nor write
+CACHE_MODES = ('use', 'refresh', 'bypass')
+
+
+class ResponseCache:
+    """
+    On-disk cache of LLM responses, keyed by a hash of the provider, model name,
+    temperature and prompt. Entries are evicted least-recently-used first (by mtime,
+    refreshed on every hit) once the cache grows beyond max_bytes, and ignored once
+    they are older than ttl_seconds (None: never).
+
+    Sampled responses differ between calls, and the pipeline retries the same prompt
+    when an answer is unusable. So each entry keeps a list of responses, and the n-th
+    identical query of a session is answered with the n-th cached response; only a
+    query beyond the cached ones goes to the provider. A rerun of the same program
+    replays the previous run's answers in order, including the ones the pipeline
+    rejected, which is why the cache is off (mode 'bypass') unless asked for.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, ttl_seconds=None, mode='bypass'):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown response cache mode '{mode}', expected one of {CACHE_MODES}")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.query_seconds = 0.0
+        self.saved_seconds = 0.0
+        # key -> number of times it was queried in this session
+        self.occurrences = {}
+        # queries may run concurrently in threads or tasks (see Model.aquery())
+        self.lock = threading.RLock()
+        if mode != 'bypass':
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, provider, model_name, temperature, prompt):
+        text = prompt if isinstance(prompt, str) else json.dumps(prompt, sort_keys=True)
+        h = hashlib.sha256()
+        for part in (provider, model_name, repr(temperature), text):
+            h.update(str(part).encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def load(self, key):
+        """
+        The cached entry for key, or None if it is missing, unreadable or expired.
+        """
+        path = self.entry_path(key)
+        try:
+            with open(path, 'r', encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self.ttl_seconds is not None and time.time() - entry.get("created", 0) > self.ttl_seconds:
+            return None
+        return entry
+
+    def lookup(self, provider, model_name, temperature, prompt):
+        """
+        Count one more occurrence of the query and look up its cached response.
+
+        Returns:
+            tuple: (key, occurrence, entry, response) where response is None on a miss.
+        """
+        key = self.make_key(provider, model_name, temperature, prompt)
+        with self.lock:
+            occurrence = self.occurrences.get(key, 0)
+            self.occurrences[key] = occurrence + 1
+        entry = self.load(key) if self.mode == 'use' else None
+        if entry is not None and occurrence < len(entry["responses"]) and entry["responses"][occurrence] is not None:
+            with self.lock:
+                self.hits += 1
+                self.saved_seconds += entry["query_seconds"][occurrence]
+            os.utime(self.entry_path(key))
+            return key, occurrence, entry, entry["responses"][occurrence]
+        return key, occurrence, entry, None
+
+    def record(self, key, occurrence, provider, model_name, temperature, response, elapsed):
+        """
+        Store the provider's response to the occurrence-th identical query.
+        """
+        with self.lock:
+            self.misses += 1
+            self.query_seconds += elapsed
+            # re-read: concurrent queries may have stored other occurrences meanwhile
+            entry = self.load(key)
+            if entry is None:
+                entry = {"provider": provider, "model": model_name, "temperature": temperature,
+                         "created": time.time(), "responses": [], "query_seconds": []}
+            # occurrences may finish out of order: pad the slots in between
+            missing = occurrence + 1 - len(entry["responses"])
+            if missing > 0:
+                entry["responses"].extend([None] * missing)
+                entry["query_seconds"].extend([0.0] * missing)
+            entry["responses"][occurrence] = response
+            entry["query_seconds"][occurrence] = elapsed
+            self.store(key, entry)
+
+    def query(self, provider, model_name, temperature, prompt, query_fn):
+        """
+        Answer prompt from the cache if possible, otherwise with query_fn(prompt),
+        storing the new response.
+        """
+        if self.mode == 'bypass':
+            return query_fn(prompt)
+        key, occurrence, _, response = self.lookup(provider, model_name, temperature, prompt)
+        if response is not None:
+            return response
+        start = time.perf_counter()
+        response = query_fn(prompt)
+        self.record(key, occurrence, provider, model_name, temperature, response, time.perf_counter() - start)
+        return response
+
+    async def aquery(self, provider, model_name, temperature, prompt, aquery_fn):
+        """
+        query() for a coroutine function aquery_fn.
+        """
+        if self.mode == 'bypass':
+            return await aquery_fn(prompt)
+        key, occurrence, _, response = self.lookup(provider, model_name, temperature, prompt)
+        if response is not None:
+            return response
+        start = time.perf_counter()
+        response = await aquery_fn(prompt)
+        self.record(key, occurrence, provider, model_name, temperature, response, time.perf_counter() - start)
+        return response
+
+    def store(self, key, entry):
+        # write to a temporary name and rename, so a concurrent run never reads a half-written entry
+        path = self.entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """
+        Remove expired entries, then least-recently-used ones until the cache fits in max_bytes.
+        """
+        entries = []
+        total = 0
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                mtime = os.path.getmtime(path)
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            # an entry's mtime is at least its creation time, so this only removes expired entries
+            if self.ttl_seconds is not None and now - mtime > self.ttl_seconds:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            entries.append((mtime, size, path))
+            total += size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "query_seconds": self.query_seconds,
+            "saved_seconds": self.saved_seconds,
+        }
+
+    def report(self):
+        if self.mode == 'bypass':
+            return
+        s = self.stats()
+        print(f"[INFO] LLM response cache ({self.mode}): {s['hits']} hits, {s['misses']} misses "
+              f"(hit rate {s['hit_rate']:.0%}), {s['query_seconds']:.2f}s querying, "
+              f"~{s['saved_seconds']:.2f}s of queries saved")
+
+
+_response_cache = None
+
+
+def configure_response_cache(mode='bypass', ttl_seconds=None, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Replace the process-wide response cache.
+
+    Raises:
+        ValueError: for an unknown mode.
+    """
+    global _response_cache
+    _response_cache = ResponseCache(cache_dir or os.environ.get("RESPONSE_CACHE_DIR", DEFAULT_CACHE_DIR),
+                                    max_bytes=max_bytes, ttl_seconds=ttl_seconds, mode=mode)
+    return _response_cache
+
+
+def get_response_cache():
+    """
+    Return the process-wide response cache (bypassed unless configure_response_cache()
+    turned it on). The location can be overridden with the RESPONSE_CACHE_DIR
+    environment variable.
+    """
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache(os.environ.get("RESPONSE_CACHE_DIR", DEFAULT_CACHE_DIR))
+    return _response_cache
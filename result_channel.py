@@ -0,0 +1,127 @@
+import os
+import struct
+
+import numpy as np
+
+# Record layout written by harness_emit_result() in the harness prelude
+RECORD_LENGTH = struct.Struct("=I")
+FIELD_COUNT = struct.Struct("=H")
+INT64 = struct.Struct("=q")
+DOUBLE = struct.Struct("=d")
+UINT32 = struct.Struct("=I")
+
+
+def decode_record(payload):
+    """
+    Decode one result record payload into {name: int | float | str}.
+    """
+    (count,) = FIELD_COUNT.unpack_from(payload, 0)
+    pos = FIELD_COUNT.size
+    values = {}
+    for _ in range(count):
+        name_len = payload[pos]
+        pos += 1
+        name = payload[pos:pos + name_len].decode()
+        pos += name_len
+        kind = payload[pos:pos + 1]
+        pos += 1
+        if kind == b'i':
+            (value,) = INT64.unpack_from(payload, pos)
+            pos += INT64.size
+        elif kind == b'd':
+            (value,) = DOUBLE.unpack_from(payload, pos)
+            pos += DOUBLE.size
+        else:
+            (length,) = UINT32.unpack_from(payload, pos)
+            pos += UINT32.size
+            value = payload[pos:pos + length].decode(errors='replace')
+            pos += length
+        values[name] = value
+    return values
+
+
+def merge_records(records):
+    """
+    Merge the records of one run into a single dict, or None if the run emitted none
+    (in which case callers fall back to parsing stdout).
+    """
+    if not records:
+        return None
+    merged = {}
+    for record in records:
+        merged.update(record)
+    return merged
+
+
+def decode_stream(data):
+    """
+    Split a byte stream of records into groups, one per request (a zero-length
+    record ends a group). Trailing records without a terminator form a last group.
+
+    Returns:
+        list: one list of decoded records per request.
+    """
+    groups = []
+    current = []
+    pos = 0
+    while pos + RECORD_LENGTH.size <= len(data):
+        (length,) = RECORD_LENGTH.unpack_from(data, pos)
+        pos += RECORD_LENGTH.size
+        if length == 0:
+            groups.append(current)
+            current = []
+            continue
+        current.append(decode_record(data[pos:pos + length]))
+        pos += length
+    if current:
+        groups.append(current)
+    return groups
+
+
+def read_exact(fd, size):
+    chunks = []
+    while size > 0:
+        chunk = os.read(fd, size)
+        if not chunk:
+            raise EOFError("Result channel closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def read_request(fd):
+    """
+    Read the records of one fork-server request from fd, up to its terminator.
+    """
+    records = []
+    while True:
+        (length,) = RECORD_LENGTH.unpack(read_exact(fd, RECORD_LENGTH.size))
+        if length == 0:
+            return records
+        records.append(decode_record(read_exact(fd, length)))
+
+
+def read_all(fd):
+    chunks = []
+    while True:
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+
+def results_to_array(results, output_vars):
+    """
+    Stack per-candidate result dicts into an (N x len(output_vars)) float array,
+    with NaN for failed candidates and missing values.
+    """
+    rows = np.full((len(results), len(output_vars)), np.nan)
+    for i, result in enumerate(results):
+        if not isinstance(result, dict):
+            continue
+        for j, var in enumerate(output_vars):
+            try:
+                rows[i, j] = float(result[var])
+            except (KeyError, TypeError, ValueError):
+                pass
+    return rows
@@ -0,0 +1,101 @@
+import atexit
+import json
+import os
+import shutil
+import tempfile
+from collections import deque
+
+SCRATCH_BACKENDS = ('disk', 'tmpfs', 'memory')
+TMPFS_ROOT = '/dev/shm'
+
+
+def to_jsonable(value):
+    if isinstance(value, (int, float, str)) or value is None:
+        return value
+    return str(value)
+
+
+class ScratchStore:
+    """
+    Where the substituted script_N.c copies of a placeholder template go.
+
+    - 'disk' writes them next to the template (or into base_dir), as before
+    - 'tmpfs' writes them to a private directory under /dev/shm
+    - 'memory' writes no files; the source is compiled straight from memory
+
+    Only the last `retention` script files are kept. For auditing, the store keeps
+    the template path plus the last `retention` substituted value vectors and
+    rewrites them to <template>_candidates.json every `flush_every` records and
+    when the store is closed.
+    """
+
+    def __init__(self, template_path, backend='disk', retention=100, base_dir=None, flush_every=50):
+        if backend not in SCRATCH_BACKENDS:
+            raise ValueError(f"Unknown scratch backend '{backend}', expected one of {SCRATCH_BACKENDS}")
+        self.template_path = template_path
+        self.backend = backend
+        self.retention = retention
+        self.flush_every = flush_every
+        self.vectors = deque(maxlen=retention)
+        self.files = deque()
+        self.total = 0
+        self.owns_dir = False
+
+        template_dir = base_dir or os.path.dirname(template_path) or "."
+        base, _ = os.path.splitext(os.path.basename(template_path))
+        self.audit_path = os.path.join(template_dir, f"{base}_candidates.json")
+        if backend == 'disk':
+            self.dir = template_dir
+        elif backend == 'tmpfs':
+            root = TMPFS_ROOT if os.path.isdir(TMPFS_ROOT) else None
+            self.dir = tempfile.mkdtemp(prefix="symex_scratch_", dir=root)
+            self.owns_dir = True
+        else:
+            self.dir = None
+        atexit.register(self.close)
+
+    def record(self, input_values):
+        """
+        Record one evaluated value vector for the audit trail. Returns its index.
+        """
+        index = self.total
+        self.vectors.append({"index": index, "values": {k: to_jsonable(v) for k, v in input_values.items()}})
+        self.total += 1
+        if self.flush_every and self.total % self.flush_every == 0:
+            self.flush()
+        return index
+
+    def store(self, source, input_values):
+        """
+        Record the value vector and, unless the backend is 'memory', write the
+        substituted source as script_N.c, deleting copies beyond the retention cap.
+
+        Returns:
+            str or None: path of the written script, or None for the 'memory' backend.
+        """
+        index = self.record(input_values)
+        if self.dir is None:
+            return None
+        output_file = os.path.join(self.dir, f"script_{index}.c")
+        with open(output_file, 'w') as f_out:
+            f_out.write(source)
+        self.files.append(output_file)
+        while len(self.files) > self.retention:
+            try:
+                os.remove(self.files.popleft())
+            except OSError:
+                pass
+        return output_file
+
+    def flush(self):
+        with open(self.audit_path, 'w') as f:
+            json.dump({"template": os.path.abspath(self.template_path), "backend": self.backend,
+                       "total": self.total, "vectors": list(self.vectors)}, f)
+
+    def close(self):
+        if self.total and os.path.isdir(os.path.dirname(self.audit_path) or "."):
+            self.flush()
+        if self.owns_dir:
+            shutil.rmtree(self.dir, ignore_errors=True)
+            self.owns_dir = False
+        atexit.unregister(self.close)
@@ -0,0 +1,143 @@
+from z3 import (parse_smt2_file, ArraySort, BitVecSort, BitVecVal, Int, Select, Extract, Int2BV, substitute,
+                simplify, And, Or, Not, is_select, is_const, is_bv_value, is_app,
+                If, Z3_OP_INT2BV, Z3_OP_EQ, Z3_OP_DISTINCT, Z3_OP_SLT, Z3_OP_SLEQ, Z3_OP_SGT, Z3_OP_SGEQ,
+                Z3_OP_ULT, Z3_OP_ULEQ, Z3_OP_UGT, Z3_OP_UGEQ, Z3_OP_AND, Z3_OP_OR, Z3_OP_NOT,
+                Z3_OP_UNINTERPRETED)
+
+# Symbolic inputs of KLEE-style queries: arrays from 32-bit indices to bytes
+BYTE_ARRAY_SORT = ArraySort(BitVecSort(32), BitVecSort(8))
+
+# C type of an n-byte little-endian integer input
+WIDTH_TYPES = {1: 'char', 2: 'short', 4: 'int', 8: 'long'}
+
+# Bit-vector comparisons, the Int comparison they become and whether they compare unsigned
+BV_COMPARISONS = {
+    Z3_OP_EQ: (lambda a, b: a == b, False),
+    Z3_OP_DISTINCT: (lambda a, b: a != b, False),
+    Z3_OP_SLT: (lambda a, b: a < b, False),
+    Z3_OP_SLEQ: (lambda a, b: a <= b, False),
+    Z3_OP_SGT: (lambda a, b: a > b, False),
+    Z3_OP_SGEQ: (lambda a, b: a >= b, False),
+    Z3_OP_ULT: (lambda a, b: a < b, True),
+    Z3_OP_ULEQ: (lambda a, b: a <= b, True),
+    Z3_OP_UGT: (lambda a, b: a > b, True),
+    Z3_OP_UGEQ: (lambda a, b: a >= b, True),
+}
+
+
+def is_smt2_file(path):
+    return path.lower().endswith('.smt2')
+
+
+def find_byte_arrays(assertions):
+    """
+    Find the byte arrays the assertions read from, with the constant indices read.
+
+    Returns:
+        dict: array name -> (array constant, set of indices, True if some index is symbolic)
+    """
+    arrays = {}
+    seen = set()
+    stack = list(assertions)
+    while stack:
+        expr = stack.pop()
+        if expr.get_id() in seen:
+            continue
+        seen.add(expr.get_id())
+        if is_select(expr):
+            array, index = expr.arg(0), expr.arg(1)
+            if is_const(array) and array.sort() == BYTE_ARRAY_SORT:
+                entry = arrays.setdefault(str(array), (array, set(), [False]))
+                if is_bv_value(index):
+                    entry[1].add(index.as_long())
+                else:
+                    entry[2][0] = True
+        if is_app(expr):
+            stack.extend(expr.children())
+    return {name: (array, indices, symbolic[0]) for name, (array, indices, symbolic) in arrays.items()}
+
+
+def _full_width_var(expr, widths):
+    # int2bv(x) over the full width of a mapped variable x
+    if expr.decl().kind() != Z3_OP_INT2BV:
+        return None
+    arg = expr.arg(0)
+    if is_const(arg) and arg.decl().kind() == Z3_OP_UNINTERPRETED and widths.get(str(arg)) == expr.size():
+        return arg
+    return None
+
+
+def lower_to_int(expr, widths):
+    """
+    Rewrite comparisons between whole mapped variables and constants, e.g. the
+    byte concatenation of x == 5, into Int comparisons, so the common cases need no
+    bit-vector reasoning and stay usable by the concrete evaluators. Anything else
+    is only simplified.
+    """
+    kind = expr.decl().kind() if is_app(expr) else None
+    if kind == Z3_OP_AND:
+        return And(*[lower_to_int(child, widths) for child in expr.children()])
+    if kind == Z3_OP_OR:
+        return Or(*[lower_to_int(child, widths) for child in expr.children()])
+    if kind == Z3_OP_NOT:
+        return Not(lower_to_int(expr.arg(0), widths))
+    if kind in BV_COMPARISONS and expr.num_args() == 2 and expr.arg(0).sort().kind() == BitVecSort(8).kind():
+        compare, unsigned = BV_COMPARISONS[kind]
+        operands = []
+        for child in expr.children():
+            # the concatenated bytes of a variable simplify to int2bv(x)
+            child = simplify(child)
+            var = _full_width_var(child, widths)
+            if var is not None:
+                operands.append(If(var < 0, var + 2 ** child.size(), var) if unsigned else var)
+            elif is_bv_value(child):
+                operands.append(child.as_long() if unsigned else child.as_signed_long())
+            else:
+                return simplify(expr)
+        if any(not isinstance(operand, int) for operand in operands):
+            return compare(*operands)
+    return simplify(expr)
+
+
+def load_smt2_constraints(path):
+    """
+    Parse an SMT-LIB2 query (e.g. from KLEE) once and map its byte arrays to typed
+    variables: an array read at bytes 0..n-1 becomes a signed little-endian integer
+    Int variable of the same name and of type char/short/int/long for n = 1/2/4/8
+    (as bytes_to_int() in smt2_test.py reassembles them). Arrays read at symbolic
+    indices or beyond 8 bytes are left as arrays.
+
+    Returns:
+        tuple: (z3_constraints, ctx, types) in the shape of parse_to_z3(), plus the
+               variable name -> C type mapping for the mapped variables.
+    """
+    assertions = list(parse_smt2_file(path))
+    ctx = {}
+    types = {}
+    widths = {}
+    substitutions = []
+    range_constraints = []
+    for name, (array, indices, symbolic) in sorted(find_byte_arrays(assertions).items()):
+        num_bytes = next((n for n in sorted(WIDTH_TYPES) if indices and max(indices) < n), None)
+        if symbolic or num_bytes is None:
+            print(f"[WARN] Keeping byte array '{name}' of {path} as an array "
+                  f"({'symbolic index' if symbolic else f'{max(indices) + 1} bytes'})")
+            continue
+        var = Int(name)
+        bits = Int2BV(var, 8 * num_bytes)
+        ctx[name] = var
+        types[name] = WIDTH_TYPES[num_bytes]
+        widths[name] = 8 * num_bytes
+        for i in range(num_bytes):
+            substitutions.append((Select(array, BitVecVal(i, 32)), Extract(8 * i + 7, 8 * i, bits)))
+        bound = 2 ** (8 * num_bytes - 1)
+        range_constraints.extend([var >= -bound, var < bound])
+
+    z3_constraints = []
+    for assertion in assertions:
+        if substitutions:
+            assertion = substitute(assertion, *substitutions)
+        z3_constraints.append(lower_to_int(assertion, widths))
+    print(f"[INFO] Loaded {len(z3_constraints)} assertions from {path}, variables: {types}")
+    ctx.update({'And': And, 'Or': Or, 'Not': Not})
+    return z3_constraints + range_constraints, ctx, types
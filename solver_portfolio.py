@@ -0,0 +1,357 @@
+import json
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+from fractions import Fraction
+
+from z3 import (Solver, SolverFor, Optimize, Tactic, Sum, IntVal, RealVal, Const, sat, unsat, is_true,
+                parse_smt2_string, is_app, is_int_value, is_rational_value, is_algebraic_value, Z3Exception)
+
+from z3_scripts import (OPTIMAL, APPROXIMATE, UNKNOWN, INFEASIBLE, get_solver_budget, build_distance_objective,
+                        is_nonlinear)
+
+# Strategies raced to find any solution of a constraint set
+SOLVE_STRATEGIES = ('default', 'seed-1', 'seed-2', 'nlsat', 'nia')
+# Strategies raced to find the solution closest (L1) to a target assignment
+MINIMIZE_STRATEGIES = ('optimize', 'tightening', 'tightening-nlsat')
+
+
+def constraint_family(constraints):
+    """
+    Coarse family of a constraint set, under which strategy statistics are kept:
+    'linear' or 'nonlinear', and 'int', 'real' or 'mixed' arithmetic.
+    """
+    constraints = list(constraints)
+    sorts = set()
+    seen = set()
+    stack = list(constraints)
+    while stack:
+        expr = stack.pop()
+        if expr.get_id() in seen or not is_app(expr):
+            continue
+        seen.add(expr.get_id())
+        sort_name = expr.sort().name()
+        if sort_name in ("Int", "Real"):
+            sorts.add(sort_name)
+        stack.extend(expr.children())
+    arithmetic = 'mixed' if len(sorts) > 1 else ('real' if sorts == {"Real"} else 'int')
+    return f"{'nonlinear' if is_nonlinear(constraints) else 'linear'}-{arithmetic}"
+
+
+def _make_solver(strategy):
+    if strategy == 'nlsat' or strategy.endswith('-nlsat'):
+        return Tactic('qfnra-nlsat').solver()
+    if strategy == 'nia':
+        return SolverFor('QF_NIA')
+    solver = Solver()
+    if strategy.startswith('seed-'):
+        solver.set("random_seed", int(strategy.split('-')[1]))
+    return solver
+
+
+def _plain_values(model):
+    # picklable exact values: int for Int, Fraction for Real (algebraic numbers approximated)
+    values = {}
+    for d in model:
+        if d.arity() > 0:
+            continue
+        value = model[d]
+        if is_algebraic_value(value):
+            value = value.approx(20)
+        if is_int_value(value):
+            values[str(d)] = value.as_long()
+        elif is_rational_value(value):
+            values[str(d)] = Fraction(value.numerator_as_long(), value.denominator_as_long())
+    return values
+
+
+def _solve(strategy, constraints, timeout_ms):
+    solver = _make_solver(strategy)
+    solver.set("timeout", timeout_ms)
+    solver.add(constraints)
+    result = solver.check()
+    if result == sat:
+        return OPTIMAL, _plain_values(solver.model()), None
+    return (INFEASIBLE if result == unsat else UNKNOWN), None, None
+
+
+def _minimize(strategy, hard_constraints, objective, timeout_ms):
+    if strategy == 'optimize':
+        opt = Optimize()
+        opt.set("timeout", timeout_ms)
+        opt.add(hard_constraints)
+        opt.minimize(objective)
+        result = opt.check()
+        if result == unsat:
+            return INFEASIBLE, None, None
+        try:
+            m = opt.model()
+        except Z3Exception:
+            return UNKNOWN, None, None
+        if result == sat:
+            # on nonlinear problems Optimize may stop at a local optimum
+            status = APPROXIMATE if is_nonlinear(list(hard_constraints) + [objective]) else OPTIMAL
+            return status, _plain_values(m), m.eval(objective, model_completion=True)
+        # timed out: keep the best model so far if it satisfies the hard constraints
+        if len(m) == 0 or not all(is_true(m.eval(c, model_completion=True)) for c in hard_constraints):
+            return UNKNOWN, None, None
+        return APPROXIMATE, _plain_values(m), m.eval(objective, model_completion=True)
+
+    # iterative tightening: any model, then demand a strictly smaller objective until unsat
+    deadline = time.monotonic() + timeout_ms / 1000
+    solver = _make_solver(strategy)
+    solver.add(hard_constraints)
+    best, best_value = None, None
+    while True:
+        remaining_ms = int((deadline - time.monotonic()) * 1000)
+        if remaining_ms <= 0:
+            break
+        solver.set("timeout", remaining_ms)
+        result = solver.check()
+        if result == unsat:
+            if best is None:
+                return INFEASIBLE, None, None
+            return OPTIMAL, best, best_value
+        if result != sat:
+            break
+        m = solver.model()
+        best, best_value = _plain_values(m), m.eval(objective, model_completion=True)
+        solver.add(objective < best_value)
+    return (APPROXIMATE, best, best_value) if best is not None else (UNKNOWN, None, None)
+
+
+# Constant tying the objective of a minimize race to its serialized constraints
+OBJECTIVE_MARKER = "__portfolio_objective"
+
+
+def serialize_problem(constraints, objective=None):
+    """
+    SMT-LIB text of constraints (and objective, asserted last as OBJECTIVE_MARKER ==
+    objective), to hand a problem to a child process: Z3 terms can't be pickled, and
+    forking a process whose other threads may hold Z3 locks can deadlock the child.
+    """
+    solver = Solver()
+    solver.add(constraints)
+    if objective is not None:
+        solver.add(Const(OBJECTIVE_MARKER, objective.sort()) == objective)
+    return solver.sexpr()
+
+
+def parse_problem(text, with_objective=False):
+    """
+    Inverse of serialize_problem(): the list of constraints, or (constraints, objective).
+    """
+    constraints = list(parse_smt2_string(text))
+    if not with_objective:
+        return constraints
+    return constraints[:-1], constraints[-1].arg(1)
+
+
+def _run_strategy(results, kind, strategy, problem, timeout_ms):
+    # Runs in a fresh child process: the problem arrives as SMT-LIB text (see serialize_problem())
+    start = time.monotonic()
+    try:
+        if kind == 'solve':
+            status, values, objective = _solve(strategy, parse_problem(problem), timeout_ms)
+        else:
+            status, values, objective = _minimize(strategy, *parse_problem(problem, with_objective=True),
+                                                  timeout_ms=timeout_ms)
+        if objective is not None:
+            objective = objective.as_long() if is_int_value(objective) else \
+                objective.as_fraction() if is_rational_value(objective) else None
+    except Z3Exception as e:
+        print(f"[WARN] Portfolio strategy '{strategy}' failed: {e}")
+        status, values, objective = UNKNOWN, None, None
+    results.put((strategy, status, values, objective, time.monotonic() - start))
+
+
+class PortfolioStats:
+    """
+    Per constraint family and strategy: how often it ran, how often it won the race,
+    and the total time of its wins. Optionally persisted as JSON at path, so the
+    strategy ranking carries over between runs; the file is replaced atomically after
+    each race, so an interrupted run never leaves it truncated.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.counts = {}
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.counts = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[WARN] Ignoring unreadable portfolio statistics {path}: {e}")
+
+    def entry(self, family, strategy):
+        return self.counts.setdefault(family, {}).setdefault(strategy, {"runs": 0, "wins": 0, "win_seconds": 0.0})
+
+    def record(self, family, strategies, winner=None, seconds=0.0):
+        with self.lock:
+            for strategy in strategies:
+                self.entry(family, strategy)["runs"] += 1
+            if winner is not None:
+                entry = self.entry(family, winner)
+                entry["wins"] += 1
+                entry["win_seconds"] += seconds
+            if self.path:
+                self.save()
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(self.path) + ".", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.counts, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[WARN] Could not save portfolio statistics to {self.path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def ranking(self, family, strategies):
+        """
+        strategies ordered by smoothed win rate in the family (ties keep the given order).
+        """
+        with self.lock:
+            counts = {strategy: dict(entry) for strategy, entry in self.counts.get(family, {}).items()}
+
+        def win_rate(strategy):
+            entry = counts.get(strategy, {"runs": 0, "wins": 0})
+            return (entry["wins"] + 1) / (entry["runs"] + 2)
+        return sorted(strategies, key=win_rate, reverse=True)
+
+    def report(self):
+        for family, strategies in sorted(self.counts.items()):
+            for strategy, entry in sorted(strategies.items(), key=lambda item: -item[1]["wins"]):
+                mean = entry["win_seconds"] / entry["wins"] if entry["wins"] else 0.0
+                print(f"[INFO] Portfolio {family:>18} {strategy:>16}: won {entry['wins']}/{entry['runs']} "
+                      f"races, {mean:.3f}s per win")
+
+
+class SolverPortfolio:
+    """
+    Races several Z3 configurations on the same problem in child processes and takes
+    the first conclusive answer (a solution, an optimum or infeasibility); the other
+    processes are terminated. At most max_workers strategies run per race, the best
+    ones for the constraint family according to the statistics.
+
+    Time limits come from the solver budget (see configure_solver_budget()), which is
+    charged with the wall time of each race.
+    """
+
+    def __init__(self, max_workers=None, stats_path=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.stats = PortfolioStats(stats_path)
+        # not "fork": races run on TaskGraph worker threads, and a child forked while
+        # another thread holds a Z3 (or allocator) lock can hang
+        self.mp = multiprocessing.get_context("forkserver")
+
+    def _race(self, kind, strategies, problem, family, label):
+        budget = get_solver_budget()
+        timeout_ms = budget.timeout_ms()
+        if timeout_ms == 0:
+            print(f"[WARN] {label}: solver run budget of {budget.run_seconds}s spent, skipping")
+            return UNKNOWN, None
+        if timeout_ms is None:
+            timeout_ms = 2 ** 31 - 1
+        strategies = self.stats.ranking(family, strategies)[:self.max_workers]
+        results = self.mp.Queue()
+        processes = [self.mp.Process(target=_run_strategy, args=(results, kind, strategy, problem, timeout_ms),
+                                     daemon=True) for strategy in strategies]
+        start = time.monotonic()
+        for process in processes:
+            process.start()
+
+        winner, best = None, (UNKNOWN, None, None)
+        pending = len(processes)
+        deadline = start + timeout_ms / 1000 + 1.0
+        try:
+            while pending:
+                try:
+                    strategy, status, values, objective, seconds = results.get(
+                        timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                pending -= 1
+                if status in (OPTIMAL, INFEASIBLE):
+                    winner, best = strategy, (status, values, objective)
+                    break
+                if status == APPROXIMATE and (best[0] != APPROXIMATE or
+                                              (objective is not None and best[2] is not None and objective < best[2])):
+                    best = (status, values, objective)
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            for process in processes:
+                process.join()
+            results.close()
+        elapsed = time.monotonic() - start
+        budget.charge(elapsed)
+
+        self.stats.record(family, strategies, winner, elapsed)
+        if winner is not None:
+            print(f"[INFO] {label}: '{winner}' won the {family} race of {len(strategies)} in {elapsed:.3f}s ({best[0]})")
+        else:
+            print(f"[WARN] {label}: no strategy reached a proven answer within the budget ({best[0]})")
+        return best[0], best[1]
+
+    def solve(self, constraints, family=None):
+        """
+        Any solution of constraints.
+
+        Returns:
+            tuple: (solution, status) with solution a {name: value} dict of Python ints
+                   and floats (as model_to_solution()) or None, and status OPTIMAL for a
+                   solution, INFEASIBLE or UNKNOWN.
+        """
+        constraints = list(constraints)
+        family = family or constraint_family(constraints)
+        status, values = self._race('solve', SOLVE_STRATEGIES, serialize_problem(constraints), family,
+                                    "Portfolio solve")
+        if values is None:
+            return None, status
+        return {var: float(val) if isinstance(val, Fraction) else val for var, val in values.items()}, status
+
+    def minimize_distance(self, hard_constraints, soft_constraints, ctx, family=None, **options):
+        """
+        The solution closest in L1 distance to soft_constraints, as find_numeric_min_solution()
+        (options such as weights are passed to build_distance_objective()).
+
+        Returns:
+            tuple: (solution, status) with solution a {name: Z3 value} dict or None, and
+                   the status as in check_optimize().
+        """
+        hard_constraints = list(hard_constraints)
+        slack_constraints, terms, slack_names = build_distance_objective(soft_constraints, ctx, **options)
+        objective = Sum([term for _, term in terms]) if terms else IntVal(0)
+        family = family or constraint_family(hard_constraints)
+        status, values = self._race('minimize', MINIMIZE_STRATEGIES,
+                                    serialize_problem(hard_constraints + slack_constraints, objective),
+                                    family, "Portfolio minimize")
+        if values is None:
+            return None, status
+        return {var: RealVal(str(val)) if isinstance(val, Fraction) else IntVal(val)
+                for var, val in values.items() if var not in slack_names}, status
+
+
+# Process-wide portfolio, None when portfolio mode is off
+_portfolio = None
+
+
+def configure_portfolio(max_workers=None, stats_path=None):
+    """
+    Turn portfolio mode on with a process-wide SolverPortfolio (max_workers=0 turns it off).
+    """
+    global _portfolio
+    _portfolio = None if max_workers == 0 else SolverPortfolio(max_workers=max_workers, stats_path=stats_path)
+    return _portfolio
+
+
+def get_portfolio():
+    return _portfolio
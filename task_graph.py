@@ -0,0 +1,102 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class TaskFailed(RuntimeError):
+    """
+    Raised by TaskGraph.run() when a task raised; the original exception is chained.
+    """
+
+
+class TaskGraph:
+    """
+    A small DAG of pipeline stages, run on a thread pool: each task starts as soon
+    as the tasks it depends on have finished, so independent LLM calls, solving and
+    compilation overlap and the wall-clock time approaches the critical path.
+
+    A task function is called with the results of its dependencies as keyword
+    arguments named after them. Tasks that name the same resource (e.g. "z3", whose
+    contexts are not thread-safe) never run at the same time.
+    """
+
+    def __init__(self, max_workers=8):
+        # stages mostly wait on LLM requests and compilers, so threads are not bound by the core count
+        self.max_workers = max_workers
+        self.tasks = {}
+        self.timings = {}
+
+    def add(self, name, fn, deps=(), resources=()):
+        """
+        Raises:
+            ValueError: if name is taken or a dependency is not a known task.
+        """
+        if name in self.tasks:
+            raise ValueError(f"Task '{name}' already exists")
+        missing = [dep for dep in deps if dep not in self.tasks]
+        if missing:
+            raise ValueError(f"Task '{name}' depends on unknown tasks {missing}")
+        self.tasks[name] = (fn, tuple(deps), frozenset(resources))
+
+    def run(self):
+        """
+        Run all tasks.
+
+        Returns:
+            dict: task name -> result.
+
+        Raises:
+            TaskFailed: if a task raised. Tasks already running are waited for, the
+                        others are not started.
+        """
+        results = {}
+        pending = dict(self.tasks)
+        running = {}
+        busy = set()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                # tasks are added after their dependencies, so dict order is a topological order
+                for name, (fn, deps, resources) in list(pending.items()):
+                    if all(dep in results for dep in deps) and not resources & busy:
+                        del pending[name]
+                        busy |= resources
+                        kwargs = {dep: results[dep] for dep in deps}
+                        running[executor.submit(self._timed, name, fn, kwargs, start)] = (name, resources)
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, resources = running.pop(future)
+                    busy -= resources
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        wait(running)
+                        raise TaskFailed(f"Task '{name}' failed: {e}") from e
+        self.report(time.perf_counter() - start)
+        return results
+
+    def _timed(self, name, fn, kwargs, start):
+        begin = time.perf_counter()
+        try:
+            return fn(**kwargs)
+        finally:
+            self.timings[name] = (begin - start, time.perf_counter() - start)
+
+    def critical_path(self):
+        """
+        The chain of dependencies that finished last, i.e. what bounded the wall-clock time.
+        """
+        if not self.timings:
+            return []
+        name = max(self.timings, key=lambda task: self.timings[task][1])
+        path = [name]
+        while self.tasks[name][1]:
+            name = max(self.tasks[name][1], key=lambda dep: self.timings[dep][1])
+            path.append(name)
+        return path[::-1]
+
+    def report(self, wall_seconds):
+        busy_seconds = sum(end - begin for begin, end in self.timings.values())
+        print(f"[INFO] Ran {len(self.timings)} setup tasks in {wall_seconds:.2f}s "
+              f"({busy_seconds:.2f}s of work), critical path: {' -> '.join(self.critical_path())}")
+        for name, (begin, end) in sorted(self.timings.items(), key=lambda item: item[1]):
+            print(f"[INFO]   {name}: {begin:.2f}s - {end:.2f}s")
@@ -1,11 +1,24 @@
 import re
-from z3  import Solver, sat, Int, Real, And, Or, Not, Abs, Sum, RealVal, IntVal, Optimize, sat, StringVal
+from z3 import (Solver, Optimize, sat, unsat, unknown, Int, Real, And, Or, Not, Sum, RealVal, IntVal, StringVal,
+                BoolRef, BoolVal, Z3Exception, is_true, FreshInt, FreshReal, is_app, is_int_value, is_rational_value,
+                Z3_mk_numeral, Z3_mk_ge, Z3_mk_le, Z3_mk_eq, Z3_mk_not,
+                Z3_OP_MUL, Z3_OP_DIV, Z3_OP_IDIV, Z3_OP_MOD, Z3_OP_POWER)
 import random
+import math
+import time
+from random import uniform
 import sys
 import os
-from z3 import Optimize, Abs, sat, Solver, StringVal
 import string
 import Levenshtein
+from fractions import Fraction
+from constraint_parser import parse_constraint, constraint_variables, constraint_to_z3, to_z3, ConstraintSyntaxError
+from concrete_eval import ConcretePredicate, VectorizedPredicate, to_concrete
+from exclusion_store import ExclusionStore
+
+# Value of the Z3 "timeout" parameter that means no timeout
+Z3_NO_TIMEOUT = 4294967295
+
 
 def read_constraints(filepath):
     with open(filepath, 'r') as f:
@@ -15,12 +28,13 @@ def read_constraints(filepath):
     return constraints
 
 def extract_variables(constraints):
-    var_pattern = re.compile(r'\b[a-zA-Z_]\w*\b')
     variables = set()
     for c in constraints:
-        for var in var_pattern.findall(c):
-            if not var in {'And', 'Or', 'Not'}:
-                variables.add(var)
+        try:
+            variables |= constraint_variables(parse_constraint(c))
+        except ConstraintSyntaxError:
+            # reported by parse_to_z3()
+            continue
     return variables
 
 def parse_to_z3(constraints, total_vars):
@@ -44,7 +58,7 @@ def parse_to_z3(constraints, total_vars):
     z3_constraints = []
     for c in constraints:
         try:
-            z3_constraints.append(eval(c, {}, ctx))
+            z3_constraints.append(constraint_to_z3(c, ctx))
         except Exception as e:
             print(f"Failed to parse constraint: '{c}' with error {e}")
             continue
@@ -52,7 +66,219 @@ def parse_to_z3(constraints, total_vars):
 
 
 
-def find_numeric_min_solution(hard_constraints, soft_constraints, ctx):
+def screen_candidates(candidates, var_names, z3_constraints):
+    """
+    Check a whole batch of candidate assignments against parsed constraints with
+    NumPy instead of one solver call per candidate.
+
+    Args:
+        candidates: (N x len(var_names)) array-like, or a list of dicts keyed by variable name.
+        var_names (list): Variable of each column.
+        z3_constraints (list): Z3 constraints, e.g. from parse_to_z3().
+
+    Returns:
+        tuple: (mask, violations): a boolean array of shape (N,) marking the candidates
+               that satisfy every constraint, and an (N x len(z3_constraints)) array of
+               how far each candidate is from satisfying each constraint (0 = satisfied).
+
+    Raises:
+        ValueError: if a constraint cannot be vectorized or a variable has no column.
+    """
+    return VectorizedPredicate(z3_constraints).screen(candidates, var_names)
+
+
+# Status of an optimization result
+OPTIMAL = "optimal"
+APPROXIMATE = "approximate"
+UNKNOWN = "unknown"
+INFEASIBLE = "infeasible"
+
+# Operators that make arithmetic nonlinear when applied to two non-constant terms
+NONLINEAR_OPS = (Z3_OP_MUL, Z3_OP_DIV, Z3_OP_IDIV, Z3_OP_MOD, Z3_OP_POWER)
+
+
+def is_nonlinear(exprs):
+    """
+    Whether any of the Z3 expressions multiplies, divides or raises two non-constant terms.
+    """
+    seen = set()
+    stack = list(exprs)
+    while stack:
+        expr = stack.pop()
+        if expr.get_id() in seen or not is_app(expr):
+            continue
+        seen.add(expr.get_id())
+        if expr.decl().kind() in NONLINEAR_OPS and \
+                sum(1 for child in expr.children() if not (is_int_value(child) or is_rational_value(child))) >= 2:
+            return True
+        stack.extend(expr.children())
+    return False
+
+
+class SolverBudget:
+    """
+    Time budget for Optimize calls: at most call_seconds per call and run_seconds
+    in total over the run. None disables a limit.
+    """
+
+    def __init__(self, call_seconds=None, run_seconds=None):
+        self.call_seconds = call_seconds
+        self.run_seconds = run_seconds
+        self.used_seconds = 0.0
+
+    def timeout_ms(self):
+        """
+        Timeout for the next call in ms, None for no timeout, 0 if the run budget is spent.
+        """
+        limits = []
+        if self.call_seconds is not None:
+            limits.append(self.call_seconds)
+        if self.run_seconds is not None:
+            limits.append(max(0.0, self.run_seconds - self.used_seconds))
+        if not limits:
+            return None
+        return int(min(limits) * 1000)
+
+    def charge(self, seconds):
+        self.used_seconds += seconds
+
+
+_solver_budget = SolverBudget(call_seconds=30)
+
+
+def configure_solver_budget(call_seconds=None, run_seconds=None):
+    """
+    Replace the process-wide Optimize budget (default: 30s per call, no run limit).
+    """
+    global _solver_budget
+    _solver_budget = SolverBudget(call_seconds=call_seconds, run_seconds=run_seconds)
+
+
+def get_solver_budget():
+    return _solver_budget
+
+
+def check_optimize(opt, hard_constraints, label="Optimize"):
+    """
+    Run opt.check() within the solver budget and keep the best model found so far
+    if it runs out.
+
+    Returns:
+        tuple: (solution, status) where solution is {name: Z3 value} or None and status is
+               OPTIMAL, APPROXIMATE (budget hit, best model so far that satisfies the hard
+               constraints, or a nonlinear problem, where Z3 may stop at a local optimum),
+               UNKNOWN (budget hit or solver gave up without a usable model) or INFEASIBLE
+               (the hard constraints are unsatisfiable).
+    """
+    budget = get_solver_budget()
+    timeout_ms = budget.timeout_ms()
+    if timeout_ms == 0:
+        print(f"[WARN] {label}: solver run budget of {budget.run_seconds}s spent, skipping")
+        return None, UNKNOWN
+    if timeout_ms is not None:
+        opt.set("timeout", timeout_ms)
+    start = time.monotonic()
+    result = opt.check()
+    budget.charge(time.monotonic() - start)
+
+    if result == sat:
+        m = opt.model()
+        if is_nonlinear(list(opt.assertions()) + list(opt.objectives())):
+            return {str(d): m[d] for d in m}, APPROXIMATE
+        return {str(d): m[d] for d in m}, OPTIMAL
+    if result == unsat:
+        return None, INFEASIBLE
+    try:
+        m = opt.model()
+    except Z3Exception:
+        m = None
+    if m is not None and len(m) > 0 and is_true(m.eval(And(*hard_constraints), model_completion=True)):
+        print(f"[WARN] {label}: {opt.reason_unknown()}, using the best solution found so far")
+        return {str(d): m[d] for d in m}, APPROXIMATE
+    print(f"[WARN] {label}: {opt.reason_unknown()}, no solution found")
+    return None, UNKNOWN
+
+
+# How the distance terms of build_distance_objective() are optimized
+DISTANCE_MODES = ('sum', 'lex', 'box')
+
+
+def build_distance_objective(soft_constraints, ctx, weights=None, scales=None, normalize=False):
+    """
+    Encode the weighted L1 distance to the soft constraints with one slack variable per
+    variable (d >= x - t, d >= t - x) instead of Abs(x - t), which makes the solver
+    case-split on every term. Minimizing the slacks makes them equal to |x - t|.
+
+    Args:
+        soft_constraints (dict): variable name -> target numeric value.
+        ctx (dict): variable name -> Z3 variable.
+        weights (dict): variable name -> weight (default 1).
+        scales (dict): variable name -> scale the distance is divided by (default 1).
+        normalize (bool): default each scale to max(1, |target|), so a distance is
+                          relative to the target's magnitude and ints and doubles of
+                          different magnitudes weigh alike.
+
+    Returns:
+        tuple: (slack_constraints, terms, slack_names) where terms is a list of
+               (variable name, weighted slack term), heaviest weight first.
+    """
+    weights = weights or {}
+    scales = scales or {}
+    slack_constraints = []
+    terms = []
+    slack_names = set()
+    for var, val in soft_constraints.items():
+        z3_var = ctx[var]
+        is_real = z3_var.sort().name() == "Real"
+        target = RealVal(val) if is_real else IntVal(int(val))
+        slack = FreshReal(f"dist_{var}") if is_real else FreshInt(f"dist_{var}")
+        slack_names.add(str(slack))
+        slack_constraints.extend([slack >= z3_var - target, slack >= target - z3_var])
+
+        scale = scales.get(var)
+        if scale is None:
+            scale = max(1, abs(to_concrete(val, True))) if normalize else 1
+        coefficient = Fraction(str(weights.get(var, 1))) / Fraction(str(scale))
+        if coefficient == 1:
+            term = slack
+        elif coefficient.denominator == 1:
+            term = IntVal(coefficient.numerator) * slack
+        else:
+            term = RealVal(str(coefficient)) * slack
+        terms.append((var, term, coefficient))
+    terms.sort(key=lambda term: term[2], reverse=True)
+    return slack_constraints, [(var, term) for var, term, _ in terms], slack_names
+
+
+def add_distance_objective(opt, soft_constraints, ctx, mode='sum', **options):
+    """
+    Add the distance objective of build_distance_objective() (options are passed on)
+    to an Optimize: 'sum' minimizes the weighted sum of the distances, 'lex' the
+    distances one by one in order of weight, 'box' each distance independently.
+
+    Returns:
+        set: names of the slack variables, to leave out of solutions.
+
+    Raises:
+        ValueError: for an unknown mode.
+    """
+    if mode not in DISTANCE_MODES:
+        raise ValueError(f"Unknown distance mode '{mode}', expected one of {DISTANCE_MODES}")
+    slack_constraints, terms, slack_names = build_distance_objective(soft_constraints, ctx, **options)
+    opt.add(slack_constraints)
+    if not terms:
+        return slack_names
+    if mode == 'sum':
+        opt.minimize(Sum([term for _, term in terms]))
+    else:
+        opt.set(priority=mode)
+        for _, term in terms:
+            opt.minimize(term)
+    return slack_names
+
+
+def find_numeric_min_solution(hard_constraints, soft_constraints, ctx, with_status=False, portfolio=None,
+                              mode='sum', **options):
     """
     Find an assignment that minimizes the L1 distance to the given numeric soft constraints.
 
@@ -60,30 +286,28 @@ def find_numeric_min_solution(hard_constraints, soft_constraints, ctx):
         hard_constraints: list of Z3 BoolRef (hard constraints)
         soft_constraints: dict mapping variable_name (str) to target numeric value (int or float)
         ctx: dict mapping variable_name (str) to Z3 variable
+        with_status: also return the status of the result (see check_optimize())
+        portfolio: SolverPortfolio to race several configurations instead of one Optimize call
+        mode: 'sum', 'lex' or 'box' (see add_distance_objective())
+        options: weights, scales and normalize for build_distance_objective()
 
     Returns:
         dict[str, Z3 value]: a model assignment minimizing sum(|var - target|), or None
+        (a (solution, status) tuple if with_status)
     """
+    if portfolio is not None and mode == 'sum':
+        solution, status = portfolio.minimize_distance(hard_constraints, soft_constraints, ctx, **options)
+        return (solution, status) if with_status else solution
+
     opt = Optimize()
     for c in hard_constraints:
         opt.add(c)
+    slack_names = add_distance_objective(opt, soft_constraints, ctx, mode=mode, **options)
 
-    objective_terms = []
-    for var, val in soft_constraints.items():
-        z3_var = ctx[var]
-        if z3_var.sort().name() == "Real":
-            val_expr = RealVal(val)
-        else:
-            val_expr = IntVal(int(val))
-        objective_terms.append(Abs(z3_var - val_expr))
-
-    opt.minimize(sum(objective_terms))
-
-    if opt.check() == sat:
-        m = opt.model()
-        return {str(d): m[d] for d in m}
-    else:
-        return None
+    solution, status = check_optimize(opt, hard_constraints, "find_numeric_min_solution")
+    if solution is not None:
+        solution = {var: val for var, val in solution.items() if var not in slack_names}
+    return (solution, status) if with_status else solution
 
 
 def find_random_near_soft_solution(hard_constraints, soft_constraints, ctx, percentage_range=(0.05, 0.3), tries=5):
@@ -155,36 +379,10 @@ def add_fixed_values_z3_constraints(z3_constraints, fixed_values, ctx, types_dic
     updated_constraints = list(z3_constraints)
 
     for var, raw_val in fixed_values.items():
-        typ = types_dict.get(var, "int").lower()
-
-        # Declare variable in Z3 context if missing
-        
-        #if any of the words float double  is in the type, use Real
-        if any(word in typ for word in ["float", "double"]):
-            ctx_new[var] = Real(var)
-        else:
-            ctx_new[var] = Int(var)
-
-        z3_var = ctx_new[var]
-
-        # Convert & wrap the value appropriately
-        if any(word in typ for word in ["float", "double"]):
-            # treat as Real: cast to float then to Python string for Z3
-            val = float(raw_val)
-            val_str = str(val)
-        elif typ in {"int", "long"}:
-            # treat as Int
-            val = int(float(raw_val))
-            val_str = str(val)
-        else:
-            # For other types (e.g., strings), we could extend here
-            # For now, raise or skip
-            raise ValueError(f"Unsupported fixed-value type '{typ}' for var '{var}'")
-
-        # Build and add the constraint
-        constraint = eval(f"{var} == {val_str}", {}, ctx_new)
+        # Build the constraint directly from the typed value
+        constraint = fixed_value_constraint(var, raw_val, ctx_new, types_dict)
         updated_constraints.append(constraint)
-        print(f"[add_fixed_values] Added {typ} constraint: {var} == {val_str}")
+        print(f"[add_fixed_values] Added {types_dict.get(var, 'int')} constraint: {constraint}")
 
     return updated_constraints, ctx_new
 
@@ -245,7 +443,7 @@ def find_string_distance_solution(hard_constraints, soft_constraints, ctx,
 
     return best_model
 
-def find_maxsat_mixed_solution(hard_constraints, soft_constraints, ctx):
+def find_maxsat_mixed_solution(hard_constraints, soft_constraints, ctx, with_status=False):
     """
     Try to find a solution using MaxSAT with soft constraints.
     Supports both numeric and string soft constraints.
@@ -275,16 +473,22 @@ def find_maxsat_mixed_solution(hard_constraints, soft_constraints, ctx):
             soft_c = (z3_var == target)
         opt.add_soft(soft_c)
 
-    # 3. solve MaxSAT
-    if opt.check() == sat:
-        m = opt.model()
-        # return mapping var->value
-        return { str(d): m[d] for d in m }
-    else:
-        return None
+    # 3. solve MaxSAT within the solver budget
+    solution, status = check_optimize(opt, hard_constraints, "find_maxsat_mixed_solution")
+    return (solution, status) if with_status else solution
+
 
+def soft_value(value):
+    """
+    A soft-constraint target as a number or Z3 value; numeric strings (e.g. values
+    parsed from program output) go through the constraint parser instead of eval().
+    """
+    if isinstance(value, str):
+        return to_z3(parse_constraint(value), {})
+    return value
 
-def find_maxsat_solution(hard_constraints, soft_constraints, ctx, random=False):
+
+def find_maxsat_solution(hard_constraints, soft_constraints, ctx, random=False, with_status=False):
     """
     Try to find a solution using MaxSAT with soft constraints.
 
@@ -304,175 +508,368 @@ def find_maxsat_solution(hard_constraints, soft_constraints, ctx, random=False):
     #selec a random number from 0.5 to 1
     
     for var, value in soft_constraints.items():
-        
+        value = soft_value(value)
         if random:
-            random_factor = random.uniform(0.5, 1)
-            value_low *= random_factor
+            random_factor = uniform(0.5, 1)
+            value_low = value * random_factor
             value_high = value * (2 - random_factor)
-            soft_constr = eval(f"{var} >= {value_low}", {}, ctx)
-            opt.add_soft(soft_constr)
-            soft_constr = eval(f"{var} <= {value_high}", {}, ctx)
-            opt.add_soft(soft_constr)
+            opt.add_soft(ctx[var] >= value_low)
+            opt.add_soft(ctx[var] <= value_high)
         else:
-            
-            soft_constr = eval(f"{var} == {value}", {}, ctx)
-            opt.add_soft(soft_constr)
+            opt.add_soft(ctx[var] == value)
 
-    if opt.check() == sat:
-        m = opt.model()
-        solution = {str(d): m[d] for d in m}
-        return solution
-    else:
-        return None
+    solution, status = check_optimize(opt, hard_constraints, "find_maxsat_solution")
+    return (solution, status) if with_status else solution
 
-from z3 import Solver, Int, Real, Abs, Or
+def model_to_solution(model):
+    """
+    Convert a Z3 model to {name: value}: Python ints for Int, floats for Real and
+    the Z3 value for any other sort. Function interpretations are skipped.
+    """
+    sol = {}
+    for d in model:
+        if d.arity() > 0:
+            continue
+        value = model[d]
+        sort_name = value.sort().name()
+        if sort_name == 'Int':
+            sol[str(d)] = value.as_long()
+        elif sort_name == 'Real':
+            sol[str(d)] = float(value.as_decimal(10).rstrip('?'))
+        else:
+            sol[str(d)] = value
+    return sol
 
-def find_diverse_solutions(z3_constraints, max_solutions=5, start_distance=100, min_distance=1, decay_factor=0.5):
-    solver = Solver()
-    solver.add(z3_constraints)
-    solutions = []
-    current_distance = start_distance
 
-    while len(solutions) < max_solutions and solver.check() == sat:
-        model = solver.model()
-        sol = {}
-        distance_constraints = []
-
-        for d in model:
-            var_name = str(d)
-            sort_name = model[d].sort().name()
-            if sort_name == 'Int':
-                val = model[d].as_long()
-                sol[var_name] = val
-                z3_var = Int(var_name)
-                distance_constraints.append(Abs(z3_var - val) >= current_distance)
-            elif sort_name == 'Real':
-                val = float(model[d].as_decimal(10).rstrip('?'))
-                sol[var_name] = val
-                z3_var = Real(var_name)
-                distance_constraints.append(Abs(z3_var - val) >= current_distance)
-            else:
-                # Keep as Z3 value (e.g., String)
-                sol[var_name] = model[d]
+def timed_check(solver, deadline, probe_timeout_ms):
+    """
+    solver.check() limited to probe_timeout_ms and to what is left before deadline
+    (time.monotonic() seconds). Returns unknown once the deadline has passed.
+    """
+    remaining_ms = int((deadline - time.monotonic()) * 1000)
+    if remaining_ms <= 0:
+        return unknown
+    solver.set("timeout", min(probe_timeout_ms, remaining_ms))
+    try:
+        return solver.check()
+    finally:
+        solver.set("timeout", Z3_NO_TIMEOUT)
 
-        solutions.append(sol)
 
-        solver.push()
-        if distance_constraints:
-            solver.add(Or(distance_constraints))
+class SampledVariable:
+    """
+    A numeric variable of sample_diverse_solutions(). Bounds and blocking literals
+    are built with the Z3 C API directly: with hundreds of probes the coercions of
+    the Python operator overloads cost more than the solver itself.
+    """
 
-        if solver.check() != sat:
-            solver.pop()
-            current_distance = max(current_distance * decay_factor, min_distance)
-            if current_distance == min_distance:
-                break
+    def __init__(self, decl, is_int):
+        self.decl = decl
+        self.var = decl()
+        self.name = str(decl)
+        self.is_int = is_int
+        self.ctx = self.var.ctx
+        self.var_ast = self.var.as_ast()
+        self.sort_ast = self.var.sort().ast
+
+    def numeral(self, value):
+        if self.is_int:
+            text = str(int(value))
         else:
-            solver.pop()
-            solver.add(Or(distance_constraints))
-
-    return solutions
+            fraction = Fraction(value)
+            text = f"{fraction.numerator}/{fraction.denominator}"
+        return Z3_mk_numeral(self.ctx.ref(), text, self.sort_ast)
 
+    def bounds(self, low, high):
+        ref = self.ctx.ref()
+        return [BoolRef(Z3_mk_ge(ref, self.var_ast, self.numeral(low)), self.ctx),
+                BoolRef(Z3_mk_le(ref, self.var_ast, self.numeral(high)), self.ctx)]
 
+    def value(self, model):
+        value = model.get_interp(self.decl)
+        return value if value is not None else model.eval(self.var, model_completion=True)
 
-def find_diverse_solutions_v2(z3_constraints, max_solutions=5, percentage=0.2, min_distance=1.0, decay_factor=0.9):
-    solver = Solver()
-    solver.add(z3_constraints)
-    solutions = []
+    def to_python(self, value):
+        return value.as_long() if self.is_int else float(value.as_fraction())
 
-    while len(solutions) < max_solutions and solver.check() == sat:
-        model = solver.model()
-        sol = {}
-        distance_terms = []
-        magnitude_sum = 0.0
-
-        for d in model:
-            var_name = str(d)
-            sort_name = model[d].sort().name()
-
-            if sort_name == 'Int':
-                val = model[d].as_long()
-                sol[var_name] = val
-                z3_var = Int(var_name)
-            elif sort_name == 'Real':
-                val = float(model[d].as_decimal(10).rstrip('?'))
-                sol[var_name] = val
-                z3_var = Real(var_name)
-            else:
-                sol[var_name] = model[d]
-                continue
+    def differs(self, value):
+        ref = self.ctx.ref()
+        return BoolRef(Z3_mk_not(ref, Z3_mk_eq(ref, self.var_ast, value.as_ast())), self.ctx)
 
-            distance_terms.append(Abs(z3_var - val))
-            magnitude_sum += abs(val)
 
-        solutions.append(sol)
-
-        # Compute scaled distance threshold based on magnitude
-        scaled_distance = max(percentage * magnitude_sum, min_distance)
+def sample_diverse_solutions(solver, max_solutions=100, time_budget=5.0, probe_timeout_ms=1000, seed=None,
+                             max_misses=8):
+    """
+    Draw up to max_solutions distinct solutions spread over the solution space
+    within time_budget seconds.
 
-        # Add global diversity constraint
-        solver.push()
-        solver.add(Sum(distance_terms) >= scaled_distance)
+    Each probe asks for a solution inside a random box (plain linear bounds, no Abs
+    case splits) around one of the solutions found so far. The box size doubles
+    after a hit and halves after a miss, so probes spread out as far as the
+    constraints allow. Every solution is blocked with one clause, and after
+    max_misses misses in a row a probe without a box keeps the search going until
+    the space is exhausted. Everything is added in a push()/pop() scope.
 
-        if solver.check() != sat:
-            solver.pop()
-            percentage *= decay_factor
-            if percentage * magnitude_sum < min_distance:
+    Returns:
+        list: solution dicts (see model_to_solution()), in the order found.
+    """
+    rng = random.Random(seed)
+    deadline = time.monotonic() + time_budget
+    solutions = []
+    solver.push()
+    try:
+        if timed_check(solver, deadline, probe_timeout_ms) != sat:
+            return solutions
+        model = solver.model()
+        variables = [SampledVariable(d, model[d].sort().name() == 'Int') for d in model
+                     if d.arity() == 0 and model[d].sort().name() in ('Int', 'Real')]
+        others = {str(d) for d in model} - {v.name for v in variables}
+        spread = 0.2
+        misses = 0
+        while True:
+            values = [v.value(model) for v in variables]
+            solution = {v.name: v.to_python(value) for v, value in zip(variables, values)}
+            if others:
+                solution.update({name: value for name, value in model_to_solution(model).items() if name in others})
+            solutions.append(solution)
+            if not variables or len(solutions) >= max_solutions:
                 break
-        else:
-            solver.pop()
-            solver.add(Sum(distance_terms) >= scaled_distance)
+            solver.add(Or([v.differs(value) for v, value in zip(variables, values)]))
+
+            model = None
+            while model is None and time.monotonic() < deadline:
+                if misses >= max_misses:
+                    # no box: any solution not found yet, or stop if there is none
+                    result = timed_check(solver, deadline, probe_timeout_ms)
+                    if result == sat:
+                        model = solver.model()
+                        misses = 0
+                    elif result == unsat:
+                        return solutions
+                    else:
+                        misses = 0
+                    continue
+
+                anchor = rng.choice(solutions)
+                solver.push()
+                bounds = []
+                for v in variables:
+                    width = spread * max(1.0, abs(anchor[v.name]))
+                    center = anchor[v.name] + rng.uniform(-width, width)
+                    low, high = center - width / 2, center + width / 2
+                    if v.is_int:
+                        low, high = math.ceil(low), math.floor(high)
+                        if low > high:
+                            low = high = round(center)
+                    bounds.extend(v.bounds(low, high))
+                solver.add(bounds)
+                result = timed_check(solver, deadline, probe_timeout_ms)
+                if result == sat:
+                    model = solver.model()
+                solver.pop()
+                if model is not None:
+                    spread = min(spread * 2, 1e6)
+                    misses = 0
+                else:
+                    spread = max(spread / 2, 1e-6)
+                    misses += 1
+            if model is None:
+                break
+        return solutions
+    finally:
+        solver.pop()
 
-    return solutions
 
-def get_diverse_median_solution_wrapper(z3_constraints, max_solutions=1, **kwargs):
+def get_diverse_median_solution_wrapper(z3_constraints, max_solutions=1, portfolio=None, **kwargs):
     """
     Wrapper that returns the median solution when only one is requested.
 
     If max_solutions == 1:
+        - With a SolverPortfolio, return [the first solution of the race]
         - Try to find 3 solutions, return the 2nd (median)
         - If 2 found, return the 2nd
         - If 1 found, return that
     Else:
         - Return list of solutions as usual
     """
+    if max_solutions == 1 and portfolio is not None:
+        solution, _ = portfolio.solve(z3_constraints)
+        return [solution] if solution is not None else None
+    solver = Solver()
+    solver.add(z3_constraints)
     if max_solutions == 1:
-        candidate_solutions = find_diverse_solutions_v2(
-            z3_constraints, max_solutions=3, **kwargs
-        )
-        if len(candidate_solutions) >= 3:
-            return [candidate_solutions[1]]
-        elif len(candidate_solutions) == 2:
-            return [candidate_solutions[1]]
-        elif len(candidate_solutions) == 1:
-            return [candidate_solutions[0]]
-        else:
-            return None
+        return pick_median_solution(sample_diverse_solutions(solver, max_solutions=3, **kwargs))
+    return sample_diverse_solutions(solver, max_solutions=max_solutions, **kwargs)
+
+
+def pick_median_solution(candidate_solutions):
+    """
+    Return [2nd candidate] if there are 2 or 3, [the only one] if there is 1, else None.
+    """
+    if len(candidate_solutions) >= 2:
+        return [candidate_solutions[1]]
+    elif len(candidate_solutions) == 1:
+        return [candidate_solutions[0]]
     else:
-        return find_diverse_solutions_v2(
-            z3_constraints, max_solutions=max_solutions, **kwargs
-        )
+        return None
 
 
-def exclude_solution_from_constraints(z3_constraints, ctx, solution):
+class SolverSession:
     """
-    Adds a constraint to exclude a given solution from being returned again by Z3.
+    A persistent Z3 solver for one constraint set (pre or post).
 
-    Args:
-        z3_constraints (list): Existing Z3 constraints (hard constraints).
-        ctx (dict): Context with Z3 variable mappings.
-        solution (dict): Dictionary of variable assignments to block (e.g., {'x': 3, 'y': 5}).
+    The parsed constraints are asserted once. Excluded regions (see ExclusionStore)
+    live in one solver scope above them, which is only rebuilt when regions are
+    merged, and fixed values are checked inside a push()/pop() scope on top, so the
+    solver keeps what it learned between loop iterations instead of being rebuilt
+    from the whole constraint list every time.
+    """
 
-    Returns:
-        tuple: (updated_constraints, updated_ctx)
+    def __init__(self, z3_constraints, ctx, name="constraints", portfolio=None, **exclusion_options):
+        self.name = name
+        self.ctx = ctx
+        self.portfolio = portfolio
+        self.base_constraints = list(z3_constraints)
+        self.exclusions = ExclusionStore(ctx, **exclusion_options)
+        self.solver = Solver()
+        self.solver.add(self.base_constraints)
+        # scope of the exclusion clauses
+        self.solver.push()
+        self.predicate = ConcretePredicate(self.base_constraints)
+        self.vectorized = None
+
+    def constraints(self):
+        """
+        The hard constraints of the session: the parsed constraints plus the blocking
+        clauses of all excluded regions.
+        """
+        return self.base_constraints + self.exclusions.clauses()
+
+    def exclude(self, solution):
+        """
+        Exclude the neighbourhood of the assignment in solution (variables unknown to
+        this constraint set are ignored, since they cannot distinguish its solutions).
+        """
+        added, removed = self.exclusions.add(solution)
+        if removed:
+            # merged regions replace clauses already asserted: re-assert the whole store
+            self.solver.pop()
+            self.solver.push()
+            self.solver.add(self.exclusions.clauses())
+        else:
+            for region in added:
+                self.solver.add(region.to_z3(self.ctx))
+
+    def screen(self, candidates, var_names):
+        """
+        Screen a batch of candidates against the session's constraints in one vectorized
+        pass; see screen_candidates(). Candidates in an excluded region are masked out,
+        the violations only cover the parsed constraints.
+        """
+        if self.vectorized is None:
+            self.vectorized = VectorizedPredicate(self.base_constraints)
+        mask, violations = self.vectorized.screen(candidates, var_names)
+        if len(self.exclusions):
+            mask &= ~self.exclusions.contains_rows(candidates, var_names)
+        return mask, violations
+
+    def evaluate_concrete(self, fixed_values, types_dict=None):
+        """
+        Decide without the solver whether fixed_values satisfies the constraints.
+
+        Returns:
+            tuple: (verdict, point) where verdict is True/False, or None if some variable
+                   of the constraints is not fixed or is NaN or infinite (then the solver
+                   has to decide), and point is fixed_values converted to the variables'
+                   Z3 sorts.
+
+        Raises:
+            ValueError: for unsupported fixed-value types, as in fixed_value_constraint().
+        """
+        point = {}
+        for var, raw_val in fixed_values.items():
+            is_real = fixed_value_is_real(var, types_dict or {})
+            if var in self.predicate.variables:
+                is_real = self.predicate.variables[var] == "Real"
+            elif var in self.ctx:
+                is_real = self.ctx[var].sort().name() == "Real"
+            point[var] = to_concrete(raw_val, is_real)
+        if any(value is None for value in point.values()):
+            return None, point
+        verdict = self.predicate.evaluate(point)
+        if verdict:
+            excluded = self.exclusions.contains(point)
+            verdict = None if excluded is None else not excluded
+        return verdict, point
+
+    def diverse_solutions(self, max_solutions=5, fixed_values=None, types_dict=None, **kwargs):
+        """
+        Diverse solutions of the session's constraints, optionally with some variables
+        fixed, drawn with sample_diverse_solutions() (kwargs such as time_budget are
+        passed on). With a portfolio, a single solution is raced for instead.
+        Same return convention as get_diverse_median_solution_wrapper().
+        """
+        if fixed_values:
+            verdict, point = self.evaluate_concrete(fixed_values, types_dict)
+            if verdict is not None:
+                # every variable is fixed, so the point itself is the only possible solution
+                solutions = [{var: float(val) if isinstance(val, Fraction) else val for var, val in point.items()}] if verdict else []
+                if max_solutions == 1:
+                    return pick_median_solution(solutions)
+                return solutions
+
+        fixed_constraints = []
+        if fixed_values:
+            ctx = dict(self.ctx)
+            fixed_constraints = [fixed_value_constraint(var, raw_val, ctx, types_dict or {})
+                                 for var, raw_val in fixed_values.items()]
+        if max_solutions == 1 and self.portfolio is not None:
+            return get_diverse_median_solution_wrapper(self.constraints() + fixed_constraints, max_solutions=1,
+                                                       portfolio=self.portfolio)
+
+        self.solver.push()
+        try:
+            self.solver.add(fixed_constraints)
+            if max_solutions == 1:
+                return pick_median_solution(sample_diverse_solutions(self.solver, max_solutions=3, **kwargs))
+            return sample_diverse_solutions(self.solver, max_solutions=max_solutions, **kwargs)
+        finally:
+            self.solver.pop()
+
+
+def fixed_value_constraint(var, raw_val, ctx, types_dict):
+    """
+    Build var == value for a concrete value, declaring var in ctx if it is missing
+    (Real for float/double types, Int otherwise). NaN and infinite values give False,
+    as no Z3 number equals them.
+
+    Raises:
+        ValueError: for types other than int, long, float and double.
     """
-    exclusion_conditions = []
+    is_real = fixed_value_is_real(var, types_dict)
+    if var not in ctx:
+        ctx[var] = Real(var) if is_real else Int(var)
+    z3_var = ctx[var]
+    is_real = z3_var.sort().name() == "Real"
+    value = to_concrete(raw_val, is_real)
+    if value is None:
+        return BoolVal(False)
+    return z3_var == (RealVal(str(value)) if is_real else IntVal(value))
+
 
-    for var_name, value in solution.items():
+# Words that mark a C integer type (int, long, short, char, unsigned, size_t, ...)
+INTEGER_TYPE_WORDS = ("int", "long", "short", "char", "unsigned", "signed", "size_t", "bool")
 
-        exclusion_conditions.append(ctx[var_name] == value)
 
-    if exclusion_conditions:
-        exclusion_clause = Not(And(*exclusion_conditions))
-        z3_constraints.append(exclusion_clause)
+def fixed_value_is_real(var, types_dict):
+    """
+    Whether a fixed value of var is Real (float/double) or Int (C integer types).
 
-    return z3_constraints, ctx
\ No newline at end of file
+    Raises:
+        ValueError: for any other type.
+    """
+    typ = types_dict.get(var, "int").lower()
+    is_real = any(word in typ for word in ["float", "double"])
+    if not is_real and not any(word in typ for word in INTEGER_TYPE_WORDS):
+        raise ValueError(f"Unsupported fixed-value type '{typ}' for var '{var}'")
+    return is_real